@@ -0,0 +1,325 @@
+"""
+学习分析：汇总所有学员的作答日志，找出最难、区分度最差的题目和工作表
+
+作答日志只追加不改写（见 storage.append_attempts），分析引擎记住每个日志
+文件读到的位置，刷新时只解析新增的部分。数据保存为列式 DataFrame，统计
+全部用分组聚合完成，结果按数据版本缓存，没有新作答时直接返回。
+
+- 难度：该题所有作答的正确率
+- 区分度：学员在该题上的得分与其在其余题目上的正确率之间的相关系数
+  （点二列相关）；作答人数不足 MIN_LEARNERS 时不计算
+"""
+import glob
+import io
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from storage import ATTEMPT_LOG_DIR, append_attempts, list_data_files, read_data_file
+
+MIN_LEARNERS = 5          # 计算区分度所需的最少作答人数
+BACKFILL_MARKER = ".backfilled"
+LOG_COLUMNS = ["time", "qid", "correct", "mode"]
+_CATEGORY_COLUMNS = ["exam_id", "user_id", "qid", "mode", "source"]
+
+
+class _LogFile:
+    def __init__(self, exam_id, user_id):
+        self.exam_id = exam_id
+        self.user_id = user_id
+        self.offset = 0
+        self.rows = 0
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        first = f.readline().decode("utf-8").rstrip("\n")
+    if not first.startswith("#"):
+        return None
+    exam_id, _, user_id = first[1:].partition("\t")
+    return exam_id, user_id
+
+
+class AttemptAnalytics:
+    def __init__(self, log_dir=ATTEMPT_LOG_DIR):
+        self.log_dir = log_dir
+        self._files = {}
+        self._frame = None
+        self._pending = []
+        self._version = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._version
+
+    # ---------- 增量读取 ----------
+    def refresh(self):
+        """
+        读取各日志文件新增的行（所有文件合并后一次解析），返回新增的作答数
+        解析结果校验通过后才推进各文件的读取位置，解析失败时下次刷新重新读取这些行
+        """
+        with self._lock:
+            batches, consumed = [], []
+            for path in glob.glob(os.path.join(self.log_dir, "attempts_*.tsv")):
+                try:
+                    data, size = self._new_lines(path)
+                except (OSError, UnicodeDecodeError):
+                    continue
+                if size:
+                    consumed.append((self._files[path], size))
+                if data:
+                    batches.append((path, data))
+            if not batches:
+                for log, size in consumed:
+                    log.offset += size
+                return 0
+
+            counts = [data.count(b"\n") for _, data in batches]
+            chunk = pd.read_csv(io.BytesIO(b"".join(data for _, data in batches)), sep="\t",
+                                names=LOG_COLUMNS, header=None, dtype={"qid": str, "mode": str},
+                                keep_default_na=False)
+            if len(chunk) != sum(counts):
+                raise ValueError("作答日志行数与解析结果不一致")
+            chunk["correct"] = chunk["correct"].astype("int8")
+            logs = [self._files[path] for path, _ in batches]
+            for column, values in [("exam_id", [log.exam_id for log in logs]),
+                                   ("user_id", [log.user_id for log in logs]),
+                                   ("source", [path for path, _ in batches])]:
+                chunk[column] = pd.Categorical(np.repeat(np.array(values, dtype=object), counts))
+            for log, count in zip(logs, counts):
+                log.rows += count
+            for log, size in consumed:
+                log.offset += size
+            self._pending.append(chunk)
+            self._version += 1
+            self._cache.clear()
+            return len(chunk)
+
+    def _new_lines(self, path):
+        """
+        日志文件中上次读取之后新增的完整行（不含注释行）及其在文件中的字节数，
+        返回 (数据, 字节数)；读取位置由调用方在解析成功后推进
+        """
+        size = os.path.getsize(path)
+        log = self._files.get(path)
+        if log is not None and size < log.offset:
+            # 文件被截断或替换，整体重读
+            self._drop(path)
+            log = None
+        if log is None:
+            header = _read_header(path)
+            if header is None:
+                return b"", 0
+            log = self._files[path] = _LogFile(*header)
+        if size == log.offset:
+            return b"", 0
+
+        with open(path, "rb") as f:
+            f.seek(log.offset)
+            data = f.read(size - log.offset)
+        # 只处理到最后一个完整行，写了一半的行留到下次
+        data = data[:data.rfind(b"\n") + 1]
+        size = len(data)
+        if data.startswith(b"#") or b"\n#" in data or b"\n\n" in data:
+            data = b"".join(line for line in data.splitlines(keepends=True)
+                            if line.strip() and not line.startswith(b"#"))
+        return data, size
+
+    def _drop(self, path):
+        del self._files[path]
+        frame = self.frame_unlocked()
+        self._frame = frame[frame["source"] != path] if frame is not None else None
+
+    def frame_unlocked(self):
+        if self._pending:
+            parts = ([self._frame] if self._frame is not None else []) + self._pending
+            frame = pd.concat(parts, ignore_index=True)
+            for column in _CATEGORY_COLUMNS:
+                frame[column] = frame[column].astype("category")
+            self._frame = frame
+            self._pending = []
+        return self._frame
+
+    def frame(self):
+        """全部作答记录（列：time, qid, correct, mode, exam_id, user_id）"""
+        with self._lock:
+            frame = self.frame_unlocked()
+        if frame is None:
+            return pd.DataFrame(columns=LOG_COLUMNS + ["exam_id", "user_id"])
+        return frame
+
+    # ---------- 统计 ----------
+    def _cached(self, key, compute):
+        with self._lock:
+            result = self._cache.get(key)
+        if result is None:
+            result = compute()
+            with self._lock:
+                self._cache[key] = result
+        return result
+
+    def _exam_frame(self, exam_id):
+        frame = self.frame()
+        if frame.empty:
+            return frame
+        return frame[frame["exam_id"] == exam_id]
+
+    def exam_ids(self):
+        frame = self.frame()
+        if frame.empty:
+            return []
+        return sorted(frame["exam_id"].unique().tolist())
+
+    def summary(self, exam_id):
+        def compute():
+            df = self._exam_frame(exam_id)
+            attempts = len(df)
+            return {
+                "attempts": attempts,
+                "learners": int(df["user_id"].nunique()) if attempts else 0,
+                "questions": int(df["qid"].nunique()) if attempts else 0,
+                "accuracy": float(df["correct"].mean()) if attempts else 0.0,
+            }
+        return self._cached(("summary", exam_id), compute)
+
+    def question_stats(self, exam_id):
+        """
+        每题一行：作答次数、作答人数、难度（正确率）、区分度
+        区分度用每名学员在该题上的平均得分与其其余题目的平均正确率计算
+        """
+        def compute():
+            df = self._exam_frame(exam_id)
+            columns = ["qid", "attempts", "learners", "difficulty", "discrimination"]
+            if df.empty:
+                return pd.DataFrame(columns=columns)
+
+            by_question = df.groupby("qid", observed=True)["correct"].agg(["count", "mean"])
+            # 学员 × 题目的得分
+            scores = df.groupby(["user_id", "qid"], observed=True)["correct"].mean()
+            learners = scores.groupby(level="qid", observed=True).size()
+
+            x = scores.to_numpy(dtype=float)
+            user_sum = scores.groupby(level="user_id", observed=True).transform("sum").to_numpy(dtype=float)
+            user_n = scores.groupby(level="user_id", observed=True).transform("count").to_numpy(dtype=float)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rest = np.where(user_n > 1, (user_sum - x) / (user_n - 1), np.nan)
+            pairs = pd.DataFrame({"qid": scores.index.get_level_values("qid"), "x": x, "r": rest}).dropna()
+            pairs["xr"] = pairs["x"] * pairs["r"]
+            pairs["xx"] = pairs["x"] * pairs["x"]
+            pairs["rr"] = pairs["r"] * pairs["r"]
+            sums = pairs.groupby("qid", observed=True).agg(
+                n=("x", "size"), sx=("x", "sum"), sr=("r", "sum"),
+                sxr=("xr", "sum"), sxx=("xx", "sum"), srr=("rr", "sum"))
+            numerator = sums["n"] * sums["sxr"] - sums["sx"] * sums["sr"]
+            denominator = np.sqrt((sums["n"] * sums["sxx"] - sums["sx"] ** 2)
+                                  * (sums["n"] * sums["srr"] - sums["sr"] ** 2))
+            valid = (sums["n"] >= MIN_LEARNERS) & (denominator > 1e-12)
+            discrimination = (numerator / denominator.where(valid)).reindex(by_question.index)
+
+            result = pd.DataFrame({
+                "qid": by_question.index.astype(str),
+                "attempts": by_question["count"].to_numpy(),
+                "learners": learners.reindex(by_question.index).fillna(0).astype(int).to_numpy(),
+                "difficulty": by_question["mean"].to_numpy(),
+                "discrimination": discrimination.to_numpy(),
+            })
+            return result.sort_values("difficulty", kind="stable").reset_index(drop=True)
+        return self._cached(("questions", exam_id), compute)
+
+    def group_stats(self, exam_id, question_meta, by="sheet_name"):
+        """
+        按题目属性分组（工作表或题型）：作答次数、作答人数、题数、正确率
+        question_meta: {qid: {"sheet_name": ..., "type": ...}}，题库中已删除的题目归入“(已删除)”
+        结果按 题目ID -> 分组 的内容缓存：每次重新构建的同一题库命中同一缓存，题库修改后重新计算
+        """
+        grouping = frozenset((qid, meta.get(by)) for qid, meta in question_meta.items())
+
+        def compute():
+            df = self._exam_frame(exam_id)
+            label = "工作表" if by == "sheet_name" else "题型"
+            if df.empty:
+                return pd.DataFrame(columns=[label, "attempts", "learners", "questions", "accuracy"])
+            # 先对题目类别做映射，再按编码取值，避免逐行查字典
+            mapping = np.asarray([question_meta.get(qid, {}).get(by, "(已删除)")
+                                  for qid in df["qid"].cat.categories], dtype=object)
+            groups = pd.Series(mapping[df["qid"].cat.codes.to_numpy()], index=df.index)
+            grouped = df.assign(group=groups).groupby("group", observed=True)
+            result = grouped.agg(attempts=("correct", "size"), learners=("user_id", "nunique"),
+                                 questions=("qid", "nunique"), accuracy=("correct", "mean"))
+            result = result.reset_index().rename(columns={"group": label})
+            return result.sort_values("accuracy", kind="stable").reset_index(drop=True)
+        return self._cached(("group", exam_id, by, grouping), compute)
+
+
+def backfill_from_history(progress_dir="progress_data", wrong_dir="wrong_questions", log_dir=ATTEMPT_LOG_DIR):
+    """
+    把作答日志启用前的历史记录导入日志（只执行一次）：进度文件中已作答的题目
+    按其作答结果记一次；错题本中不在进度里的题目按首次答错记一次
+    错题本不记录题库和学员，按同一存储键的进度文件对应；没有进度文件的错题本跳过
+    返回导入的作答数，已导入过时返回 None
+    """
+    marker = os.path.join(log_dir, BACKFILL_MARKER)
+    if os.path.exists(marker):
+        return None
+
+    imported = 0
+    owners = {}
+    for path in list_data_files(progress_dir, "progress_"):
+        try:
+            data = read_data_file(path, "progress")
+        except Exception:
+            continue
+        if not isinstance(data, dict):  # 列出后被后台清理删除
+            continue
+        exam_id, user_id = data.get("exam_id"), data.get("user_id", "")
+        if not exam_id:
+            continue
+        answered = set()
+        owners[_storage_key(path, "progress_")] = (exam_id, user_id, answered)
+        for qid, record in data.get("progress", {}).items():
+            if not isinstance(qid, str) or not record.get("answer"):
+                continue
+            answered.add(qid)
+            append_attempts(exam_id, [(qid, record.get("correct", False))], mode="历史",
+                            user_id=user_id, timestamp=_timestamp(record.get("time")))
+            imported += 1
+
+    for path in list_data_files(wrong_dir, "wrong_"):
+        owner = owners.get(_storage_key(path, "wrong_"))
+        if owner is None:
+            continue
+        exam_id, user_id, answered = owner
+        try:
+            entries = read_data_file(path, "wrong")
+        except Exception:
+            continue
+        if not isinstance(entries, list):
+            continue
+        for entry in entries:
+            qid = entry.get("question_id")
+            if not qid or qid in answered:
+                continue
+            append_attempts(exam_id, [(qid, False)], mode="历史", user_id=user_id,
+                            timestamp=_timestamp(entry.get("first_wrong")))
+            imported += 1
+
+    os.makedirs(log_dir, exist_ok=True)
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(f"{datetime.now().isoformat()}\t{imported}\n")
+    return imported
+
+
+def _storage_key(path, prefix):
+    return os.path.splitext(os.path.basename(path))[0][len(prefix):]
+
+
+def _timestamp(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,177 @@
+"""
+题库目录：在后台扫描题库文件，持久化每个题库的元数据（工作表、题型分布、
+行数、修改时间、解析耗时），供选择界面直接展示而无需完整加载题库。
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+CATALOG_VERSION = 1
+
+# 识别统计中的题型键 -> 界面使用的题型名称
+TYPE_KEY_NAMES = {
+    "judgment": "判断",
+    "single_choice": "单选",
+    "fill_blank": "填空",
+    "essay": "简答",
+}
+
+
+def file_signature(path):
+    """文件签名（修改时间 + 大小），用于判断文件是否需要重新扫描"""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class BankCatalog:
+    """
+    题库元数据目录
+
+    scan_fn(path) 负责解析题库，返回 (识别统计, 提示信息列表)。
+    目录以文件绝对路径为键，文件签名未变化时直接复用已有记录，
+    只有新增或修改过的文件才会被重新扫描。
+    """
+
+    def __init__(self, catalog_path, scan_fn):
+        self.catalog_path = catalog_path
+        self._scan_fn = scan_fn
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._pending = []
+        self._worker = None
+
+    # ---------- 持久化 ----------
+    def _load(self):
+        try:
+            if os.path.exists(self.catalog_path):
+                with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == CATALOG_VERSION:
+                    return data.get("entries", {})
+        except Exception:
+            pass
+        return {}
+
+    def _save(self):
+        with self._lock:
+            data = {"version": CATALOG_VERSION, "entries": dict(self._entries)}
+        catalog_dir = os.path.dirname(self.catalog_path)
+        if catalog_dir and not os.path.exists(catalog_dir):
+            os.makedirs(catalog_dir, exist_ok=True)
+        # 先写临时文件再替换，避免读到写了一半的目录
+        tmp_path = f"{self.catalog_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.catalog_path)
+
+    # ---------- 查询 ----------
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def get(self, path):
+        """获取题库的目录记录，未扫描或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+        if entry is None:
+            return None
+        try:
+            if entry.get("signature") != file_signature(path):
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def stale_paths(self, paths):
+        """返回需要（重新）扫描的文件"""
+        return [path for path in paths if self.get(path) is None]
+
+    @property
+    def is_scanning(self):
+        with self._lock:
+            return self._worker is not None
+
+    # ---------- 扫描 ----------
+    def scan(self, path):
+        """扫描单个题库并更新目录记录"""
+        signature = file_signature(path)
+        started = time.perf_counter()
+        try:
+            detection_stats, notices = self._scan_fn(path)
+            error = next((message for level, message in notices if level == "error"), "")
+        except Exception as e:
+            detection_stats, error = {}, str(e)
+        parse_seconds = time.perf_counter() - started
+
+        sheets = []
+        type_counts = {}
+        for sheet_name, stats in detection_stats.items():
+            sheet_types = {}
+            for t_key, t_name in TYPE_KEY_NAMES.items():
+                count = stats.get(t_key, 0)
+                if count:
+                    sheet_types[t_name] = count
+                    type_counts[t_name] = type_counts.get(t_name, 0) + count
+            sheets.append({
+                "name": sheet_name,
+                "rows": stats.get("rows", stats.get("total", 0)),
+                "total": stats.get("total", 0),
+                "type_counts": sheet_types,
+            })
+
+        entry = {
+            "file": os.path.basename(path),
+            "signature": signature,
+            "modified": datetime.fromtimestamp(signature[0] / 1e9).isoformat(timespec="seconds"),
+            "sheets": sheets,
+            "type_counts": type_counts,
+            "total": sum(sheet["total"] for sheet in sheets),
+            "rows": sum(sheet["rows"] for sheet in sheets),
+            "parse_seconds": round(parse_seconds, 3),
+            "scanned_at": datetime.now().isoformat(timespec="seconds"),
+            "error": error,
+        }
+        with self._lock:
+            self._entries[self._key(path)] = entry
+        return entry
+
+    def refresh(self, paths):
+        """同步扫描所有变化过的文件，返回实际扫描的数量"""
+        stale = self.stale_paths(paths)
+        for path in stale:
+            self.scan(path)
+            # 每扫描完一个就落盘，进程中途退出也不会丢失已完成的结果
+            try:
+                self._save()
+            except Exception:
+                pass
+        return len(stale)
+
+    def refresh_in_background(self, paths):
+        """在后台线程中扫描变化过的文件，已有扫描在进行时只追加待扫描文件"""
+        stale = self.stale_paths(paths)
+        if not stale:
+            return False
+        with self._lock:
+            for path in stale:
+                if path not in self._pending:
+                    self._pending.append(path)
+            if self._worker is not None:
+                return True
+            self._worker = threading.Thread(target=self._drain_pending, name="bank-catalog-scan", daemon=True)
+            self._worker.start()
+        return True
+
+    def _drain_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    return
+                path = self._pending.pop(0)
+            try:
+                self.refresh([path])
+            except Exception:
+                continue
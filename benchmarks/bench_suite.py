@@ -0,0 +1,211 @@
+"""
+基准测试套件：在不同规模的合成题库上测量
+
+- 题库加载耗时和峰值内存（parse_question_bank）
+- 题型识别吞吐（intelligent_detect_question_type）
+- 各题型判分吞吐（check_answer）
+- 练习进度、错题本的保存/加载延迟
+
+结果写入 JSON 文件（含提交号），可用 --baseline 与之前提交的结果比较。
+
+用法：
+    python benchmarks/bench_suite.py --sizes 1000 20000 --out bench_results/HEAD.json
+    python benchmarks/bench_suite.py --sizes 1000 20000 --baseline bench_results/HEAD.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import storage  # noqa: E402
+from grading import check_answer  # noqa: E402
+from question_bank import intelligent_detect_question_type, parse_question_bank  # noqa: E402
+from regression import report  # noqa: E402
+from synthetic_bank import DEFAULT_MIX, generate_bank, parse_mix  # noqa: E402
+
+GRADE_SAMPLE = 2000        # 每个题型参与判分测试的题目数
+WRONG_BOOK_RATIO = 0.1     # 错题本条数占题量的比例
+
+
+def timed_runs(func, repeat):
+    """运行 repeat 次，返回每次耗时（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def p95(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def prepare_bank(size, mix, seed, cache_dir):
+    """生成（或复用已生成的）合成题库"""
+    mix_key = "_".join(f"{t}{round(w * 100)}" for t, w in mix.items())
+    path = os.path.join(cache_dir, f"synthetic_{size}_{mix_key}_{seed}.xlsx")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        generate_bank(path, size, mix, seed=seed)
+        print(f"  生成题库 {os.path.basename(path)}: {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def bench_load(path, repeat):
+    samples = timed_runs(lambda: parse_question_bank(path), repeat)
+    # 峰值内存单独测一次，避免 tracemalloc 的开销计入耗时
+    tracemalloc.start()
+    questions, _, _ = parse_question_bank(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return questions, {"load_seconds": min(samples), "load_peak_mb": peak / 1024 / 1024}
+
+
+def bench_detection(questions):
+    inputs = [(q["question"], q["correct_answer_display"],
+               "\n".join(f"{opt['label']}. {opt['text']}" for opt in q["options"]))
+              for q in questions]
+    start = time.perf_counter()
+    for question, answer, options_text in inputs:
+        intelligent_detect_question_type(question, answer, options_text)
+    return {"detect_per_s": len(inputs) / (time.perf_counter() - start)}
+
+
+def bench_grading(questions, rng):
+    """每个题型取样，一半用正确答案、一半用错误答案判分"""
+    metrics = {}
+    by_type = {}
+    for q in questions:
+        by_type.setdefault(q["type"], []).append(q)
+    for q_type, members in sorted(by_type.items()):
+        sample = rng.sample(members, min(GRADE_SAMPLE, len(members)))
+        cases = []
+        for i, q in enumerate(sample):
+            if i % 2 == 0:
+                cases.append((q["correct_answer_display"], q))
+            elif q_type == "判断":
+                cases.append(("错" if q["correct_answer_normalized"] == "对" else "对", q))
+            elif q_type == "单选":
+                cases.append((rng.choice("ABCD"), q))
+            else:
+                cases.append((q["correct_answer_display"][::-1] + "误", q))
+        start = time.perf_counter()
+        for answer, q in cases:
+            check_answer(answer, q)
+        metrics[f"grade.{q_type}_per_s"] = len(cases) / (time.perf_counter() - start)
+    return metrics
+
+
+def bench_storage(questions, repeat):
+    """在临时目录中测量进度和错题本的读写延迟（毫秒，中位数和 p95）"""
+    exam_id = "bench"
+    progress = {q["qid"]: {"answer": q["correct_answer_display"], "correct": True,
+                           "time": datetime.now().isoformat(), "question": q["question"],
+                           "correct_answer": q["correct_answer_display"], "explanation": q["explanation"]}
+                for q in questions}
+    config = {"exam_id": exam_id, "mode": "顺序练习", "question_ids": list(progress)}
+    extra = {"current_index": 0, "filtered_questions_length": len(questions)}
+
+    wrong_count = max(1, int(len(questions) * WRONG_BOOK_RATIO))
+    wrong_seed, wrong_probe = questions[:wrong_count], questions[wrong_count:wrong_count + repeat] or questions[:1]
+
+    metrics = {}
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        save = timed_runs(lambda: storage.save_progress(exam_id, progress, config, extra), repeat)
+        load = timed_runs(lambda: storage.load_progress(exam_id), repeat)
+
+        for q in wrong_seed:
+            storage.save_wrong_question(exam_id, q, "错误答案", False)
+        probes = iter(wrong_probe * (repeat // len(wrong_probe) + 1))
+        save_wrong = timed_runs(lambda: storage.save_wrong_question(exam_id, next(probes), "错误答案", False), repeat)
+        load_wrong = timed_runs(lambda: storage.load_wrong_questions(exam_id), repeat)
+
+        for name, samples in [("save_progress", save), ("load_progress", load),
+                              ("save_wrong_question", save_wrong), ("load_wrong_questions", load_wrong)]:
+            metrics[f"storage.{name}_ms"] = statistics.median(samples) * 1000
+            metrics[f"storage.{name}_p95_ms"] = p95(samples) * 1000
+        metrics["storage.progress_file_kb"] = os.path.getsize(storage.get_progress_filename(exam_id)) / 1024
+        metrics["storage.wrong_file_kb"] = os.path.getsize(storage.get_wrong_questions_filename(exam_id)) / 1024
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return metrics
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="题库加载、识别、判分和存储基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="合成题库题量")
+    parser.add_argument("--mix", default=None, help="题型比例，如 判断=2,单选=4,填空=3,简答=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="加载和存储测试的重复次数")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "exam_bench_banks"),
+                        help="合成题库缓存目录")
+    parser.add_argument("--out", help="结果 JSON 文件")
+    parser.add_argument("--baseline", help="与之前的结果 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    rng = random.Random(args.seed)
+    metrics = {}
+    for size in args.sizes:
+        print(f"\n== {size} 题 ==")
+        path = prepare_bank(size, mix, args.seed, args.cache_dir)
+        questions, results = bench_load(path, max(1, args.repeat // 2))
+        results.update(bench_detection(questions))
+        results.update(bench_grading(questions, rng))
+        results.update(bench_storage(questions, args.repeat))
+        for name, value in results.items():
+            print(f"  {name:<40}{value:>14.3f}")
+            metrics[f"n{size}.{name}"] = value
+
+    output = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "metrics": metrics,
+    }
+    if args.out:
+        directory = os.path.dirname(args.out)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.out}")
+
+    sys.exit(report(metrics, args.baseline, None, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+冷启动首屏耗时：在全新的解释器和空白工作目录中用 Streamlit AppTest 运行
+kaoshi.py，测量从进程启动到第一次渲染完成的时间，作为启动性能的回归指标。
+
+每次测量都使用新的临时目录（只复制题库文件），没有题库目录缓存、进度等历史数据。
+
+用法：
+    python benchmarks/cold_render.py --runs 5
+    python benchmarks/cold_render.py --save-baseline benchmarks/.baseline/cold_render.json
+    python benchmarks/cold_render.py --baseline benchmarks/.baseline/cold_render.json
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from regression import report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "openpyxl", "numpy", "pyarrow", "difflib"]
+
+# 在子进程中执行：先导入测试框架（含 streamlit），再完成两次渲染
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+t2 = time.perf_counter()
+loaded = [name for name in sys.argv[2:] if name in sys.modules]
+at.run()
+t3 = time.perf_counter()
+print(json.dumps({
+    "streamlit_import": t1 - t0,
+    "first_render": t2 - t1,
+    "second_render": t3 - t2,
+    "time_to_first_render": t2 - t0,
+    "heavy_modules": loaded,
+    "exceptions": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def measure_once(script, banks):
+    workdir = tempfile.mkdtemp(prefix="cold_render_")
+    try:
+        for path in banks:
+            shutil.copy(path, workdir)
+        result = subprocess.run([sys.executable, "-c", PROBE, script, *HEAVY_MODULES],
+                                cwd=workdir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动首屏耗时")
+    parser.add_argument("--script", default=os.path.join(ROOT, "kaoshi.py"))
+    parser.add_argument("--banks", nargs="*", help="复制到工作目录的题库文件，默认使用仓库中的 xlsx")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--baseline", help="基线 JSON 文件")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    banks = args.banks if args.banks is not None else glob.glob(os.path.join(ROOT, "*.xlsx"))
+    samples = []
+    for run in range(args.runs):
+        sample = measure_once(os.path.abspath(args.script), banks)
+        if sample["exceptions"]:
+            print(f"⚠️ 页面运行出错: {sample['exceptions']}")
+            sys.exit(1)
+        samples.append(sample)
+        print(f"第{run + 1}次: 首屏 {sample['time_to_first_render'] * 1000:.0f} ms"
+              f"（导入 streamlit {sample['streamlit_import'] * 1000:.0f} ms，"
+              f"首次渲染 {sample['first_render'] * 1000:.0f} ms，"
+              f"再次渲染 {sample['second_render'] * 1000:.0f} ms）")
+
+    metrics = {
+        f"cold.{name}": statistics.median(sample[name] for sample in samples)
+        for name in ("time_to_first_render", "first_render", "second_render")
+    }
+    print(f"\n中位数: 首屏 {metrics['cold.time_to_first_render'] * 1000:.0f} ms，"
+          f"首次渲染 {metrics['cold.first_render'] * 1000:.0f} ms，"
+          f"再次渲染 {metrics['cold.second_render'] * 1000:.0f} ms")
+    print(f"首屏时已加载的重量级模块: {', '.join(samples[-1]['heavy_modules']) or '无'}")
+
+    sys.exit(report(metrics, args.baseline, args.save_baseline, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+导入耗时基准：在全新的解释器中用 `python -X importtime` 导入各模块，
+统计累计导入耗时和最耗时的依赖，并检查不应在导入时加载的重量级模块。
+
+用法：
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 5 --save-baseline benchmarks/.baseline/import_time.json
+    python benchmarks/import_time.py --baseline benchmarks/.baseline/import_time.json --tolerance 0.3
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from regression import report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 题库、判分、存储和服务模块在导入时不应加载的依赖（应在用到时再导入）
+DEFAULT_MODULES = ["grading", "question_bank", "storage", "bank_catalog", "review_scheduler",
+                   "question_selector", "exam_service", "streamlit"]
+DEFAULT_FORBIDDEN = ["pandas", "openpyxl", "numpy", "difflib"]
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def measure_import(module):
+    """
+    在子进程中导入 module，返回 (累计耗时秒, {模块名: (自身耗时秒, 累计耗时秒)})
+    module 为空时只启动解释器，用于排除 site 等启动时就会导入的模块
+    """
+    code = f"import {module}" if module else "pass"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            timings[name] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return timings.get(module, (0.0, 0.0))[1], timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模块导入耗时基准")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=3, help="每个模块测量次数，取中位数")
+    parser.add_argument("--top", type=int, default=5, help="显示累计耗时最高的依赖数")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="导入时不应加载的模块（streamlit 本身除外）")
+    parser.add_argument("--baseline", help="基线 JSON 文件")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    _, startup_timings = measure_import(None)
+
+    metrics = {}
+    violations = []
+    for module in args.modules:
+        samples = []
+        timings = {}
+        for _ in range(args.runs):
+            cumulative, timings = measure_import(module)
+            samples.append(cumulative)
+        metrics[f"import.{module}"] = statistics.median(samples)
+
+        print(f"\n{module}: {metrics[f'import.{module}'] * 1000:.1f} ms（{args.runs} 次中位数）")
+        heaviest = sorted(((cum, name) for name, (_, cum) in timings.items()
+                           if name != module and name not in startup_timings), reverse=True)
+        for cumulative, name in heaviest[:args.top]:
+            print(f"    {name:<40}{cumulative * 1000:>10.1f} ms")
+
+        if module != "streamlit":
+            loaded = [name for name in args.forbid if name in timings]
+            if loaded:
+                violations.append((module, loaded))
+
+    for module, loaded in violations:
+        print(f"⚠️ 导入 {module} 时加载了 {', '.join(loaded)}")
+
+    exit_code = report(metrics, args.baseline, args.save_baseline, args.tolerance)
+    sys.exit(1 if violations else exit_code)
+
+
+if __name__ == "__main__":
+    main()
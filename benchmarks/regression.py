@@ -0,0 +1,62 @@
+"""
+基准测试的回归检查：把本次结果与保存的基线比较
+
+基线是 {指标名: 数值} 的 JSON 文件，也可以直接使用基准测试套件的结果文件
+（取其中的 "metrics"）。名称以 _per_s 结尾的吞吐类指标越大越好，其余越小越好。
+"""
+import json
+import os
+
+
+def load_baseline(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("metrics", data)
+
+
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+def save_baseline(path, metrics):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def compare_with_baseline(metrics, baseline, tolerance):
+    """
+    返回比基线差 tolerance 以上的指标列表 [(指标名, 基线值, 本次值)]
+    基线中没有的指标不参与比较
+    """
+    regressions = []
+    for name, value in metrics.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if higher_is_better(name):
+            worse = value < reference / (1 + tolerance)
+        else:
+            worse = value > reference * (1 + tolerance)
+        if worse:
+            regressions.append((name, reference, value))
+    return regressions
+
+
+def report(metrics, baseline_path=None, save_path=None, tolerance=0.2):
+    """打印与基线的比较结果并按需保存新基线，有回归时返回 1（可直接作为退出码）"""
+    baseline = load_baseline(baseline_path)
+    regressions = compare_with_baseline(metrics, baseline, tolerance)
+    if baseline:
+        for name, reference, value in regressions:
+            print(f"⚠️ 回归: {name} {reference:.4f} -> {value:.4f} ({(value / reference - 1) * 100:+.0f}%)")
+        if not regressions:
+            print(f"✅ 未超出基线 {tolerance * 100:.0f}%")
+    if save_path:
+        save_baseline(save_path, metrics)
+        print(f"已保存基线: {save_path}")
+    return 1 if regressions else 0
@@ -0,0 +1,170 @@
+"""
+考试服务压测：在本机启动 exam_service（或连接已运行的服务），用多个长连接
+并发发送判分、取题和读进度请求，报告各接口的 p50/p90/p99 延迟和吞吐量。
+
+用法：
+    python benchmarks/service_load_test.py --bank gangweitiku4.xlsx --concurrency 50 --requests 5000
+    python benchmarks/service_load_test.py --url http://127.0.0.1:8600 --bank gangweitiku4.xlsx
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Client:
+    """单个 keep-alive 连接上的最简 HTTP/1.1 JSON 客户端"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length)
+        return status, json.loads(data)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+async def wait_until_ready(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            client = Client(host, port)
+            await client.connect()
+            status, _ = await client.request("GET", "/health")
+            await client.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("考试服务未能在规定时间内启动")
+
+
+async def run_load(host, port, bank, concurrency, total_requests, record):
+    setup = Client(host, port)
+    await setup.connect()
+    bank_path = quote(bank)
+    start = time.perf_counter()
+    status, page = await setup.request("GET", f"/banks/{bank_path}/questions?limit=500")
+    print(f"首次加载题库: {time.perf_counter() - start:.2f}s (HTTP {status})")
+    if status != 200:
+        raise RuntimeError(page)
+    questions = page["questions"]
+    await setup.close()
+
+    latencies = {}
+    errors = 0
+    counter = iter(range(total_requests))
+
+    def make_request(rng, worker_no):
+        q = rng.choice(questions)
+        user_id = f"loadtest-{worker_no}"
+        roll = rng.random()
+        if roll < 0.7:
+            answer = rng.choice([opt["label"] for opt in q["options"]] or ["对", "错", "测试答案"])
+            return "grade", "POST", "/grade", {"bank": bank, "qid": q["qid"], "answer": answer,
+                                               "user_id": user_id, "record": record}
+        if roll < 0.9:
+            offset = rng.randrange(0, max(1, page["total"] - 20))
+            return "questions", "GET", f"/banks/{bank_path}/questions?offset={offset}&limit=20", None
+        return "progress", "GET", f"/progress?bank={bank_path}&user_id={user_id}", None
+
+    async def worker(worker_no):
+        nonlocal errors
+        rng = random.Random(worker_no)
+        client = Client(host, port)
+        await client.connect()
+        try:
+            for _ in counter:
+                name, method, path, payload = make_request(rng, worker_no)
+                t0 = time.perf_counter()
+                status, _ = await client.request(method, path, payload)
+                latencies.setdefault(name, []).append(time.perf_counter() - t0)
+                if status != 200:
+                    errors += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    print(f"\n并发 {concurrency}，请求 {len(all_latencies)}，耗时 {elapsed:.2f}s，"
+          f"吞吐 {len(all_latencies) / elapsed:.0f} req/s，错误 {errors}")
+    print(f"{'接口':<12}{'请求数':>8}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, values in sorted(latencies.items()) + [("全部", all_latencies)]:
+        values = sorted(values)
+        print(f"{name:<12}{len(values):>8}" + "".join(
+            f"{percentile(values, pct) * 1000:>10.2f}" for pct in (50, 90, 99)) + f"{values[-1] * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="考试服务压测")
+    parser.add_argument("--url", help="已运行服务的地址；不指定时在本机启动一个服务")
+    parser.add_argument("--port", type=int, default=8765, help="本机启动服务时使用的端口")
+    parser.add_argument("--bank", required=True, help="题库文件名")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--record", action="store_true", help="判分时写入掌握度和错题本")
+    parser.add_argument("--processes", action="store_true", help="本机服务的判分使用进程池")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        command = [sys.executable, os.path.join(ROOT, "exam_service.py"), "--port", str(port)]
+        if args.processes:
+            command.append("--processes")
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    try:
+        asyncio.run(wait_until_ready(host, port))
+        asyncio.run(run_load(host, port, args.bank, args.concurrency, args.requests, args.record))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
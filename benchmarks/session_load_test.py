@@ -0,0 +1,267 @@
+"""
+多会话负载测试：用 streamlit.testing.v1.AppTest 模拟多名学员同时使用 kaoshi.py
+
+每个模拟会话按真实操作顺序执行：
+    打开页面 → 填写学员 → 选择题库 → 开始顺序练习 → 作答 → 提交 → 下一题 → 打开错题本
+（故意答错第一题，保证错题本有内容）。会话在线程中并发运行，也可以分散到
+多个进程（每个进程相当于一台独立的服务器进程）。
+
+记录每一步的延迟分布（p50/p95/p99），并用审计钩子统计每一步的文件读写次数
+（按学员的存储文件归属到会话）。可与保存的基线比较，或设置 p95 上限，超出时
+以非零状态退出。
+
+用法：
+    python benchmarks/session_load_test.py --sessions 20 --threads 10
+    python benchmarks/session_load_test.py --sessions 40 --threads 10 --processes 4 --out load.json
+    python benchmarks/session_load_test.py --sessions 20 --baseline load.json --max-p95-ms 3000
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from regression import report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS = ["open", "login", "choose_bank", "start_practice", "answer", "submit", "next", "open_wrong_book"]
+
+# 学员的存储文件名以 _<学员哈希>.dat 结尾（旧版为 .pkl），写入时先写同名的 .tmp 临时文件
+_USER_FILE = re.compile(r"_([0-9a-f]{8})\.(?:dat|pkl)(?:\.\d+\.\d+\.tmp)?$")
+
+
+class FileIOCounter:
+    """通过审计钩子统计每个学员存储文件的读写次数（进程级，只能安装一次）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def install(self):
+        sys.addaudithook(self._hook)
+
+    def _hook(self, event, args):
+        if event != "open" or not isinstance(args[0], str):
+            return
+        match = _USER_FILE.search(args[0])
+        if not match:
+            return
+        mode = args[1] or "r"
+        kind = "writes" if any(flag in mode for flag in "wax+") else "reads"
+        with self._lock:
+            stat = self.counts.setdefault(match.group(1), {"reads": 0, "writes": 0})
+            stat[kind] += 1
+
+    def snapshot(self, user_hash):
+        with self._lock:
+            return dict(self.counts.get(user_hash, {"reads": 0, "writes": 0}))
+
+
+_io_counter = None
+
+
+def share_runtime_state():
+    """
+    让同一进程内的多个 AppTest 可以并发运行，并与真实服务器的行为一致：
+
+    - AppTest 每次运行都把进程级的 Runtime 单例换成模拟对象，结束时清空，
+      并发时会清掉别人正在用的单例；清空后的读取改为回退到最近一次的模拟 Runtime
+    - AppTest 每次运行新建脚本缓存，各线程同时编译 kaoshi.py 会触发 Python 3.11
+      的 AST 并发问题；改为进程内共用一份编译结果（真实服务器也只有一份脚本缓存）
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    latest = {}
+    compiled = {}
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def shared_bytecode(self, script_path):
+        with compile_lock:
+            if script_path not in compiled:
+                compiled[script_path] = get_bytecode(self, script_path)
+            return compiled[script_path]
+
+    def instance(cls):
+        current = cls._instance or latest.get("runtime")
+        if current is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        latest["runtime"] = current
+        return current
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in latest
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    ScriptCache.get_bytecode = shared_bytecode
+
+
+def _button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    return None
+
+
+def _wrong_answer(at):
+    """根据当前题目的正确答案选择一个错误答案，返回已设置值的控件"""
+    idx = at.session_state["current_index"]
+    q = at.session_state["filtered_questions"][idx]
+    inputs = [widget for widget in at.text_input if widget.key != "user_id"] + list(at.text_area)
+    if inputs:
+        return inputs[0].input(f"错误答案{q['qid']}")
+    radio = at.radio[0]
+    correct = q["correct_answer_normalized"]
+    for option in radio.options:
+        if q["type"] == "判断" and correct not in option:
+            return radio.set_value(option)
+        if q["type"] != "判断" and not option.upper().startswith(correct.upper()):
+            return radio.set_value(option)
+    return radio.set_value(radio.options[-1])
+
+
+def run_session(session_no, script, timeout):
+    """执行一个模拟会话，返回 {步骤: (耗时秒, 读次数, 写次数)} 和错误信息"""
+    from streamlit.testing.v1 import AppTest
+
+    user_id = f"load-{os.getpid()}-{session_no}"
+    user_hash = hashlib.md5(user_id.encode()).hexdigest()[:8]
+    results = {}
+    last_io = _io_counter.snapshot(user_hash)
+
+    def step(name, action):
+        nonlocal last_io
+        start = time.perf_counter()
+        at = action()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        io = _io_counter.snapshot(user_hash)
+        results[name] = (elapsed, io["reads"] - last_io["reads"], io["writes"] - last_io["writes"])
+        last_io = io
+        return at
+
+    try:
+        at = step("open", lambda: AppTest.from_file(script, default_timeout=timeout).run())
+        at = step("login", lambda: at.text_input(key="user_id").input(user_id).run())
+        at = step("choose_bank", lambda: _button(at, "✅ 使用此题库").click().run())
+        at = step("start_practice", lambda: _button(at, "🚀 开始顺序练习").click().run())
+        at = step("answer", lambda: _wrong_answer(at).run())
+        at = step("submit", lambda: _button(at, "✅ 提交答案").click().run())
+        at = step("next", lambda: _button(at, "➡️ 下一题").click().run())
+        at = step("open_wrong_book", lambda: _button(at, "📖 查看错题本").click().run())
+        return results, None
+    except Exception as e:
+        return results, f"会话{session_no}: {e}"
+
+
+def run_worker(session_numbers, threads, script, timeout, workdir):
+    """在当前进程中用线程池并发运行一批会话"""
+    global _io_counter
+    os.chdir(workdir)
+    if _io_counter is None:
+        _io_counter = FileIOCounter()
+        _io_counter.install()
+        share_runtime_state()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda n: run_session(n, script, timeout), session_numbers))
+
+
+def summarize(session_results):
+    metrics = {}
+    rows = []
+    for name in STEPS:
+        samples = [result[name] for result in session_results if name in result]
+        if not samples:
+            continue
+        latencies = sorted(sample[0] for sample in samples)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        reads = statistics.mean(sample[1] for sample in samples)
+        writes = statistics.mean(sample[2] for sample in samples)
+        rows.append((name, len(samples), pct(0.5), pct(0.95), pct(0.99), latencies[-1] * 1000, reads, writes))
+        metrics[f"step.{name}.p50_ms"] = pct(0.5)
+        metrics[f"step.{name}.p95_ms"] = pct(0.95)
+        metrics[f"step.{name}.p99_ms"] = pct(0.99)
+        metrics[f"step.{name}.reads"] = reads
+        metrics[f"step.{name}.writes"] = writes
+    return metrics, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamlit 多会话负载测试")
+    parser.add_argument("--sessions", type=int, default=20, help="模拟会话总数")
+    parser.add_argument("--threads", type=int, default=10, help="每个进程的并发会话数")
+    parser.add_argument("--processes", type=int, default=1, help="进程数")
+    parser.add_argument("--script", default=os.path.join(ROOT, "kaoshi.py"))
+    parser.add_argument("--banks", nargs="*", help="题库文件，默认使用仓库中的 xlsx")
+    parser.add_argument("--timeout", type=float, default=120, help="单次渲染超时（秒）")
+    parser.add_argument("--out", help="结果 JSON 文件")
+    parser.add_argument("--baseline", help="与之前的结果 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--max-p95-ms", type=float, help="任一步骤 p95 超过该值即视为不通过")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="session_load_")
+    banks = args.banks if args.banks is not None else glob.glob(os.path.join(ROOT, "*.xlsx"))
+    for path in banks:
+        shutil.copy(path, workdir)
+    script = os.path.abspath(args.script)
+
+    numbers = list(range(args.sessions))
+    chunks = [numbers[i::args.processes] for i in range(args.processes)]
+    start = time.perf_counter()
+    try:
+        if args.processes == 1:
+            outcomes = run_worker(numbers, args.threads, script, args.timeout, workdir)
+        else:
+            with ProcessPoolExecutor(max_workers=args.processes) as executor:
+                futures = [executor.submit(run_worker, chunk, args.threads, script, args.timeout, workdir)
+                           for chunk in chunks if chunk]
+                outcomes = [outcome for future in futures for outcome in future.result()]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    errors = [error for _, error in outcomes if error]
+    metrics, rows = summarize([result for result, _ in outcomes])
+    metrics["sessions_per_s"] = args.sessions / elapsed
+
+    print(f"会话 {args.sessions}（{args.processes} 进程 × {args.threads} 线程），"
+          f"总耗时 {elapsed:.1f}s，失败 {len(errors)}")
+    print(f"{'步骤':<18}{'次数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'读':>6}{'写':>6}")
+    for name, count, p50, p95, p99, worst, reads, writes in rows:
+        print(f"{name:<18}{count:>6}{p50:>10.0f}{p95:>10.0f}{p99:>10.0f}{worst:>10.0f}{reads:>6.1f}{writes:>6.1f}")
+    for error in errors[:5]:
+        print(f"❌ {error}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"sessions": args.sessions, "threads": args.threads,
+                                "processes": args.processes, "errors": len(errors)},
+                       "metrics": metrics}, f, ensure_ascii=False, indent=2)
+
+    failed = bool(errors)
+    if args.max_p95_ms is not None:
+        for name, _, _, p95, *_ in rows:
+            if p95 > args.max_p95_ms:
+                print(f"⚠️ {name} 的 p95 {p95:.0f}ms 超过上限 {args.max_p95_ms:.0f}ms")
+                failed = True
+    exit_code = report(metrics, args.baseline, None, args.tolerance)
+    sys.exit(1 if failed else exit_code)
+
+
+if __name__ == "__main__":
+    main()
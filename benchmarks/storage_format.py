@@ -0,0 +1,101 @@
+"""
+学员数据文件格式对比：同一份错题本用 pickle、新格式（不压缩）和新格式（zlib）
+编码，比较文件大小和编码/解码耗时（中位数）；另列出只保存题目引用的错题本
+（题目内容在各学员共用的题目快照中）。
+
+错题本按 storage.save_wrong_question 的字段生成，题目文字和选项取自合成题库。
+
+用法：python benchmarks/storage_format.py --entries 5000 --repeat 20
+"""
+import argparse
+import os
+import pickle
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import record_codec  # noqa: E402
+from storage import WRONG_CONTENT_FIELDS  # noqa: E402
+from synthetic_bank import LABELS, make_question  # noqa: E402
+
+TYPES = ["单选", "判断", "填空", "简答"]
+
+
+def make_wrong_book(entries, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    book = []
+    for i in range(entries):
+        q_type = TYPES[i % len(TYPES)]
+        text, answer, options, explanation = make_question(rng, q_type, i)
+        first = start + timedelta(minutes=rng.randrange(500000))
+        book.append({
+            "question_id": f"q{i:06d}",
+            "exam_id": "bench",
+            "user_id": "learner",
+            "question": text,
+            "question_type": q_type,
+            "correct_answer": answer,
+            "correct_answer_normalized": answer,
+            "options": [{"label": label, "text": option} for label, option in zip(LABELS, options)],
+            "user_answer": "A",
+            "explanation": explanation,
+            "source": "",
+            "first_wrong": first.isoformat(),
+            "last_attempt": (first + timedelta(days=rng.randrange(30))).isoformat(),
+            "attempt_count": rng.randrange(1, 6),
+            "reviewed": rng.random() < 0.3,
+            "last_correct": rng.random() < 0.5,
+        })
+    return book
+
+
+def median_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学员数据文件格式对比")
+    parser.add_argument("--entries", type=int, default=5000, help="错题本条数")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    book = make_wrong_book(args.entries)
+    references = [{key: value for key, value in entry.items() if key not in WRONG_CONTENT_FIELDS} for entry in book]
+    snapshot = [{"qid": entry["question_id"], **{field: entry[field] for field in WRONG_CONTENT_FIELDS}}
+                for entry in book]
+    kind = record_codec.KIND_WRONG_BOOK
+    snapshot_kind = record_codec.KIND_QUESTION_SNAPSHOT
+    # (名称, 原数据, 编码, 解码)
+    formats = [
+        ("pickle", book, lambda: pickle.dumps(book, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+        ("record_codec", book, lambda: record_codec.encode(kind, {}, book, compress=False),
+         lambda data: record_codec.decode(data, kind)[2]),
+        ("record_codec+zlib", book, lambda: record_codec.encode(kind, {}, book),
+         lambda data: record_codec.decode(data, kind)[2]),
+        ("引用+zlib", references, lambda: record_codec.encode(kind, {}, references),
+         lambda data: record_codec.decode(data, kind)[2]),
+        ("题目快照（共用）", snapshot, lambda: record_codec.encode(snapshot_kind, {}, snapshot),
+         lambda data: record_codec.decode(data, snapshot_kind)[2]),
+    ]
+
+    print(f"错题本 {args.entries} 条")
+    print(f"{'格式':<20}{'大小(KB)':>10}{'编码(ms)':>10}{'解码(ms)':>10}")
+    for name, value, dump, load in formats:
+        data = dump()
+        assert load(data) == value
+        print(f"{name:<20}{len(data) / 1024:>10.0f}{median_ms(dump, args.repeat):>10.1f}"
+              f"{median_ms(lambda: load(data), args.repeat):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+合成题库生成器：按指定题量和题型比例生成 xlsx 题库，用于基准测试
+
+覆盖题库加载支持的各种选项布局：
+- “选项”单列：换行、英文/中文分号、中英文逗号分隔，标签写法包括
+  A. / A、 / A：/ 选项A / ① / 1. 以及不带标签
+- A–D 分列：列名为 A、选项A、A选项、选项 A 四种写法
+部分工作表带“题型”列，其余工作表完全依靠智能识别。
+
+用法：python benchmarks/synthetic_bank.py --questions 20000 --mix 判断=2,单选=4,填空=3,简答=1 --out bank.xlsx
+"""
+import argparse
+import os
+import random
+
+import pandas as pd
+
+DEFAULT_MIX = {"判断": 0.2, "单选": 0.4, "填空": 0.3, "简答": 0.1}
+
+# 单元格选项的分隔符和标签写法
+CELL_SEPARATORS = ["\n", ";", "；", "，", ","]
+CELL_LABEL_STYLES = [
+    lambda i, label: f"{label}. ",
+    lambda i, label: f"{label}、",
+    lambda i, label: f"{label}：",
+    lambda i, label: f"选项{label} ",
+    lambda i, label: "①②③④"[i] + ". ",
+    lambda i, label: f"{i + 1}. ",
+    lambda i, label: "",
+]
+# A–D 分列的列名写法
+COLUMN_STYLES = ["{}", "选项{}", "{}选项", "选项 {}"]
+
+LABELS = ["A", "B", "C", "D"]
+_CHARS = ("安全生产管理制度规定操作人员设备检查维护记录标准流程应急预案培训考核责任落实"
+          "信号调度列车运行线路施工防护作业计划审批监督环境风险隐患排查整改措施")
+
+
+def parse_mix(text):
+    """解析 “判断=2,单选=4” 形式的题型比例"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def _phrase(rng, low, high):
+    return "".join(rng.choice(_CHARS) for _ in range(rng.randint(low, high)))
+
+
+def make_question(rng, q_type, serial):
+    """生成一道题：(题干, 答案, 选项文本列表, 解析)；serial 保证题干不重复"""
+    tag = f"（{serial}）"
+    if q_type == "判断":
+        answer = rng.choice(["对", "错", "√", "×", "正确", "错误"])
+        return f"{_phrase(rng, 12, 30)}{tag}", answer, [], ""
+    if q_type == "单选":
+        options = [_phrase(rng, 4, 12) for _ in range(4)]
+        question = f"下列关于{_phrase(rng, 6, 16)}的说法，正确的是{tag}（ ）"
+        return question, rng.choice(LABELS), options, _phrase(rng, 10, 20)
+    if q_type == "填空":
+        question = f"{_phrase(rng, 8, 20)}______{_phrase(rng, 2, 8)}{tag}"
+        return question, _phrase(rng, 2, 8), [], ""
+    question = f"简述{_phrase(rng, 8, 20)}{tag}"
+    return question, _phrase(rng, 40, 120), [], _phrase(rng, 10, 30)
+
+
+def format_option_cell(options, rng):
+    """把选项写进一个单元格，随机选择分隔符和标签写法"""
+    separator = rng.choice(CELL_SEPARATORS)
+    style = rng.choice(CELL_LABEL_STYLES)
+    if separator in (",", "，"):
+        # 逗号分隔时选项内容本身不能含逗号
+        options = [opt.replace(",", "").replace("，", "") for opt in options]
+    return separator.join(style(i, LABELS[i]) + text for i, text in enumerate(options))
+
+
+def generate_bank(path, questions=10000, mix=None, sheets=4, seed=0):
+    """
+    生成合成题库并写入 path，返回各题型实际题数
+    奇数号工作表使用“选项”单列，偶数号使用 A–D 分列；前一半工作表带“题型”列
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    types = list(mix)
+    weights = [mix[t] for t in types]
+    counts = {t: 0 for t in types}
+
+    per_sheet = [questions // sheets + (1 if i < questions % sheets else 0) for i in range(sheets)]
+    serial = 0
+    frames = {}
+    for sheet_no, size in enumerate(per_sheet):
+        use_cell = sheet_no % 2 == 0
+        with_type = sheet_no < sheets / 2
+        column_style = COLUMN_STYLES[sheet_no // 2 % len(COLUMN_STYLES)]
+        rows = []
+        for _ in range(size):
+            serial += 1
+            q_type = rng.choices(types, weights)[0]
+            counts[q_type] += 1
+            question, answer, options, explanation = make_question(rng, q_type, serial)
+            row = {"题目": question, "正确答案": answer}
+            if with_type:
+                row["题型"] = q_type
+            if use_cell:
+                row["选项"] = format_option_cell(options, rng) if options else None
+            else:
+                for i, text in enumerate(options):
+                    row[column_style.format(LABELS[i])] = text
+            row["解析"] = explanation
+            rows.append(row)
+        frames[f"题库{sheet_no + 1}"] = pd.DataFrame(rows)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for sheet_name, frame in frames.items():
+            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成 xlsx 题库")
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--mix", default="判断=2,单选=4,填空=3,简答=1", help="题型比例")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    counts = generate_bank(args.out, args.questions, parse_mix(args.mix), args.sheets, args.seed)
+    print(f"已生成 {args.out}: " + ", ".join(f"{t}{n}题" for t, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+导出学员的作答结果和错题本（CSV / JSONL / xlsx）
+
+逐个读取学员的进度和错题文件，逐行写出，内存占用与学员数量无关；
+xlsx 使用 openpyxl 的只写模式。页面中的下载按钮在点击时才生成文件
+（写入临时文件后交给 st.download_button），也可以在命令行导出：
+
+    python data_export.py results --format csv --out results.csv
+    python data_export.py wrong --format xlsx --out wrong.xlsx --exam gangweitiku4
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import tempfile
+
+from storage import ATTEMPT_LOG_DIR, data_file_path, get_storage_key, list_data_files, read_data_file
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+XLSX_MAX_ROWS = 1048575  # 每张工作表除表头外最多写入的行数
+
+# (字段名, 表头)
+RESULT_COLUMNS = [
+    ("exam_id", "题库"), ("user_id", "学员"), ("qid", "题目ID"), ("question", "题目"),
+    ("answer", "学员答案"), ("correct", "是否正确"), ("correct_answer", "正确答案"), ("time", "作答时间"),
+]
+WRONG_COLUMNS = [
+    ("exam_id", "题库"), ("user_id", "学员"), ("question_id", "题目ID"), ("question", "题目"),
+    ("question_type", "题型"), ("user_answer", "学员答案"), ("correct_answer", "正确答案"),
+    ("attempt_count", "作答次数"), ("last_correct", "最近是否答对"), ("reviewed", "已掌握"),
+    ("first_wrong", "首次答错"), ("last_attempt", "最近作答"), ("srs_due", "下次复习"), ("source", "来源"),
+]
+
+
+def _load(path, kind):
+    try:
+        return read_data_file(path, kind)
+    except Exception:
+        return None
+
+
+def _storage_key(path, prefix):
+    return os.path.splitext(os.path.basename(path))[0][len(prefix):]
+
+
+def _owner(key, progress_dir, log_dir):
+    """
+    按存储键找到对应的 (题库, 学员)：先读作答日志的首行，其次读进度文件，
+    都没有时题库为空、学员为存储键
+    """
+    log_path = os.path.join(log_dir, f"attempts_{key}.tsv")
+    try:
+        with open(log_path, "rb") as f:
+            first = f.readline().decode("utf-8").rstrip("\n")
+        if first.startswith("#"):
+            exam_id, _, user_id = first[1:].partition("\t")
+            return exam_id, user_id
+    except OSError:
+        pass
+    data = _load(data_file_path(progress_dir, "progress", key), "progress")
+    if isinstance(data, dict) and data.get("exam_id"):
+        return data["exam_id"], data.get("user_id", "")
+    return "", key
+
+
+def iter_results(progress_dir="progress_data", exam_id=None, user_id=None):
+    """逐条产出各学员进度中已作答的题目"""
+    for path in list_data_files(progress_dir, "progress_"):
+        data = _load(path, "progress")
+        if not isinstance(data, dict):
+            continue
+        owner_exam, owner_user = data.get("exam_id", ""), data.get("user_id", "")
+        if (exam_id is not None and owner_exam != exam_id) or (user_id is not None and owner_user != user_id):
+            continue
+        for qid, record in data.get("progress", {}).items():
+            if not record.get("answer"):
+                continue
+            yield {
+                "exam_id": owner_exam,
+                "user_id": owner_user,
+                "qid": qid,
+                "question": record.get("question", ""),
+                "answer": record.get("answer", ""),
+                "correct": bool(record.get("correct", False)),
+                "correct_answer": record.get("correct_answer", ""),
+                "time": record.get("time", ""),
+            }
+
+
+def iter_wrong_questions(wrong_dir="wrong_questions", progress_dir="progress_data", log_dir=ATTEMPT_LOG_DIR,
+                         exam_id=None, user_id=None):
+    """逐条产出各学员错题本中的错题；错题本只保存题目引用，题目和正确答案取自题库的题目快照"""
+    snapshots = {}  # 题库 -> 题目快照，每个题库只读一次
+    for path in list_data_files(wrong_dir, "wrong_"):
+        entries = _load(path, "wrong")
+        if not isinstance(entries, list) or not entries:
+            continue
+        # 旧版错题不记录题库和学员，按存储键查找
+        if "exam_id" in entries[0]:
+            owner = entries[0]["exam_id"], entries[0].get("user_id", "")
+        else:
+            owner = _owner(_storage_key(path, "wrong_"), progress_dir, log_dir)
+        if (exam_id is not None and owner[0] != exam_id) or (user_id is not None and owner[1] != user_id):
+            continue
+        if owner[0] not in snapshots:
+            snapshot = _load(data_file_path(wrong_dir, "snapshot", get_storage_key(owner[0])), "snapshot")
+            snapshots[owner[0]] = snapshot if isinstance(snapshot, dict) else {}
+        for entry in entries:
+            content = snapshots[owner[0]].get(entry.get("question_id"), {})
+            row = {field: entry.get(field, content.get(field, "")) for field, _ in WRONG_COLUMNS}
+            row["exam_id"], row["user_id"] = owner
+            yield row
+
+
+def _cell(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def write_csv(rows, columns, stream):
+    """写入 CSV（带 BOM，Excel 可直接打开中文），stream 为二进制文件对象"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow([title for _, title in columns])
+    count = 0
+    for row in rows:
+        writer.writerow([_cell(row.get(field, "")) for field, _ in columns])
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+
+def write_jsonl(rows, columns, stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+    count = 0
+    for row in rows:
+        text.write(json.dumps({field: row.get(field, "") for field, _ in columns}, ensure_ascii=False))
+        text.write("\n")
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+
+def write_xlsx(rows, columns, stream, sheet_title="导出"):
+    """openpyxl 只写模式：行写入临时文件，不在内存中保留整张表；超过单表行数上限时另起一张表"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    header = [title for _, title in columns]
+    sheet, sheet_rows, count = None, XLSX_MAX_ROWS, 0
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(sheet_title if sheet is None else f"{sheet_title}{len(workbook.worksheets) + 1}")
+            sheet.append(header)
+            sheet_rows = 0
+        sheet.append([_cell(row.get(field, "")) for field, _ in columns])
+        sheet_rows += 1
+        count += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_title).append(header)
+    workbook.save(stream)
+    return count
+
+
+_WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "xlsx": write_xlsx}
+
+
+def export(kind, fmt, stream, exam_id=None, user_id=None, base_dir="."):
+    """
+    把作答结果（kind="results"）或错题本（kind="wrong"）写入二进制文件对象 stream
+    返回导出的行数
+    """
+    progress_dir = os.path.join(base_dir, "progress_data")
+    if kind == "results":
+        rows, columns, title = iter_results(progress_dir, exam_id, user_id), RESULT_COLUMNS, "作答结果"
+    elif kind == "wrong":
+        rows = iter_wrong_questions(os.path.join(base_dir, "wrong_questions"), progress_dir,
+                                    os.path.join(base_dir, ATTEMPT_LOG_DIR), exam_id, user_id)
+        columns, title = WRONG_COLUMNS, "错题本"
+    else:
+        raise ValueError(f"未知的导出内容: {kind}")
+    if fmt not in _WRITERS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if fmt == "xlsx":
+        return write_xlsx(rows, columns, stream, title)
+    return _WRITERS[fmt](rows, columns, stream)
+
+
+def export_to_tempfile(kind, fmt, exam_id=None, user_id=None, base_dir="."):
+    """导出到匿名临时文件并回到开头，供 st.download_button 读取；文件关闭后自动删除"""
+    stream = tempfile.TemporaryFile()
+    export(kind, fmt, stream, exam_id=exam_id, user_id=user_id, base_dir=base_dir)
+    stream.seek(0)
+    return stream
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出学员作答结果或错题本")
+    parser.add_argument("kind", choices=["results", "wrong"], help="results=作答结果，wrong=错题本")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--out", required=True, help="输出文件，- 表示标准输出（仅 csv/jsonl）")
+    parser.add_argument("--exam", help="只导出该题库（题库文件名，不含扩展名）")
+    parser.add_argument("--user", help="只导出该学员")
+    parser.add_argument("--base-dir", default=".", help="学员数据所在目录（含 progress_data 等）")
+    args = parser.parse_args()
+
+    if args.out == "-":
+        if args.format == "xlsx":
+            parser.error("xlsx 不能写到标准输出")
+        with os.fdopen(os.dup(1), "wb") as out:
+            export(args.kind, args.format, out, args.exam, args.user, args.base_dir)
+    else:
+        with open(args.out, "wb") as f:
+            count = export(args.kind, args.format, f, args.exam, args.user, args.base_dir)
+        print(f"已导出 {count} 行到 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+考试服务：基于 asyncio 的 HTTP/JSON 接口（仅使用标准库）
+
+把题库加载、判分、练习进度和错题本以 JSON 接口提供给移动端、考场终端或
+负载均衡健康检查使用。题库在进程内只加载一次、所有请求共享；判分放在线程池
+（或进程池）中执行，不阻塞事件循环；同一学员同一题库的存储读写按顺序执行。
+
+用法：python exam_service.py --host 0.0.0.0 --port 8600
+
+接口：
+    GET    /health
+    GET    /banks
+    GET    /banks/<题库文件>/questions?type=单选&offset=0&limit=50
+    GET    /banks/<题库文件>/questions/<题目ID>
+    POST   /grade              {"bank", "qid", "answer", "user_id", "record"}
+    GET    /progress?bank=&user_id=
+    PUT    /progress           {"bank", "user_id", "progress", "config", "extra"}
+    DELETE /progress?bank=&user_id=
+    GET    /wrong?bank=&user_id=
+    POST   /wrong/reviewed     {"bank", "user_id", "qid", "reviewed"}
+    GET    /diagnostics/timing
+    GET    /metrics            Prometheus 文本格式
+"""
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+import perf_timing
+import storage
+import storage_maintenance
+from grading import check_answer
+from question_bank import build_question_index, list_exam_files, parse_question_bank, resolve_exam_path
+
+MAX_BODY_BYTES = 1 << 20
+MAX_PAGE_SIZE = 500
+
+# 不返回给客户端的题目字段（答案和解析只在判分后给出）
+ANSWER_FIELDS = ("correct_answer_normalized", "correct_answer_display", "blank_matcher", "explanation")
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def public_question(q):
+    """去掉答案和解析后的题目"""
+    return {key: value for key, value in q.items() if key not in ANSWER_FIELDS}
+
+
+class ExamService:
+    """
+    与传输层无关的服务逻辑：handle() 接收方法、路径、查询参数和 JSON 请求体，
+    返回 (状态码, JSON 对象)
+    """
+
+    def __init__(self, base_dir=None, grading_workers=None, grading_processes=False):
+        self.base_dir = base_dir
+        self._banks = {}
+        self._bank_locks = {}
+        self._storage_locks = {}
+        self._io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="exam-io")
+        if grading_processes:
+            self._grading_executor = ProcessPoolExecutor(max_workers=grading_workers)
+        else:
+            self._grading_executor = ThreadPoolExecutor(max_workers=grading_workers, thread_name_prefix="exam-grade")
+        self._routes = {
+            ("GET", "health"): self.health,
+            ("GET", "banks"): self.list_banks,
+            ("POST", "grade"): self.grade,
+            ("GET", "progress"): self.get_progress,
+            ("PUT", "progress"): self.put_progress,
+            ("DELETE", "progress"): self.delete_progress,
+            ("GET", "wrong"): self.get_wrong,
+            ("POST", "wrong/reviewed"): self.mark_reviewed,
+            ("GET", "diagnostics/timing"): self.timing,
+            ("GET", "metrics"): self.metrics,
+        }
+
+    def close(self):
+        self._io_executor.shutdown(wait=False)
+        self._grading_executor.shutdown(wait=False)
+
+    async def _run_io(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, lambda: func(*args, **kwargs))
+
+    # ---------- 题库 ----------
+    async def get_bank(self, bank):
+        """返回 (题目列表, 识别统计, 题目索引)；同一题库并发请求时只加载一次"""
+        metrics.CACHE_REQUESTS.labels("service_bank").inc()
+        cached = self._banks.get(bank)
+        if cached is not None:
+            return cached
+        if bank not in list_exam_files(self.base_dir):
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"找不到题库文件: {bank}")
+
+        lock = self._bank_locks.setdefault(bank, asyncio.Lock())
+        async with lock:
+            if bank not in self._banks:
+                metrics.CACHE_MISSES.labels("service_bank").inc()
+                path = resolve_exam_path(bank, self.base_dir)
+                if path is None:
+                    raise ServiceError(HTTPStatus.NOT_FOUND, f"找不到题库文件: {bank}")
+                questions, detection_stats, notices = await self._run_io(parse_question_bank, path)
+                if not questions:
+                    message = "; ".join(text for _, text in notices) or "题库中没有有效题目"
+                    raise ServiceError(HTTPStatus.UNPROCESSABLE_ENTITY, message)
+                self._banks[bank] = (questions, detection_stats, build_question_index(questions))
+        return self._banks[bank]
+
+    @staticmethod
+    def exam_id(bank):
+        return os.path.splitext(bank)[0]
+
+    def storage_lock(self, bank, user_id):
+        """同一学员、同一题库的存储读写串行执行，避免并发覆盖学员数据文件"""
+        return self._storage_locks.setdefault((user_id, self.exam_id(bank)), asyncio.Lock())
+
+    # ---------- 路由 ----------
+    async def handle(self, method, path, query, body):
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        try:
+            if len(parts) >= 3 and parts[0] == "banks" and parts[2] == "questions" and method == "GET":
+                if len(parts) == 3:
+                    return HTTPStatus.OK, await self.list_questions(parts[1], query)
+                if len(parts) == 4:
+                    return HTTPStatus.OK, await self.get_question(parts[1], parts[3])
+            handler = self._routes.get((method, "/".join(parts)))
+            if handler is None:
+                raise ServiceError(HTTPStatus.NOT_FOUND, f"未知接口: {method} {path}")
+            return HTTPStatus.OK, await handler(query, body)
+        except ServiceError as e:
+            return e.status, {"error": e.message}
+
+    @staticmethod
+    def _require(params, *names):
+        missing = [name for name in names if params.get(name) in (None, "")]
+        if missing:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"缺少参数: {', '.join(missing)}")
+        return [params[name] for name in names]
+
+    async def health(self, query, body):
+        return {"status": "ok", "banks_loaded": len(self._banks)}
+
+    async def metrics(self, query, body):
+        """返回字符串时按纯文本输出"""
+        return metrics.REGISTRY.generate_text()
+
+    async def timing(self, query, body):
+        return perf_timing.PROCESS_STATS.to_dict()
+
+    async def list_banks(self, query, body):
+        files = await self._run_io(list_exam_files, self.base_dir)
+        return {"banks": [{"file": name, "loaded": name in self._banks,
+                           "total": len(self._banks[name][0]) if name in self._banks else None}
+                          for name in files]}
+
+    async def list_questions(self, bank, query):
+        questions, detection_stats, _ = await self.get_bank(bank)
+        q_type = query.get("type")
+        try:
+            offset = max(0, int(query.get("offset", 0)))
+            limit = min(MAX_PAGE_SIZE, max(1, int(query.get("limit", 50))))
+        except ValueError:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "offset/limit 必须是整数")
+        matched = [q for q in questions if q["type"] == q_type] if q_type else questions
+        return {
+            "bank": bank,
+            "total": len(matched),
+            "offset": offset,
+            "questions": [public_question(q) for q in matched[offset:offset + limit]],
+        }
+
+    async def get_question(self, bank, qid):
+        _, _, question_index = await self.get_bank(bank)
+        q = question_index.get(qid)
+        if q is None:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"找不到题目: {qid}")
+        return public_question(q)
+
+    async def grade(self, query, body):
+        bank, qid = self._require(body, "bank", "qid")
+        answer = body.get("answer", "")
+        user_id = body.get("user_id", "")
+        _, _, question_index = await self.get_bank(bank)
+        q = question_index.get(qid)
+        if q is None:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"找不到题目: {qid}")
+
+        loop = asyncio.get_running_loop()
+        is_correct = await loop.run_in_executor(self._grading_executor, check_answer, answer, q)
+
+        if body.get("record"):
+            exam_id = self.exam_id(bank)
+            async with self.storage_lock(bank, user_id):
+                await self._run_io(storage.record_mastery_results, exam_id, [(qid, is_correct)], user_id=user_id)
+                await self._run_io(storage.append_attempts, exam_id, [(qid, is_correct)], "接口", user_id)
+                if not is_correct and answer:
+                    await self._run_io(storage.save_wrong_question, exam_id, q, answer, is_correct, user_id=user_id)
+
+        return {
+            "qid": qid,
+            "correct": is_correct,
+            "correct_answer": q["correct_answer_display"],
+            "explanation": q.get("explanation", ""),
+        }
+
+    async def get_progress(self, query, body):
+        bank, = self._require(query, "bank")
+        user_id = query.get("user_id", "")
+        async with self.storage_lock(bank, user_id):
+            progress, config, extra = await self._run_io(storage.load_progress, self.exam_id(bank), user_id=user_id)
+        return {"progress": progress, "config": config, "extra": extra}
+
+    async def put_progress(self, query, body):
+        bank, = self._require(body, "bank")
+        user_id = body.get("user_id", "")
+        async with self.storage_lock(bank, user_id):
+            saved = await self._run_io(storage.save_progress, self.exam_id(bank), body.get("progress", {}),
+                                       body.get("config"), body.get("extra"), user_id=user_id)
+        if not saved:
+            raise ServiceError(HTTPStatus.INTERNAL_SERVER_ERROR, "保存进度失败")
+        return {"saved": True}
+
+    async def delete_progress(self, query, body):
+        bank, = self._require(query, "bank")
+        user_id = query.get("user_id", "")
+        async with self.storage_lock(bank, user_id):
+            cleared = await self._run_io(storage.clear_progress, self.exam_id(bank), user_id=user_id)
+        return {"cleared": cleared}
+
+    async def get_wrong(self, query, body):
+        bank, = self._require(query, "bank")
+        user_id = query.get("user_id", "")
+        async with self.storage_lock(bank, user_id):
+            wrong_questions = await self._run_io(storage.load_wrong_questions, self.exam_id(bank), user_id=user_id)
+        # 错题本只保存题目引用，题目内容取自题库（题库已删除或无法加载时取自题目快照）
+        try:
+            _, _, question_index = await self.get_bank(bank)
+        except ServiceError:
+            question_index = None
+        wrong_questions = await self._run_io(storage.resolve_wrong_questions, self.exam_id(bank), wrong_questions,
+                                             question_index)
+        not_reviewed = len([wq for wq in wrong_questions if not wq.get('reviewed', False)])
+        return {
+            "stats": {"total": len(wrong_questions), "not_reviewed": not_reviewed},
+            "questions": wrong_questions,
+        }
+
+    async def mark_reviewed(self, query, body):
+        bank, qid = self._require(body, "bank", "qid")
+        user_id = body.get("user_id", "")
+        async with self.storage_lock(bank, user_id):
+            updated = await self._run_io(storage.update_wrong_question_status, self.exam_id(bank), qid,
+                                         body.get("reviewed", True), user_id=user_id)
+        return {"updated": updated}
+
+
+# ================== HTTP 传输层 ==================
+async def read_request(reader):
+    """读取一个 HTTP/1.1 请求，连接关闭时返回 None"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "请求行格式错误")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+
+def encode_response(status, payload, keep_alive):
+    if isinstance(payload, str):
+        data, content_type = payload.encode("utf-8"), metrics.CONTENT_TYPE
+    else:
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        content_type = "application/json; charset=utf-8"
+    status = HTTPStatus(status)
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + data
+
+
+def make_connection_handler(service):
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ServiceError as e:
+                    writer.write(encode_response(e.status, {"error": e.message}, False))
+                    break
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, raw_body = request
+                keep_alive = (headers.get("connection", "").lower() != "close" and version != "HTTP/1.0")
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    body = json.loads(raw_body) if raw_body else {}
+                    if not isinstance(body, dict):
+                        raise ValueError
+                except ValueError:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "请求体必须是JSON对象"}
+                else:
+                    try:
+                        status, payload = await service.handle(method, url.path, query, body)
+                    except Exception as e:
+                        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return handle_connection
+
+
+async def serve(host="127.0.0.1", port=8600, preload=(), **service_options):
+    service = ExamService(**service_options)
+    for bank in preload:
+        await service.get_bank(bank)
+    server = await asyncio.start_server(make_connection_handler(service), host, port)
+    print(f"考试服务已启动: http://{host}:{port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="考试服务（HTTP/JSON）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=None, help="判分线程/进程数")
+    parser.add_argument("--processes", action="store_true", help="判分使用进程池")
+    parser.add_argument("--preload", nargs="*", default=[], help="启动时预先加载的题库文件")
+    parser.add_argument("--metrics-textfile", help="定期把指标写入该文件（/metrics 接口始终可用）")
+    args = parser.parse_args(argv)
+    if args.metrics_textfile:
+        metrics.start_textfile_exporter(args.metrics_textfile)
+    storage_maintenance.start_sweeper_from_env()
+    try:
+        asyncio.run(serve(args.host, args.port, args.preload,
+                          grading_workers=args.workers, grading_processes=args.processes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+判分：答案标准化和各题型的判分规则
+
+答题界面、模拟考试、错题本、HTTP 服务和批量重新判分（regrade）都经由 grade_answer 判分，
+同一答案在各处的结果一致。
+
+填空题的答案在加载题库时编译为 BlankMatcher（见 compile_blank_answer），判分时多数情况
+只是集合查找；没有预编译的地方（错题本、重新判分）按答案文字缓存编译结果。
+
+模块本身只依赖标准库（re、unicodedata）；简答题用到的 difflib 在判分时才导入，
+导入本模块不会加载 pandas。
+"""
+import os
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from metrics import Counter
+from perf_timing import timed
+
+ANSWERS_GRADED = Counter("exam_answers_graded_total", "判分次数（按题型和结果）", ["type", "result"])
+
+OPTION_LETTERS = "ABCDEFGH"  # 选择题最多 8 个选项
+# 答案或所选选项开头的选项字母，如 "B"、"(C)"、"D. 文字"；字母后紧跟字母时（如 "delta"）不算
+OPTION_LABEL = re.compile(r'^[\(（\s]*([A-Ha-h])(?![A-Za-z])[\)）\s]*[\.．、:：]?\s*')
+
+
+def is_missing(value):
+    """空值判断（None、NaN、pd.NA 等），与 pd.isna 对单个值的结果一致，但不需要导入 pandas"""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:  # pd.NA 的比较结果无法转换为布尔值
+        return True
+
+
+def normalize_answer(answer):
+    """标准化答案字符串"""
+    if not answer or is_missing(answer):
+        return ""
+
+    answer = str(answer).strip()
+    if not answer:
+        return ""
+
+    # 转换为小写进行比较
+    answer_lower = answer.lower()
+
+    # 判断题标准化
+    if answer_lower in ["✅", "对", "正确", "√", "✓", "true", "t", "是", "yes", "y", "1", "正确", "对的"]:
+        return "对"
+    elif answer_lower in ["❌", "错", "错误", "×", "✗", "false", "f", "否", "no", "n", "0", "错误", "错的"]:
+        return "错"
+
+    # 选择题标准化（提取选项字母）
+    match = OPTION_LABEL.match(answer)
+    if match:
+        return match.group(1).upper()
+
+    return answer.strip()
+
+
+# ================== 填空题 ==================
+# 答案中分隔各空的符号（NFKC 之后全角的，；已变为半角）：以、分隔的是并列的几项，不要求顺序；
+# 出现 , 或 ; 时按顺序逐空比较
+BLANK_SEPARATOR = re.compile(r'[、,;]')
+_ORDERED_SEPARATORS = re.compile(r'[,;]')
+# 同一空的几种可接受答案以 | 或 / 分隔；/ 两侧都是字母或数字时（如 km/h、1/2）是答案的一部分
+ALTERNATIVE_SEPARATOR = re.compile(r'\||(?<![0-9A-Za-z])/|/(?![0-9A-Za-z])')
+# 数值答案：数值、可选的 ±允许误差、单位（如 "80km/h"、"5%"、"9.8±0.1"）
+_BLANK_NUMBER = re.compile(r'^([+-]?\d+(?:\.\d+)?)(?:±(\d+(?:\.\d+)?))?(\D*)$')
+_BLANK_IGNORED = re.compile(r'[\s"\'“”‘’「」『』]+')
+BLANK_NUMBER_TOLERANCE = 1e-9  # 答案没有写 ± 时数值的相对误差（只忽略 3.50 与 3.5 这类写法差异）
+# 文字答案允许的最大编辑距离（错别字容错），0 为不启用；可用环境变量 EXAM_BLANK_MAX_EDITS 设置
+BLANK_MAX_EDITS = int(os.environ.get("EXAM_BLANK_MAX_EDITS", "0"))
+# 数值答案带单位时是否接受省略单位的作答（如 "80" 对 "80km/h"），默认不接受；
+# 可用环境变量 EXAM_BLANK_UNIT_OPTIONAL=1 启用
+BLANK_UNIT_OPTIONAL = os.environ.get("EXAM_BLANK_UNIT_OPTIONAL", "0") == "1"
+BLANK_CACHE_SIZE = 8192  # 按答案文字缓存的编译结果数
+
+# 一个空：可接受的答案（标准化后）、数值答案 (数值, 允许误差, 单位)（不是数值时为 None）
+Blank = namedtuple("Blank", ["alternatives", "number"])
+# 一道填空题：整体可接受的写法（标准化后）、各空、是否按顺序比较、允许的编辑距离、是否可以省略单位
+BlankMatcher = namedtuple("BlankMatcher", ["whole", "blanks", "ordered", "max_edits", "unit_optional"])
+
+
+def normalize_blank(text):
+    """填空答案的标准化：NFKC（全角转半角）、不区分大小写、去掉空白和引号、去掉末尾的句号"""
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return _BLANK_IGNORED.sub("", text).rstrip("。.")
+
+
+def _parse_number(text):
+    """标准化后的文字 → (数值, 允许误差, 单位)，不是数值时返回 None"""
+    match = _BLANK_NUMBER.match(text)
+    if not match:
+        return None
+    value = float(match.group(1))
+    tolerance = float(match.group(2)) if match.group(2) else abs(value) * BLANK_NUMBER_TOLERANCE
+    return value, tolerance, match.group(3)
+
+
+def _compile_blank(text):
+    alternatives = frozenset(filter(None, (alt.rstrip("。.") for alt in ALTERNATIVE_SEPARATOR.split(text))))
+    number = _parse_number(text) if len(alternatives) == 1 else None
+    return Blank(alternatives, number)
+
+
+def compile_blank_answer(answer, max_edits=None, unit_optional=None):
+    """
+    填空题答案 → BlankMatcher：按分隔符拆成各空，每空的可接受答案为标准化后的 frozenset，
+    数值答案另记数值和允许误差
+    """
+    text = normalize_blank(answer)
+    parts = [part for part in BLANK_SEPARATOR.split(text) if part]
+    blanks = tuple(_compile_blank(part) for part in parts)
+    whole = {text}
+    if len(blanks) == 1:
+        whole |= blanks[0].alternatives
+    return BlankMatcher(frozenset(filter(None, whole)), blanks, bool(_ORDERED_SEPARATORS.search(text)),
+                        BLANK_MAX_EDITS if max_edits is None else max_edits,
+                        BLANK_UNIT_OPTIONAL if unit_optional is None else unit_optional)
+
+
+cached_blank_matcher = lru_cache(maxsize=BLANK_CACHE_SIZE)(compile_blank_answer)
+
+
+def _within_edits(a, b, limit):
+    """a、b 的编辑距离是否不超过 limit（逐行计算，某一行的最小值超过 limit 时提前结束）"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def _blank_matches(text, blank, matcher):
+    if text in blank.alternatives:
+        return True
+    if blank.number is not None:
+        number = _parse_number(text)
+        units = ("", blank.number[2]) if matcher.unit_optional else (blank.number[2],)
+        if number is not None and abs(number[0] - blank.number[0]) <= blank.number[1] and number[2] in units:
+            return True
+    # 错别字容错只用于较长的答案，避免短答案改一个字就算对
+    max_edits = matcher.max_edits
+    return bool(max_edits) and any(len(alt) > 2 * max_edits and _within_edits(text, alt, max_edits)
+                                   for alt in blank.alternatives)
+
+
+def match_blank(user_input, matcher):
+    """
+    填空题判分：整体写法一致时直接判对（集合查找）；否则按分隔符拆开逐空比较，
+    各空先查可接受答案，再比较数值，最后按编辑距离容错
+    """
+    text = normalize_blank(user_input)
+    if text in matcher.whole:
+        return True
+    if not matcher.blanks:
+        return False
+    parts = [part for part in BLANK_SEPARATOR.split(text) if part]
+    if len(parts) != len(matcher.blanks):
+        return False
+    if matcher.ordered:
+        return all(_blank_matches(part, blank, matcher) for part, blank in zip(parts, matcher.blanks))
+    # 不要求顺序：各项与各空的二分图有完美匹配时判对（几个空的可接受答案有重叠时，
+    # 先到的项占用的空可以让出来，如 "北京|上海、北京" 接受 "北京、上海"）
+    accepts = [[j for j, blank in enumerate(matcher.blanks) if _blank_matches(part, blank, matcher)]
+               for part in parts]
+    owner = {}  # 空的序号 -> 配给它的项的序号
+
+    def assign(i, visited):
+        for j in accepts[i]:
+            if j not in visited:
+                visited.add(j)
+                if j not in owner or assign(owner[j], visited):
+                    owner[j] = i
+                    return True
+        return False
+
+    return all(assign(i, set()) for i in range(len(parts)))
+
+
+def check_answer(user_input, question):
+    """判分函数：question 为题库中的题目"""
+    return grade_answer(user_input, question["type"], question["correct_answer_display"],
+                        question.get("blank_matcher"))
+
+
+@timed("grading.check_answer")
+def grade_answer(user_input, q_type, correct_answer, blank_matcher=None):
+    """
+    按题型和正确答案（显示形式）判分；错题本等只保存题型和答案的地方直接调用
+    blank_matcher 为加载题库时编译好的填空题答案，没有时按答案文字取缓存的编译结果
+    """
+    is_correct = _check_answer(user_input, q_type, correct_answer, blank_matcher)
+    ANSWERS_GRADED.labels(q_type or "", "correct" if is_correct else "wrong").inc()
+    return is_correct
+
+
+def _check_answer(user_input, q_type, correct_answer, blank_matcher=None):
+    """判分函数 - 修复版"""
+    if not user_input or str(user_input).strip() == "":
+        return False
+
+    user_input = str(user_input).strip()
+    correct_disp = str(correct_answer).strip()
+
+    if q_type == "填空":
+        return match_blank(user_input, blank_matcher or cached_blank_matcher(correct_disp))
+
+    # 标准化答案
+    user_norm = normalize_answer(user_input)
+    correct_norm = normalize_answer(correct_disp)
+
+    if q_type == "判断":
+        return user_norm == correct_norm
+
+    elif q_type == "单选":
+        # 提取用户答案中的选项标签
+        user_match = OPTION_LABEL.match(user_input)
+
+        if user_match and correct_norm and len(correct_norm) == 1 and correct_norm.isalpha():
+            # 比较选项字母
+            return user_match.group(1).upper() == correct_norm.upper()
+        else:
+            # 直接比较标准化后的答案
+            return user_norm == correct_norm
+
+    elif q_type == "简答":
+        # 简答题相似度判断
+        def clean_text(text):
+            if not text:
+                return ""
+            # 移除标点符号和空格
+            text = re.sub(r'[\s\W_]+', '', text, flags=re.UNICODE)
+            return text.lower()
+
+        user_clean = clean_text(user_input)
+        correct_clean = clean_text(correct_disp)
+
+        if len(correct_clean) == 0:
+            return False
+
+        from difflib import SequenceMatcher
+
+        similarity = SequenceMatcher(None, user_clean, correct_clean).ratio()
+        return similarity >= 0.7
+
+    return False
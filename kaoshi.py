@@ -1,283 +1,195 @@
 import streamlit as st
-import pandas as pd
-import re
 import os
-import json
-import pickle
-import hashlib
-from datetime import datetime
-from difflib import SequenceMatcher
+from datetime import datetime, timedelta
 import warnings
-import random
+from contextlib import nullcontext
+
+from bank_catalog import BankCatalog
+from metrics import CACHE_MISSES, CACHE_REQUESTS, start_exporters_from_env
+from perf_timing import PROCESS_STATS, SectionTimer, TimingStats, bind_session_stats, dump_json, timed
+from grading import check_answer, grade_answer
+from question_render import JUDGMENT_CHOICES, RenderCache
+from question_filter import STATUS_OPTIONS, AnswerBits, QuestionFilter, iter_positions
+from question_bank import QuestionBank, build_question_index, list_exam_files, parse_question_bank, resolve_exam_path
+from review_scheduler import apply_review, pop_due, schedule_fields
+from question_selector import AdaptiveSelector
+from session_stats import SessionStats
+from storage_maintenance import start_sweeper_from_env
+from storage import (
+    WRONG_PAGE_SIZE, WRONG_STATUSES, WrongFilter, clear_progress, get_wrong_questions_by_id, get_wrong_stats,
+    load_mastery, load_progress, mark_wrong_questions_reviewed, purge_reviewed_wrong_questions,
+    query_wrong_questions, append_attempts, migrate_progress_keys, record_mastery_results, save_mastery,
+    resolve_wrong_questions, save_progress, save_wrong_question, save_wrong_questions, set_error_reporter,
+    update_wrong_question_review, update_wrong_question_status,
+)
 
 warnings.filterwarnings('ignore')
 
 st.set_page_config(page_title="智能考试系统", page_icon="📚", layout="wide")
 st.title("📚 智能考试系统（优化版）")
 
+# 存储层的保存/加载失败直接提示在页面上
+set_error_reporter(st.error)
 
-# ================== 工具函数：错题管理 ==================
-def get_wrong_questions_filename(exam_id):
-    """获取错题本文件名"""
-    wrong_dir = "wrong_questions"
-    if not os.path.exists(wrong_dir):
-        os.makedirs(wrong_dir)
-    exam_hash = hashlib.md5(exam_id.encode()).hexdigest()[:8]
-    return os.path.join(wrong_dir, f"wrong_{exam_hash}.pkl")
-
-
-def save_wrong_question(exam_id, question_data, user_answer, is_correct):
-    """保存错题"""
-    try:
-        filename = get_wrong_questions_filename(exam_id)
-        wrong_questions = load_wrong_questions(exam_id)
-
-        question_id = f"{question_data.get('source', '')}_{question_data.get('row_index', 0)}"
-
-        # 更新或添加错题
-        exists = False
-        for i, wq in enumerate(wrong_questions):
-            if wq.get('question_id') == question_id:
-                wrong_questions[i].update({
-                    'user_answer': user_answer,
-                    'is_correct': is_correct,
-                    'last_attempt': datetime.now().isoformat(),
-                    'attempt_count': wq.get('attempt_count', 0) + 1,
-                    'last_correct': is_correct
-                })
-                exists = True
-                break
-
-        if not exists and not is_correct:  # 只保存错误的题目
-            wrong_question = {
-                'question_id': question_id,
-                'question': question_data.get('question', ''),
-                'question_type': question_data.get('type', ''),
-                'correct_answer': question_data.get('correct_answer_display', ''),
-                'correct_answer_normalized': question_data.get('correct_answer_normalized', ''),
-                'options': question_data.get('options', []),
-                'user_answer': user_answer,
-                'explanation': question_data.get('explanation', ''),
-                'source': question_data.get('source', ''),
-                'first_wrong': datetime.now().isoformat(),
-                'last_attempt': datetime.now().isoformat(),
-                'attempt_count': 1,
-                'reviewed': False,
-                'last_correct': False
-            }
-            wrong_questions.append(wrong_question)
-
-        with open(filename, 'wb') as f:
-            pickle.dump(wrong_questions, f)
-        return True
-    except Exception as e:
-        st.error(f"保存错题失败: {e}")
-        return False
-
-
-def load_wrong_questions(exam_id):
-    """加载错题"""
-    try:
-        filename = get_wrong_questions_filename(exam_id)
-        if os.path.exists(filename):
-            with open(filename, 'rb') as f:
-                return pickle.load(f)
-    except:
-        pass
-    return []
-
-
-def get_wrong_stats(exam_id):
-    """获取错题统计"""
-    wrong_questions = load_wrong_questions(exam_id)
-    total = len(wrong_questions)
-    not_reviewed = len([wq for wq in wrong_questions if not wq.get('reviewed', False)])
-    return {'total': total, 'not_reviewed': not_reviewed}
-
-
-def update_wrong_question_status(exam_id, question_id, reviewed=True):
-    """更新错题状态"""
-    try:
-        filename = get_wrong_questions_filename(exam_id)
-        if os.path.exists(filename):
-            with open(filename, 'rb') as f:
-                wrong_questions = pickle.load(f)
-
-            for wq in wrong_questions:
-                if wq.get('question_id') == question_id:
-                    wq['reviewed'] = reviewed
-                    break
-
-            with open(filename, 'wb') as f:
-                pickle.dump(wrong_questions, f)
-            return True
-    except:
-        pass
-    return False
-
-
-def reset_wrong_question_session_state():
-    """重置错题本的会话状态"""
-    keys_to_reset = []
-    for key in st.session_state.keys():
-        if key.startswith("wrong_") and key not in ["wrong_questions_list", "wrong_question_index"]:
-            keys_to_reset.append(key)
-
-    for key in keys_to_reset:
-        del st.session_state[key]
-
-
-# ================== 工具函数：进度保存/加载 ==================
-def get_progress_filename(exam_id):
-    """生成进度文件名"""
-    progress_dir = "progress_data"
-    if not os.path.exists(progress_dir):
-        os.makedirs(progress_dir)
-    exam_hash = hashlib.md5(exam_id.encode()).hexdigest()[:8]
-    return os.path.join(progress_dir, f"progress_{exam_hash}.pkl")
-
-
-def save_progress(exam_id, progress_data, config_data=None, extra_data=None):
-    """保存进度到文件"""
-    try:
-        filename = get_progress_filename(exam_id)
-        data = {
-            "progress": progress_data,
-            "config": config_data or {},
-            "extra": extra_data or {},
-            "timestamp": datetime.now().isoformat()
-        }
-        with open(filename, 'wb') as f:
-            pickle.dump(data, f)
-        return True
-    except Exception as e:
-        st.error(f"保存进度失败: {e}")
-        return False
-
-
-def load_progress(exam_id):
-    """从文件加载进度"""
-    try:
-        filename = get_progress_filename(exam_id)
-        if os.path.exists(filename):
-            with open(filename, 'rb') as f:
-                data = pickle.load(f)
-            if "timestamp" in data:
-                file_time = datetime.fromisoformat(data["timestamp"])
-                if (datetime.now() - file_time).days > 30:  # 30天后自动过期
-                    return {}, {}, {}
-            return data.get("progress", {}), data.get("config", {}), data.get("extra", {})
-    except Exception as e:
-        st.error(f"加载进度失败: {e}")
-    return {}, {}, {}
-
-
-def clear_progress(exam_id):
-    """清除进度文件"""
-    try:
-        filename = get_progress_filename(exam_id)
-        if os.path.exists(filename):
-            os.remove(filename)
-            return True
-    except:
-        pass
-    return False
-
-
-# ================== 判分函数 ==================
-def normalize_answer(answer):
-    """标准化答案字符串"""
-    if not answer or pd.isna(answer):
-        return ""
-
-    answer = str(answer).strip()
-    if not answer:
-        return ""
-
-    # 转换为小写进行比较
-    answer_lower = answer.lower()
-
-    # 判断题标准化
-    if answer_lower in ["✅", "对", "正确", "√", "✓", "true", "t", "是", "yes", "y", "1", "正确", "对的"]:
-        return "对"
-    elif answer_lower in ["❌", "错", "错误", "×", "✗", "false", "f", "否", "no", "n", "0", "错误", "错的"]:
-        return "错"
-
-    # 选择题标准化（提取选项字母）
-    match = re.match(r'^[\(（\s]*([A-Da-d])[\)）\s]*[\.．、:：]?\s*', answer)
-    if match:
-        return match.group(1).upper()
-
-    return answer.strip()
 
+@st.cache_resource
+def start_metrics_exporters():
+    """每个进程只启动一次指标导出（由 EXAM_METRICS_* 环境变量开启）"""
+    return start_exporters_from_env()
 
-def check_answer(user_input, question):
-    """判分函数 - 修复版"""
-    if not user_input or str(user_input).strip() == "":
-        return False
 
-    user_input = str(user_input).strip()
-    correct_disp = str(question["correct_answer_display"]).strip()
-    q_type = question["type"]
+start_metrics_exporters()
 
-    # 标准化答案
-    user_norm = normalize_answer(user_input)
-    correct_norm = normalize_answer(correct_disp)
 
-    if q_type == "判断":
-        return user_norm == correct_norm
+@st.cache_resource
+def start_storage_sweeper():
+    """每个进程只启动一次学员数据目录的后台清理（EXAM_SWEEP_INTERVAL=0 时不启动）"""
+    return start_sweeper_from_env()
 
-    elif q_type == "单选":
-        # 提取用户答案中的选项标签
-        user_match = re.match(r'^[\(（\s]*([A-Da-d])[\)）\s]*[\.．、:：]?\s*', user_input)
 
-        if user_match and correct_norm and len(correct_norm) == 1 and correct_norm.isalpha():
-            # 比较选项字母
-            return user_match.group(1).upper() == correct_norm.upper()
-        else:
-            # 直接比较标准化后的答案
-            return user_norm == correct_norm
+start_storage_sweeper()
 
-    elif q_type == "填空":
-        # 填空题直接比较标准化后的答案
-        return user_norm == correct_norm
+# 本会话的分段计时，本次运行中的计时同时计入会话统计和进程统计
+if "perf_stats" not in st.session_state:
+    st.session_state.perf_stats = TimingStats()
+bind_session_stats(st.session_state.perf_stats)
+rerun_timer = SectionTimer("render.rerun")
 
-    elif q_type == "简答":
-        # 简答题相似度判断
-        def clean_text(text):
-            if not text:
-                return ""
-            # 移除标点符号和空格
-            text = re.sub(r'[\s\p{P}\p{S}]+', '', text, flags=re.UNICODE)
-            return text.lower()
 
-        user_clean = clean_text(user_input)
-        correct_clean = clean_text(correct_disp)
+# ================== 错题本 ==================
+WRONG_STATUS_LABELS = {"due": "到期待复习", "unmastered": "未掌握", "mastered": "已掌握", "all": "全部"}
 
-        if len(correct_clean) == 0:
-            return False
 
-        similarity = SequenceMatcher(None, user_clean, correct_clean).ratio()
-        return similarity >= 0.7
-
-    return False
+def open_wrong_book(exam_id, wrong_filter=None, user_id=""):
+    """
+    进入错题本或改变筛选条件：会话中只保存已取出的题目ID、其余错题的到期堆和当前一页错题，
+    本轮的作答结果清空（作答控件的 key 随轮次更换）；没有到期的错题时提前复习未掌握的错题
+    """
+    wrong_filter = wrong_filter or WrongFilter()
+    page = query_wrong_questions(exam_id, wrong_filter, user_id=user_id)
+    ahead = not page.question_ids and wrong_filter.status == "due"
+    if ahead:
+        page = query_wrong_questions(exam_id, wrong_filter._replace(status="unmastered"), user_id=user_id)
+    previous = st.session_state.get("wrong_book") or {}
+    st.session_state.wrong_book = {
+        "filter": wrong_filter,
+        "ahead": ahead,
+        "ids": page.question_ids,
+        "queue": page.queue,
+        "index": 0,
+        "offset": 0,
+        "entries": resolve_wrong_questions(exam_id, page.entries, st.session_state.question_index),
+        "sheets": page.sheets,
+        "types": page.types,
+        "answers": {},
+        "round": previous.get("round", 0) + 1,
+    }
+
+
+def wrong_book_total(book):
+    """本轮符合条件的错题数：已取出的加上堆中其余的"""
+    return len(book["ids"]) + len(book["queue"])
+
+
+def drop_wrong_entry(position):
+    """把一道错题移出本轮的列表（已掌握或已从错题本删除），下次显示时重新读取所在的一页"""
+    book = st.session_state.wrong_book
+    del book["ids"][position]
+    book["entries"] = []
+    if book["index"] >= wrong_book_total(book):
+        book["index"] = max(0, wrong_book_total(book) - 1)
+
+
+def current_wrong_entry(exam_id, user_id=""):
+    """
+    当前错题；不在已读取的一页中时从错题本文件读取所在的一页（题目ID不够时先从到期堆中
+    取出），没有错题时返回 None
+    错题本只保存题目引用，题目内容按题目ID从当前题库取（题库中已删除的取自题目快照）
+    """
+    book = st.session_state.wrong_book
+    while wrong_book_total(book):
+        index = book["index"]
+        if not book["offset"] <= index < book["offset"] + len(book["entries"]):
+            offset = index // WRONG_PAGE_SIZE * WRONG_PAGE_SIZE
+            book["ids"].extend(pop_due(book["queue"], offset + WRONG_PAGE_SIZE - len(book["ids"])))
+            entries = get_wrong_questions_by_id(exam_id, book["ids"][offset:offset + WRONG_PAGE_SIZE],
+                                                user_id=user_id)
+            book["entries"] = resolve_wrong_questions(exam_id, entries, st.session_state.question_index)
+            book["offset"] = offset
+        entry = book["entries"][index - book["offset"]]
+        if entry is not None:
+            return entry
+        drop_wrong_entry(index)
+    return None
+
+
+# ================== 会话内的选题引擎 ==================
+def get_question_selector(exam_id, questions, user_id=""):
+    """获取当前会话中该学员、该题库的自适应选题引擎（题库重新加载后重建）"""
+    selectors = st.session_state.setdefault("question_selectors", {})
+    key = (user_id, exam_id)
+    selector = selectors.get(key)
+    if selector is None or selector.questions is not questions:
+        selector = AdaptiveSelector(questions, load_mastery(exam_id, user_id=user_id))
+        selectors[key] = selector
+    return selector
+
+
+def record_mastery(exam_id, qid, is_correct, mode="", user_id=""):
+    """作答后更新掌握度；会话中已有选题引擎时同步更新其抽样权重"""
+    record_mastery_batch(exam_id, [(qid, is_correct)], mode=mode, user_id=user_id)
+
+
+def record_mastery_batch(exam_id, results, mode="", user_id=""):
+    """批量更新掌握度（如模拟考试交卷），只读写一次掌握度文件；作答同时记入作答日志"""
+    append_attempts(exam_id, results, mode=mode, user_id=user_id)
+    selector = st.session_state.get("question_selectors", {}).get((user_id, exam_id))
+    if selector is None:
+        record_mastery_results(exam_id, results, user_id=user_id)
+        return
+    for qid, is_correct in results:
+        selector.record(qid, is_correct)
+    save_mastery(exam_id, selector.mastery, user_id=user_id)
+
+
+# ================== 会话答题统计 ==================
+def get_session_stats():
+    """当前练习的答题统计；旧版进度没有保存统计时按本次题目建立一次"""
+    stats = st.session_state.get("session_stats")
+    if stats is None:
+        stats = SessionStats.from_progress(st.session_state.filtered_questions, st.session_state.user_progress)
+        st.session_state.session_stats = stats
+    return stats
+
+
+def set_progress_record(qid, record):
+    """写入一条作答记录，并增量更新本次练习的统计和自主选题界面的作答状态"""
+    st.session_state.user_progress[qid] = record
+    for key in ["session_stats", "bank_status"]:
+        stats = st.session_state.get(key)
+        if stats is not None:
+            stats.update(qid, record)
+
+
+def save_session_progress(exam_id, current_index, user_id=""):
+    """保存本次练习的进度，统计随进度一起保存"""
+    stats = st.session_state.get("session_stats")
+    save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
+        "current_index": current_index,
+        "filtered_questions_length": len(st.session_state.filtered_questions),
+        "session_stats": stats.to_dict() if stats is not None else None
+    }, user_id=user_id)
 
 
 # ================== 初始化状态 ==================
 if "available_exam_files" not in st.session_state:
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(current_dir, "data")
-    xlsx_files = []
-    if os.path.exists(data_dir):
-        xlsx_files = [f for f in os.listdir(data_dir) if f.endswith(".xlsx")]
-    if not xlsx_files:
-        xlsx_files = [f for f in os.listdir(".") if f.endswith(".xlsx")]
-    st.session_state.available_exam_files = sorted(xlsx_files)
+    st.session_state.available_exam_files = list_exam_files()
 
 # 初始化其他状态变量
 state_defaults = [
     ("selected_exam_file", None),
     ("all_questions", []),
+    ("question_index", {}),
     ("filtered_questions", []),
     ("current_index", 0),
     ("user_progress", {}),
@@ -287,11 +199,11 @@ state_defaults = [
     ("answer_submitted", {}),
     ("detection_stats", {}),
     ("enhanced_loading", False),
+    ("sheet_selection", None),
     ("question_selection_mode", False),
     ("selected_question_indices", []),
     ("view_wrong_questions", False),
-    ("wrong_questions_list", []),
-    ("wrong_question_index", 0)
+    ("wrong_book", None)
 ]
 
 for key, default in state_defaults:
@@ -299,420 +211,484 @@ for key, default in state_defaults:
         st.session_state[key] = default
 
 
-# ================== 题型识别函数 ==================
-def intelligent_detect_question_type(question_text, correct_answer, options_text, explicit_type=None):
+LAZY_SHEET_ROWS = 3000  # 题库总行数超过该值时，工作表选择默认只选第一个工作表
+
+
+@st.cache_resource
+def get_question_bank(file_path):
+    """进程内共享的题库对象：只读取工作表列表，各工作表用到时才解析；找不到文件时返回 None"""
+    resolved_path = resolve_exam_path(file_path)
+    return QuestionBank(resolved_path) if resolved_path else None
+
+
+def sheet_cache_key(sheet_names, selected):
+    """所选工作表的缓存键：按工作簿顺序的元组；全选或没有记录时为 None，与整个题库共用缓存"""
+    key = tuple(name for name in sheet_names if name in selected)
+    return key if 0 < len(key) < len(sheet_names) else None
+
+
+def default_sheet_selection(bank):
+    """小题库或已全部解析过的题库默认选全部工作表，大题库只选第一个"""
+    names = bank.sheet_names
+    if sum(sheet.rows for sheet in bank.sheets) <= LAZY_SHEET_ROWS or all(map(bank.is_parsed, names)):
+        return names
+    return names[:1]
+
+
+@st.cache_resource
+def load_bank_sheets(file_path, sheet_names=None):
     """
-    智能识别题目类型 - 修复版
+    所选工作表（None 表示全部）的 (题目列表, 识别统计, 题目索引)
+    题库对象中已解析的工作表直接复用，只解析第一次用到的工作表
     """
-    # 如果Excel中明确指定了题型，优先使用
-    if explicit_type and str(explicit_type).strip() in ["判断", "单选", "填空", "简答", "多选"]:
-        return str(explicit_type).strip()
-
-    # 标准化输入
-    question_text = str(question_text).strip() if question_text else ""
-    correct_answer = str(correct_answer).strip() if correct_answer else ""
-    options_text = str(options_text).strip() if options_text else ""
-
-    # 1. 判断题识别
-    def is_judgment_question(q_text, ans):
-        """判断是否为判断题"""
-        # 答案特征
-        judgment_answers = {
-            "对": ["对", "正确", "√", "✓", "✅", "是", "yes", "true", "True", "T", "t"],
-            "错": ["错", "错误", "×", "✗", "❌", "否", "no", "false", "False", "F", "f"]
-        }
-
-        # 检查答案格式
-        ans_lower = str(ans).lower().strip()
-        for key, patterns in judgment_answers.items():
-            if ans_lower in patterns or ans in patterns:
-                # 检查题目特征
-                q_lower = q_text.lower()
-                judgment_keywords = [
-                    "是否正确", "是对是错", "判断正误", "判断对错", "下列说法是否正确",
-                    "请判断", "是否正确", "true or false", "判断下列说法", "正误"
-                ]
-                has_judgment_keyword = any(keyword in q_lower for keyword in judgment_keywords)
-
-                if has_judgment_keyword or not options_text or len(options_text) < 20:
-                    return key
-        return None
+    CACHE_MISSES.labels("bank").inc()
+    try:
+        bank = get_question_bank(file_path)
+        if bank is None:
+            st.error(f"❌ 找不到题库文件: {file_path}")
+            return [], {}, {}
 
-    judgment_type = is_judgment_question(question_text, correct_answer)
-    if judgment_type:
-        return "判断"
-
-    # 2. 选择题识别
-    answer_is_option = re.match(r'^[A-Da-d]$', str(correct_answer).strip()) is not None
-
-    # 检查选项文本是否包含选择题模式
-    choice_patterns = [
-        r'[A-Da-d][\.．、:：]\s*[^\s]+',
-        r'选项[ABCDabcd][\.．、:：]?\s*[^\s]+',
-        r'[①②③④][\.．、:：]\s*[^\s]+',
-        r'[1-4][\.．、:：]\s*[^\s]+',
-    ]
-
-    has_choice_pattern = False
-    option_count = 0
-    for pattern in choice_patterns:
-        matches = re.findall(pattern, options_text)
-        if len(matches) >= 2:
-            has_choice_pattern = True
-            option_count = len(matches)
-            break
-
-    # 检查题目是否包含选择题特征
-    question_lower = question_text.lower()
-    choice_keywords = ["下列", "选择", "哪", "哪些", "正确的是", "不正确的是", "选项", "最符合"]
-    has_choice_keyword = any(keyword in question_lower for keyword in choice_keywords)
-
-    # 特别处理以括号结束的题目
-    has_blank_at_end = re.search(r'（\s*）\s*[。.]?$', question_text) is not None
-    has_parentheses_at_end = re.search(r'\(\s*\)\s*[.。]?$', question_text) is not None
-
-    # 选择题识别条件
-    if answer_is_option and (has_choice_pattern or has_choice_keyword or has_blank_at_end or has_parentheses_at_end):
-        if option_count >= 2:
-            return "单选"
-
-    # 3. 填空题识别
-    blank_patterns = [
-        r'_{2,}', r'\(\)', r'（\s*）', r'【\s*】', r'______', r'……', r'---',
-    ]
-    has_blank = any(re.search(pattern, question_text) for pattern in blank_patterns)
-
-    fill_keywords = ["填空", "填写", "填入", "补充", "补全"]
-    has_fill_keyword = any(keyword in question_text for keyword in fill_keywords)
-
-    is_short_answer = 1 <= len(str(correct_answer).strip()) <= 30
-
-    if has_blank or has_fill_keyword or is_short_answer:
-        return "填空"
-
-    # 4. 简答题识别
-    essay_keywords = ["简述", "论述", "说明", "阐述", "分析", "解释", "为什么", "如何", "怎样", "什么", "意义"]
-    has_essay_keyword = any(keyword in question_text for keyword in essay_keywords)
-
-    is_long_answer = len(str(correct_answer).strip()) > 30
-
-    if has_essay_keyword or is_long_answer:
-        return "简答"
-
-    # 5. 默认判断
-    if answer_is_option and option_count >= 2:
-        return "单选"
-    elif is_short_answer:
-        return "填空"
-    else:
-        return "简答"
-
-
-def parse_options_from_cell(cell_content):
-    """从一个单元格中解析出选项（支持多种格式）"""
-    options = []
-
-    if not cell_content or pd.isna(cell_content) or str(cell_content).strip() == "":
-        return options
-
-    content = str(cell_content).strip()
-
-    # 尝试用换行符分割
-    lines = content.split('\n')
-
-    # 如果只有一个元素，尝试用分号或中文分号分割
-    if len(lines) == 1:
-        if ';' in content:
-            lines = content.split(';')
-        elif '；' in content:
-            lines = content.split('；')
-        elif '，' in content:
-            lines = content.split('，')
-        elif ',' in content:
-            lines = content.split(',')
-
-    # 清理每行
-    cleaned_lines = []
-    for line in lines:
-        line = line.strip()
-        if line:
-            cleaned_lines.append(line)
-
-    # 为每行分配标签
-    for i, line in enumerate(cleaned_lines):
-        if i >= 4:  # 最多处理4个选项
-            break
-
-        # 常见的选项标签
-        label_map = {0: 'A', 1: 'B', 2: 'C', 3: 'D'}
-        label = label_map.get(i, '')
-
-        # 检查行是否已经包含标签
-        match = re.match(r'^([A-Da-d])[\.．、:：]\s*(.*)', line)
-        if match:
-            label = match.group(1).upper()
-            text = match.group(2).strip()
-        else:
-            match = re.match(r'^选项([A-Da-d])[\.．、:：]?\s*(.*)', line)
-            if match:
-                label = match.group(1).upper()
-                text = match.group(2).strip()
+        st.info(f"正在加载文件: {bank.file_path}")
+
+        all_questions, detection_stats, notices = bank.load_sheets(sheet_names)
+        for level, message in notices:
+            if level == "error":
+                st.error(message)
             else:
-                match = re.match(r'^([①②③④])[\.．、:：]\s*(.*)', line)
-                if match:
-                    # 将中文数字转换为字母
-                    chinese_to_letter = {'①': 'A', '②': 'B', '③': 'C', '④': 'D'}
-                    label = chinese_to_letter.get(match.group(1), label)
-                    text = match.group(2).strip()
-                else:
-                    match = re.match(r'^([1-4])[\.．、:：]\s*(.*)', line)
-                    if match:
-                        # 将数字转换为字母
-                        num_to_letter = {'1': 'A', '2': 'B', '3': 'C', '4': 'D'}
-                        label = num_to_letter.get(match.group(1), label)
-                        text = match.group(2).strip()
-                    else:
-                        # 如果没有匹配到标签格式，使用分配的标签
-                        text = line
+                st.warning(message)
+        if not all_questions and not any(level == "error" for level, _ in notices):
+            st.error("❌ 未找到任何有效题目")
 
-        # 如果已经存在该标签的选项，跳过
-        if any(opt['label'] == label for opt in options):
-            continue
+        return all_questions, detection_stats, build_question_index(all_questions)
+
+    except Exception as e:
+        st.error(f"❌ 加载题库失败: {e}")
+        import traceback
+        st.error(f"详细错误信息: {traceback.format_exc()}")
+        return [], {}, {}
 
-        options.append({'label': label, 'text': text})
 
-    return options
+def load_questions_with_intelligent_detection(file_path):
+    """整个题库（全部工作表）"""
+    return load_bank_sheets(file_path)
 
 
-# ================== 题库加载函数 ==================
 @st.cache_resource
-def load_questions_with_intelligent_detection(file_path):
-    """智能题型识别题库加载函数 - 修复单元格选项解析"""
-    try:
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            # 尝试在data目录下查找
-            data_path = os.path.join("data", file_path)
-            if os.path.exists(data_path):
-                file_path = data_path
-            else:
-                # 尝试在当前目录下直接查找
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                abs_path = os.path.join(current_dir, file_path)
-                if os.path.exists(abs_path):
-                    file_path = abs_path
-                else:
-                    st.error(f"❌ 找不到题库文件: {file_path}")
-                    return [], {}
+def get_render_cache(exam_id):
+    """题库的渲染数据缓存（选项、正确答案显示、选项分析），答题界面和错题本共用，各会话共用"""
+    return RenderCache()
 
-        st.info(f"正在加载文件: {file_path}")
 
-        try:
-            sheets = pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
-        except Exception as e:
-            st.error(f"读取Excel文件失败: {e}")
-            return [], {}
-
-        if not sheets:
-            st.error("❌ Excel文件为空或格式不正确")
-            return [], {}
-
-        all_questions = []
-        detection_stats = {}
-
-        for sheet_name, df in sheets.items():
-            if df.empty:
-                continue
-
-            # 查找题目列和答案列
-            question_col = None
-            answer_col = None
-
-            # 先尝试查找标准列名
-            for col in df.columns:
-                col_str = str(col).strip()
-                if col_str == "题目" or col_str == "question":
-                    question_col = col
-                elif col_str == "正确答案" or col_str == "答案":
-                    answer_col = col
-
-            # 如果没找到标准列名，尝试模糊匹配
-            if question_col is None:
-                for col in df.columns:
-                    col_str = str(col).strip()
-                    if '题目' in col_str or 'question' in col_str.lower():
-                        question_col = col
-                        break
-
-            if answer_col is None:
-                for col in df.columns:
-                    col_str = str(col).strip()
-                    if '答案' in col_str or 'answer' in col_str.lower():
-                        answer_col = col
-                        break
-
-            if question_col is None or answer_col is None:
-                st.warning(f"工作表'{sheet_name}'中未找到题目列或答案列，跳过")
-                continue
-
-            sheet_stats = {
-                "total": 0,
-                "judgment": 0, "single_choice": 0, "fill_blank": 0, "essay": 0,
-                "detection_details": []
-            }
-
-            for idx, row in df.iterrows():
-                try:
-                    question = str(row[question_col]).strip()
-                    if pd.isna(question) or question == "" or question == "nan":
-                        continue
-
-                    correct_ans = str(row[answer_col]).strip() if not pd.isna(row[answer_col]) else ""
-
-                    # 获取题型列（如果存在）
-                    type_col = None
-                    for col in df.columns:
-                        if str(col).strip() == "题型":
-                            type_col = col
-                            break
-
-                    explicit_type = row[type_col] if type_col and not pd.isna(row[type_col]) else None
-
-                    # 获取解析列（如果存在）
-                    explanation_col = None
-                    for col in df.columns:
-                        if str(col).strip() == "解析":
-                            explanation_col = col
-                            break
-
-                    explanation = row[explanation_col] if explanation_col and not pd.isna(row[explanation_col]) else ""
-
-                    # 查找选项列
-                    options = []
-                    options_text_for_detection = ""
-
-                    # 1. 首先查找名为"选项"的列
-                    option_cell_content = None
-                    for col in df.columns:
-                        if str(col).strip() == "选项":
-                            if not pd.isna(row[col]):
-                                option_cell_content = row[col]
-                            break
-
-                    if option_cell_content is not None:
-                        options = parse_options_from_cell(option_cell_content)
-                        if options:
-                            options_text_for_detection = "\n".join(
-                                [f"{opt['label']}. {opt['text']}" for opt in options])
-                    else:
-                        # 2. 如果没有"选项"列，查找单独的A、B、C、D列
-                        options_dict = {}
-                        for label in ['A', 'B', 'C', 'D']:
-                            possible_columns = [
-                                str(label),
-                                f"选项{label}",
-                                f"{label}选项",
-                                f"选项 {label}",
-                            ]
-
-                            found = False
-                            for col_name in possible_columns:
-                                if col_name in df.columns and not pd.isna(row[col_name]) and str(row[col_name]).strip():
-                                    options_dict[label] = str(row[col_name]).strip()
-                                    found = True
-                                    break
-
-                        # 构建选项
-                        for label in ['A', 'B', 'C', 'D']:
-                            if label in options_dict:
-                                options.append({'label': label, 'text': options_dict[label]})
-
-                        if options:
-                            options_text_for_detection = "\n".join(
-                                [f"{opt['label']}. {opt['text']}" for opt in options])
-
-                    # 智能识别题型
-                    detected_type = intelligent_detect_question_type(
-                        question, correct_ans, options_text_for_detection, explicit_type
-                    )
+@st.cache_resource
+def get_question_filter(file_path, sheet_names=None):
+    """所选工作表题目的位集索引（按题型、工作表），各会话共用"""
+    CACHE_MISSES.labels("question_filter").inc()
+    questions, _, _ = load_bank_sheets(file_path, sheet_names)
+    return QuestionFilter(questions)
 
-                    # 标准化答案
-                    normalized_ans = normalize_answer(correct_ans)
 
-                    # 统计识别结果
-                    sheet_stats["total"] += 1
-                    type_key_map = {
-                        "判断": "judgment",
-                        "单选": "single_choice",
-                        "填空": "fill_blank",
-                        "简答": "essay"
-                    }
-                    stat_key = type_key_map.get(detected_type, "unknown")
-                    sheet_stats[stat_key] = sheet_stats.get(stat_key, 0) + 1
-
-                    question_data = {
-                        "original_index": len(all_questions),
-                        "question": question,
-                        "type": detected_type,
-                        "options": options,
-                        "correct_answer_normalized": normalized_ans,
-                        "correct_answer_display": correct_ans,
-                        "explanation": str(explanation) if pd.notna(explanation) else "",
-                        "source": f"{sheet_name}",
-                        "row_index": idx + 2,
-                        "sheet_name": sheet_name
-                    }
+@st.cache_resource
+def load_duplicate_index(file_path, sheet_names=None, threshold=0.8):
+    """可选的查重阶段：在已缓存的题库（所选工作表）上用 MinHash/LSH 检测近似重复题"""
+    # 查重和组卷模块依赖 numpy，只在用到时导入，不拖慢启动和其他页面
+    from question_dedup import build_duplicate_index
 
-                    all_questions.append(question_data)
+    CACHE_MISSES.labels("duplicate_index").inc()
+    CACHE_REQUESTS.labels("bank").inc()
+    questions, _, _ = load_bank_sheets(file_path, sheet_names)
+    return build_duplicate_index(questions, threshold)
 
-                except Exception as e:
-                    continue
 
-            if sheet_stats["total"] > 0:
-                detection_stats[sheet_name] = sheet_stats
+def scan_bank_metadata(file_path):
+    """题库目录的扫描函数：只返回识别统计和提示信息"""
+    _, detection_stats, notices = parse_question_bank(file_path)
+    return detection_stats, notices
 
-        if not all_questions:
-            st.error("❌ 未找到任何有效题目")
-            return [], {}
 
-        return all_questions, detection_stats
+@st.cache_resource
+def get_bank_catalog():
+    """进程内共享的题库目录，所有会话共用同一个后台扫描线程"""
+    return BankCatalog(os.path.join("catalog_data", "bank_catalog.json"), scan_bank_metadata)
+
+
+@timed("render.catalog_rows")
+def build_catalog_rows(exam_files, catalog):
+    """根据题库目录生成选择界面的题库信息表"""
+    rows = []
+    for file_name in exam_files:
+        file_path = resolve_exam_path(file_name)
+        entry = catalog.get(file_path) if file_path else None
+        row = {"题库": file_name}
+        if entry is None:
+            row.update({"状态": "扫描中…", "题目数": None, "工作表": None})
+        elif entry.get("error"):
+            row.update({"状态": entry["error"], "题目数": None, "工作表": None})
+        else:
+            row.update({
+                "状态": "✅",
+                "题目数": entry["total"],
+                "工作表": len(entry["sheets"]),
+            })
+            for t_name in ["判断", "单选", "填空", "简答"]:
+                row[t_name] = entry["type_counts"].get(t_name, 0)
+            row["修改时间"] = entry["modified"].replace("T", " ")
+            row["解析耗时(秒)"] = entry["parse_seconds"]
+        rows.append(row)
+    return rows
+
+
+# ================== 模拟考试 ==================
+@st.cache_resource
+def load_paper_set(path):
+    """读取预生成的试卷集（进程内共享，考试过程中不再抽样）"""
+    from mock_exam import PaperSet
 
-    except Exception as e:
-        st.error(f"❌ 加载题库失败: {e}")
-        import traceback
-        st.error(f"详细错误信息: {traceback.format_exc()}")
-        return [], {}
+    CACHE_MISSES.labels("paper_set").inc()
+    return PaperSet.load(path)
+
+
+def render_countdown(deadline):
+    """显示考试剩余时间"""
+    remaining = int((datetime.fromisoformat(deadline) - datetime.now()).total_seconds())
+    if remaining > 0:
+        st.metric("⏱️ 剩余时间", f"{remaining // 60:02d}:{remaining % 60:02d}")
+    else:
+        st.error("⏰ 考试时间已到，请立即交卷！")
+
+
+# 支持局部刷新时每秒只刷新倒计时，不重跑整张试卷
+if hasattr(st, "fragment"):
+    render_countdown = st.fragment(run_every=1)(render_countdown)
+
+
+def render_mock_input(q, key, render_cache):
+    """模拟考试中单道题的作答控件，返回作答内容"""
+    if q["type"] == "单选" and q["options"]:
+        choices = render_cache.question(q).choices
+        if choices:
+            return st.radio("请选择正确答案：", choices, index=None, key=key, label_visibility="collapsed")
+        return st.text_input("请输入答案：", key=key, label_visibility="collapsed")
+    elif q["type"] == "判断":
+        choice = st.radio("请判断：", JUDGMENT_CHOICES, index=None, key=key, horizontal=True,
+                          label_visibility="collapsed")
+        if choice:
+            return "对" if choice == JUDGMENT_CHOICES[0] else "错"
+        return None
+    elif q["type"] == "简答":
+        return st.text_area("请简要回答：", key=key, height=100, label_visibility="collapsed")
+    return st.text_input("请填写答案：", key=key, label_visibility="collapsed")
+
+
+def grade_mock_exam(paper, answers):
+    """模拟考试判分，返回结果字典"""
+    details = []
+    by_type = {}
+    for q, user_ans in zip(paper, answers):
+        is_correct = check_answer(user_ans, q)
+        details.append({"qid": q["qid"], "answer": user_ans or "", "correct": is_correct})
+        type_stat = by_type.setdefault(q["type"], {"total": 0, "correct": 0})
+        type_stat["total"] += 1
+        type_stat["correct"] += int(is_correct)
+    return {
+        "details": details,
+        "by_type": by_type,
+        "correct": sum(d["correct"] for d in details),
+        "total": len(details),
+    }
+
+
+def query_param(name):
+    """地址栏参数的值（没有时为 None）；st.query_params 在 Streamlit 1.30 之前不存在，使用旧接口"""
+    if hasattr(st, "query_params"):
+        return st.query_params.get(name)
+    values = st.experimental_get_query_params().get(name)
+    return values[-1] if values else None
+
+
+def diagnostics_enabled():
+    """诊断面板默认隐藏：地址栏加 ?diag=1 或设置环境变量 EXAM_DIAGNOSTICS=1 时显示"""
+    return query_param("diag") == "1" or os.environ.get("EXAM_DIAGNOSTICS") == "1"
+
+
+def render_diagnostics_panel():
+    """侧边栏中的性能诊断面板：各代码段的耗时和调用次数"""
+    with st.expander("🩺 性能诊断"):
+        scope = st.radio("统计范围", ["本会话", "本进程"], horizontal=True, key="diag_scope")
+        stats = st.session_state.perf_stats if scope == "本会话" else PROCESS_STATS
+        rows = stats.rows()
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("暂无计时数据")
+        st.caption(f"统计开始于 {stats.started_at.replace('T', ' ')}")
+
+        st.download_button("⬇️ 导出JSON", data=dump_json(st.session_state.perf_stats),
+                           file_name="perf_timing.json", mime="application/json", use_container_width=True)
+        if st.button("🧹 清空本会话统计", use_container_width=True):
+            st.session_state.perf_stats.reset()
+            st.rerun()
+
+
+# ================== 学习分析（管理员） ==================
+def admin_enabled():
+    """学习分析页面默认隐藏：地址栏加 ?admin=1 或设置环境变量 EXAM_ADMIN=1 时显示入口"""
+    return query_param("admin") == "1" or os.environ.get("EXAM_ADMIN") == "1"
+
+
+@st.cache_resource
+def get_attempt_analytics():
+    """进程内共享的分析引擎，每次刷新只读取作答日志新增的部分"""
+    from analytics import AttemptAnalytics
+    return AttemptAnalytics()
+
+
+def deferred_downloads_supported():
+    """st.download_button 是否支持点击时才生成数据（data 传函数、on_click="ignore"，Streamlit 较新版本）"""
+    try:
+        from streamlit.runtime.media_file_manager import MediaFileManager
+    except ImportError:
+        return False
+    return hasattr(MediaFileManager, "add_deferred")
+
+
+def render_export_panel():
+    """
+    导出学员的作答结果和错题本；点击下载时才生成文件，逐个学员写入临时文件
+    旧版 Streamlit 不支持点击时生成，先点击“生成导出文件”，生成的内容保存在会话中
+    """
+    from data_export import EXPORT_FORMATS, export_to_tempfile
+
+    with st.expander("📤 导出学员数据"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            kind = st.radio("导出内容", ["results", "wrong"], key="export_kind",
+                            format_func=lambda k: "作答结果" if k == "results" else "错题本")
+        with col2:
+            fmt = st.radio("格式", list(EXPORT_FORMATS), key="export_format", format_func=str.upper)
+        with col3:
+            exam_ids = [os.path.splitext(f)[0] for f in st.session_state.available_exam_files]
+            scope = st.selectbox("题库", ["全部题库"] + exam_ids, key="export_exam")
+
+        exam_id = None if scope == "全部题库" else scope
+        mime, extension = EXPORT_FORMATS[fmt]
+        file_stem = "作答结果" if kind == "results" else "错题本"
+        file_name = f"{file_stem}_{exam_id or '全部'}_{datetime.now():%Y%m%d}.{extension}"
+        if deferred_downloads_supported():
+            st.download_button("⬇️ 下载", data=lambda: export_to_tempfile(kind, fmt, exam_id=exam_id),
+                               file_name=file_name, mime=mime, use_container_width=True, on_click="ignore")
+            return
+
+        export_key = (kind, fmt, exam_id)
+        if st.button("📦 生成导出文件", use_container_width=True):
+            with export_to_tempfile(kind, fmt, exam_id=exam_id) as stream:
+                st.session_state.export_file = (export_key, stream.read())
+        export_file = st.session_state.get("export_file")
+        if export_file is not None and export_file[0] == export_key:
+            st.download_button("⬇️ 下载", data=export_file[1], file_name=file_name, mime=mime,
+                               use_container_width=True)
+
+
+def render_storage_panel():
+    """学员数据目录的磁盘占用；遍历目录较慢，点击时才统计"""
+    from storage_maintenance import disk_usage, format_bytes, sweep
+
+    with st.expander("💾 磁盘占用"):
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("📊 统计磁盘占用", use_container_width=True):
+                st.session_state.disk_usage = disk_usage()
+        with col2:
+            if st.button("🧹 立即清理", use_container_width=True,
+                         help="删除过期进度和残留临时文件，把旧格式文件迁移到分片目录"):
+                result = sweep()
+                st.success(f"过期 {result['expired']}，迁移 {result['migrated']}，临时文件 {result['tmp_removed']}，"
+                           f"释放 {format_bytes(result['freed_bytes'])}，失败 {result['errors']}")
+                st.session_state.disk_usage = disk_usage()
+
+        rows = st.session_state.get("disk_usage")
+        if rows:
+            st.dataframe([{
+                "目录": row["directory"],
+                "文件数": row["files"],
+                "占用": format_bytes(row["bytes"]),
+                "旧格式": row["legacy_files"],
+                "已过期": row["expired_files"],
+                "临时文件": row["tmp_files"],
+                "最早修改": datetime.fromtimestamp(row["oldest"]).strftime("%Y-%m-%d") if row["oldest"] else "-",
+            } for row in rows], hide_index=True, use_container_width=True)
+
+
+def render_regrade_panel():
+    """修改判分规则或题库答案后，重新评判所选题库所有学员保存的作答；先检查变化，确认后再写回"""
+    from regrade import regrade_exam
+
+    with st.expander("🔁 重新判分"):
+        bank_file = st.selectbox("题库", st.session_state.available_exam_files, key="regrade_bank")
+        col1, col2 = st.columns(2)
+        with col1:
+            check = st.button("🔍 检查判分变化", use_container_width=True)
+        with col2:
+            apply = st.button("✍️ 重新判分并写回", use_container_width=True,
+                              help="按当前的判分规则和题库答案更新学员进度和错题本中的判分结果")
+        if bank_file and (check or apply):
+            _, _, question_index = load_questions_with_intelligent_detection(bank_file)
+            if question_index:
+                result = regrade_exam(os.path.splitext(bank_file)[0], question_index, apply=apply)
+                st.session_state.regrade_result = (bank_file, apply, result)
+
+        saved = st.session_state.get("regrade_result")
+        if saved and saved[0] == bank_file:
+            _, applied, result = saved
+            rate = result.graded / result.seconds if result.seconds else 0
+            st.success(f"{result.files} 个文件，重新判分 {result.graded} 条作答，用时 {result.seconds:.2f} 秒"
+                       f"（{rate:,.0f} 条/秒），判分变化 {len(result.changes)} 条，失败 {result.errors} 个文件"
+                       + ("，已写回" if applied else ""))
+            if result.changes:
+                st.dataframe([{
+                    "学员": change.user_id or "-",
+                    "题目ID": change.qid,
+                    "来源": "进度" if change.kind == "progress" else "错题本",
+                    "答案": change.answer,
+                    "原判分": "对" if change.old else "错",
+                    "新判分": "对" if change.new else "错",
+                } for change in result.changes], hide_index=True, use_container_width=True)
+
+
+def render_analytics_page():
+    """所有学员的作答统计：题目难度和区分度、各工作表和题型的正确率"""
+    from analytics import MIN_LEARNERS, backfill_from_history
+
+    analytics = get_attempt_analytics()
+    st.header("📈 学习分析")
+
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col2:
+        if st.button("📥 导入历史记录", use_container_width=True,
+                     help="把启用作答日志之前的进度和错题导入分析（只执行一次）"):
+            imported = backfill_from_history()
+            st.success("历史记录已导入过" if imported is None else f"已导入 {imported} 条历史作答")
+    with col3:
+        if st.button("↩️ 返回", use_container_width=True):
+            st.session_state.view_analytics = False
+            st.rerun()
+
+    render_export_panel()
+    render_storage_panel()
+    render_regrade_panel()
+
+    with timed("analytics.refresh"):
+        try:
+            analytics.refresh()
+        except ValueError as e:
+            # 新增的日志行解析失败时读取位置不前进，下次刷新重新读取；先显示已读取的数据
+            st.error(f"读取作答日志失败: {e}")
+    exam_ids = analytics.exam_ids()
+    if not exam_ids:
+        st.info("暂无作答记录")
+        return
+    with col1:
+        exam_id = st.selectbox("题库", exam_ids, key="analytics_exam")
+
+    summary = analytics.summary(exam_id)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("作答次数", f"{summary['attempts']:,}")
+    col2.metric("学员数", summary["learners"])
+    col3.metric("涉及题数", summary["questions"])
+    col4.metric("总体正确率", f"{summary['accuracy'] * 100:.1f}%")
+
+    # 题干、题型和工作表来自已缓存的题库；题库文件不在时只显示题目ID
+    question_index = {}
+    bank_file = next((f for f in st.session_state.available_exam_files
+                      if os.path.splitext(f)[0] == exam_id), None)
+    if bank_file:
+        CACHE_REQUESTS.labels("bank").inc()
+        _, _, question_index = load_questions_with_intelligent_detection(bank_file)
+
+    def question_rows(frame):
+        rows = []
+        for item in frame.itertuples(index=False):
+            q = question_index.get(item.qid, {})
+            rows.append({
+                "题目": q.get("question", item.qid),
+                "题型": q.get("type", ""),
+                "工作表": q.get("sheet_name", ""),
+                "作答次数": item.attempts,
+                "作答人数": item.learners,
+                "正确率": f"{item.difficulty * 100:.1f}%",
+                "区分度": "" if item.discrimination != item.discrimination else f"{item.discrimination:.2f}",
+            })
+        return rows
+
+    with timed("analytics.question_stats"):
+        items = analytics.question_stats(exam_id)
+    col1, col2 = st.columns(2)
+    with col1:
+        min_attempts = st.number_input("最少作答次数", min_value=1, value=5, key="analytics_min_attempts")
+    with col2:
+        top_n = st.slider("显示题数", min_value=10, max_value=100, value=20, step=10, key="analytics_top_n")
+    items = items[items["attempts"] >= min_attempts]
+
+    st.subheader("🔻 正确率最低的题目")
+    if items.empty:
+        st.caption("没有达到作答次数的题目")
+    else:
+        st.dataframe(question_rows(items.head(top_n)), hide_index=True, use_container_width=True)
+
+    st.subheader("⚠️ 区分度最低的题目")
+    st.caption(f"区分度为该题得分与学员其余题目正确率的相关系数，作答人数不少于 {MIN_LEARNERS} 人时计算；"
+               "接近 0 或为负说明该题不能区分掌握好坏，可能题目或答案有问题")
+    discriminating = items.dropna(subset=["discrimination"]).sort_values("discrimination", kind="stable")
+    if discriminating.empty:
+        st.caption("作答人数不足，暂无区分度数据")
+    else:
+        st.dataframe(question_rows(discriminating.head(top_n)), hide_index=True, use_container_width=True)
+
+    for by, title in [("sheet_name", "📄 各工作表正确率"), ("type", "🧩 各题型正确率")]:
+        st.subheader(title)
+        groups = analytics.group_stats(exam_id, question_index, by=by)
+        groups = groups.rename(columns={"attempts": "作答次数", "learners": "作答人数",
+                                        "questions": "题数", "accuracy": "正确率"})
+        groups["正确率"] = (groups["正确率"] * 100).round(1).astype(str) + "%"
+        st.dataframe(groups, hide_index=True, use_container_width=True)
 
 
 # ================== 主界面 ==================
 # 侧边栏
+sidebar_timer = SectionTimer("render.sidebar")
 with st.sidebar:
     st.header("🎯 系统导航")
 
+    # 进度和错题本按学员分别保存，留空时使用共享记录
+    user_id = st.text_input("👤 学员（姓名或工号）", key="user_id",
+                            help="进度和错题本按学员分别保存，留空则使用共享记录").strip()
+
     if st.session_state.get("exam_config"):
         exam_id = st.session_state.exam_config.get("exam_id", "unknown")
         st.info(f"当前题库: {exam_id}")
 
         # 显示错题统计
-        wrong_stats = get_wrong_stats(exam_id)
+        wrong_stats = get_wrong_stats(exam_id, user_id=user_id)
         if wrong_stats['total'] > 0:
             st.warning(f"⚠️ 错题数: {wrong_stats['total']}")
 
             if st.button("📖 查看错题本", use_container_width=True):
-                wrong_questions = load_wrong_questions(exam_id)
-                st.session_state.wrong_questions_list = wrong_questions
-                st.session_state.wrong_question_index = 0
+                # 按下次复习时间从到期最久的错题开始；每次进入都从未作答的状态开始
+                open_wrong_book(exam_id, user_id=user_id)
                 st.session_state.view_wrong_questions = True
-                # 重置错题本的会话状态，确保每次进入都不显示答案
-                reset_wrong_question_session_state()
+                st.session_state.view_analytics = False
                 st.rerun()
 
     st.markdown("---")
     st.subheader("🛠️ 系统工具")
 
+    if admin_enabled() and st.button("📈 学习分析", use_container_width=True):
+        st.session_state.view_analytics = True
+        st.session_state.view_wrong_questions = False
+        st.rerun()
+
     if st.button("🔄 重新开始", use_container_width=True):
         for key in list(st.session_state.keys()):
-            if key not in ["available_exam_files"]:
+            if key not in ["available_exam_files", "user_id", "perf_stats"]:
                 del st.session_state[key]
         st.rerun()
 
@@ -726,250 +702,229 @@ with st.sidebar:
     5. 答错题目自动保存
     6. 下次进入可继续上次进度
     """)
+sidebar_timer.stop()
+page_timer = SectionTimer("render.page")
+
+# ================== 学习分析界面 ==================
+if st.session_state.get("view_analytics", False) and admin_enabled():
+    render_analytics_page()
 
 # ================== 错题本界面 ==================
-if st.session_state.get("view_wrong_questions", False):
+elif st.session_state.get("view_wrong_questions", False):
     exam_id = st.session_state.exam_config.get("exam_id", "unknown") if st.session_state.get(
         "exam_config") else "unknown"
-    wrong_questions = st.session_state.wrong_questions_list
+    if st.session_state.wrong_book is None:
+        open_wrong_book(exam_id, user_id=user_id)
+    book = st.session_state.wrong_book
+    wrong_filter = book["filter"]
+
+    # 筛选条件（控件 key 随轮次更换，重新进入或改变条件后按新的条件显示）
+    with st.expander("🔎 筛选和批量操作", expanded=wrong_filter != WrongFilter()):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            filter_sheets = st.multiselect("📄 工作表", book["sheets"], placeholder="全部工作表",
+                                           default=[s for s in wrong_filter.sheets if s in book["sheets"]],
+                                           key=f"wrong_sheets_{book['round']}")
+        with col2:
+            filter_types = st.multiselect("🧩 题型", book["types"], placeholder="全部题型",
+                                          default=[t for t in wrong_filter.types if t in book["types"]],
+                                          key=f"wrong_types_{book['round']}")
+        with col3:
+            filter_status = st.selectbox("📊 状态", WRONG_STATUSES, index=WRONG_STATUSES.index(wrong_filter.status),
+                                         format_func=WRONG_STATUS_LABELS.get, key=f"wrong_status_{book['round']}")
+        with col4:
+            filter_attempts = st.number_input("🔁 最少作答次数", min_value=0, step=1,
+                                              value=wrong_filter.min_attempts, key=f"wrong_attempts_{book['round']}")
+        new_filter = WrongFilter(tuple(filter_sheets), tuple(filter_types), filter_status, int(filter_attempts))
+        if new_filter != wrong_filter:
+            open_wrong_book(exam_id, new_filter, user_id=user_id)
+            st.rerun()
 
-    if not wrong_questions:
-        st.success("🎉 恭喜！您目前没有需要复习的错题！")
+        # 批量操作：整本错题本只读写一次
+        col1, col2 = st.columns(2)
+        with col1:
+            if wrong_filter.status != "mastered" and wrong_book_total(book) and \
+                    st.button(f"✅ 将筛选出的 {wrong_book_total(book)} 道错题标记为已掌握", use_container_width=True):
+                mark_wrong_questions_reviewed(exam_id, book["ids"] + [qid for _, qid in book["queue"]],
+                                              user_id=user_id)
+                open_wrong_book(exam_id, wrong_filter, user_id=user_id)
+                st.rerun()
+        with col2:
+            if st.button("🧹 清除已掌握的错题", use_container_width=True,
+                         help="从错题本中删除所有已标记为掌握的错题"):
+                purge_reviewed_wrong_questions(exam_id, user_id=user_id)
+                open_wrong_book(exam_id, wrong_filter, user_id=user_id)
+                st.rerun()
+
+    wq = current_wrong_entry(exam_id, user_id=user_id)
+
+    if wq is None:
+        if wrong_filter == WrongFilter():
+            st.success("🎉 恭喜！您目前没有需要复习的错题！")
+        else:
+            st.info("没有符合筛选条件的错题")
         if st.button("返回主界面"):
             st.session_state.view_wrong_questions = False
             st.rerun()
     else:
-        idx = st.session_state.wrong_question_index
-        if idx < len(wrong_questions):
-            wq = wrong_questions[idx]
+        idx = book["index"]
+        total = wrong_book_total(book)
+        qid = wq["question_id"]
+        payload = get_render_cache(exam_id).wrong_entry(wq)
+
+        st.header(f"📖 错题本（{idx + 1}/{total}）")
+        if book["ahead"]:
+            st.info("当前没有到期的错题，以下为即将到期的错题，可提前复习")
+
+        # 进度条
+        progress = (idx + 1) / total
+        st.progress(progress, text=f"复习进度: {idx + 1}/{total}")
+        if total > WRONG_PAGE_SIZE:
+            st.caption(f"第 {idx // WRONG_PAGE_SIZE + 1}/{(total - 1) // WRONG_PAGE_SIZE + 1} 页，"
+                       f"每页 {WRONG_PAGE_SIZE} 题")
+
+        # 错题信息
+        st.markdown("---")
+        st.subheader("📝 题目内容")
+        st.markdown(f"**题目：** {wq.get('question', '')}")
+        st.caption(f"题型：{wq.get('question_type', '')} | 来源：{wq.get('source', '')} | "
+                   f"作答 {wq.get('attempt_count', 0)} 次")
 
-            st.header(f"📖 错题本（{idx + 1}/{len(wrong_questions)}）")
+        st.markdown("---")
+        st.markdown("**✍️ 请重新作答：**")
 
-            # 进度条
-            progress = (idx + 1) / len(wrong_questions)
-            st.progress(progress, text=f"复习进度: {idx + 1}/{len(wrong_questions)}")
+        # 本轮的作答结果：题目ID -> (作答内容, 是否正确)
+        review = book["answers"].get(qid)
+        is_submitted = review is not None
 
-            # 错题信息
-            st.markdown("---")
-            st.subheader("📝 题目内容")
-            st.markdown(f"**题目：** {wq.get('question', '')}")
-            st.caption(f"题型：{wq.get('question_type', '')} | 来源：{wq.get('source', '')}")
+        user_ans = None
+        input_key = f"wrong_input_{book['round']}_{qid}"
 
-            st.markdown("---")
-            st.markdown("**✍️ 请重新作答：**")
+        if not is_submitted:
+            # 根据题型显示不同的输入方式
+            if wq.get('question_type') == "单选":
+                if payload.choices:
+                    selected = st.radio("请选择正确答案：", payload.choices, index=None, key=input_key)
+                    if selected:
+                        # 按选项字母作答
+                        user_ans = payload.choice_answers[selected]
+                else:
+                    user_ans = st.text_input("请输入答案：", value="", key=input_key)
 
-            # 检查是否已提交（使用当前错题的会话状态）
-            submitted_key = f"wrong_submitted_{wq.get('question_id', idx)}"
-            is_submitted = st.session_state.get(submitted_key, False)
+            elif wq.get('question_type') == "判断":
+                choice = st.radio("请判断：", JUDGMENT_CHOICES, index=None, key=input_key)
+                if choice:
+                    user_ans = "对" if choice == JUDGMENT_CHOICES[0] else "错"
 
-            user_ans = None
-            input_key = f"wrong_input_{wq.get('question_id', idx)}"
+            elif wq.get('question_type') == "填空":
+                user_ans = st.text_input("请填写答案：", value="", key=input_key)
 
-            if not is_submitted:
-                # 根据题型显示不同的输入方式
-                if wq.get('question_type') == "单选":
-                    options = wq.get('options', [])
-                    if options:
-                        choices = []
-                        for opt in options:
-                            if opt.get('label') and opt.get('text'):
-                                choices.append(f"{opt['label']}. {opt['text']}")
-                            elif opt.get('text'):
-                                choices.append(opt['text'])
-
-                        if choices:
-                            selected = st.radio("请选择正确答案：", choices, index=None, key=input_key)
-                            if selected:
-                                # 提取选项字母
-                                match = re.match(r'^[\(（\s]*([A-Da-d])[\)）\s]*[\.．、:：]?\s*', selected)
-                                if match:
-                                    user_ans = match.group(1).upper()
-                                else:
-                                    user_ans = selected
-                        else:
-                            user_ans = st.text_input("请输入答案：", value="", key=input_key)
-                    else:
-                        user_ans = st.text_input("请输入答案：", value="", key=input_key)
-
-                elif wq.get('question_type') == "判断":
-                    choice = st.radio("请判断：", ["✅ 对", "❌ 错"], index=None, key=input_key)
-                    if choice:
-                        user_ans = "对" if choice == "✅ 对" else "错"
-
-                elif wq.get('question_type') == "填空":
-                    user_ans = st.text_input("请填写答案：", value="", key=input_key)
-
-                elif wq.get('question_type') == "简答":
-                    user_ans = st.text_area("请简要回答：", value="", key=input_key, height=100)
-
-                # 提交按钮
-                col1, col2 = st.columns([1, 3])
-                with col1:
-                    submit_disabled = user_ans is None or str(user_ans).strip() == ""
-                    if st.button("✅ 提交答案", type="primary", disabled=submit_disabled, use_container_width=True):
-                        # 检查答案
-                        is_correct = False
-                        user_answer_str = str(user_ans).strip()
-
-                        if wq.get('question_type') == "判断":
-                            user_norm = normalize_answer(user_answer_str)
-                            correct_norm = wq.get('correct_answer_normalized', '')
-                            is_correct = user_norm == correct_norm
-                        elif wq.get('question_type') == "单选":
-                            user_norm = normalize_answer(user_answer_str)
-                            correct_norm = normalize_answer(wq.get('correct_answer', ''))
-                            is_correct = user_norm == correct_norm
-                        else:  # 填空和简答
-                            user_norm = normalize_answer(user_answer_str)
-                            correct_norm = normalize_answer(wq.get('correct_answer', ''))
-                            is_correct = user_norm == correct_norm
-
-                        # 保存用户答案到会话状态
-                        st.session_state[submitted_key] = True
-                        st.session_state[f"wrong_user_answer_{wq.get('question_id', idx)}"] = user_ans
-                        st.session_state[f"wrong_is_correct_{wq.get('question_id', idx)}"] = is_correct
-
-                        # 更新错题记录到文件
-                        # 构建question_data用于更新错题记录
-                        question_data = {
-                            'question': wq.get('question', ''),
-                            'type': wq.get('question_type', ''),
-                            'correct_answer_display': wq.get('correct_answer', ''),
-                            'correct_answer_normalized': wq.get('correct_answer_normalized', ''),
-                            'explanation': wq.get('explanation', ''),
-                            'source': wq.get('source', ''),
-                            'row_index': int(wq.get('question_id', '0').split('_')[-1]) if '_' in wq.get('question_id',
-                                                                                                         '0') else 0
-                        }
+            elif wq.get('question_type') == "简答":
+                user_ans = st.text_area("请简要回答：", value="", key=input_key, height=100)
 
-                        # 更新错题记录
-                        filename = get_wrong_questions_filename(exam_id)
-                        if os.path.exists(filename):
-                            try:
-                                with open(filename, 'rb') as f:
-                                    all_wrong = pickle.load(f)
-
-                                for wq_item in all_wrong:
-                                    if wq_item.get('question_id') == wq.get('question_id'):
-                                        wq_item['user_answer'] = user_ans
-                                        wq_item['last_attempt'] = datetime.now().isoformat()
-                                        wq_item['attempt_count'] = wq_item.get('attempt_count', 0) + 1
-                                        wq_item['last_correct'] = is_correct
-                                        break
-
-                                with open(filename, 'wb') as f:
-                                    pickle.dump(all_wrong, f)
-                            except:
-                                pass
+            # 提交按钮
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                submit_disabled = user_ans is None or str(user_ans).strip() == ""
+                if st.button("✅ 提交答案", type="primary", disabled=submit_disabled, use_container_width=True):
+                    # 与答题界面相同的判分规则（简答按相似度，单选按选项字母）
+                    is_correct = grade_answer(user_ans, wq.get('question_type', ''), wq.get('correct_answer', ''))
 
-                        st.rerun()
+                    # 保存作答结果到本轮的复习状态
+                    book["answers"][qid] = (user_ans, is_correct)
 
-                with col2:
-                    if st.button("🔍 直接查看答案", type="secondary", use_container_width=True):
-                        st.session_state[submitted_key] = True
-                        st.session_state[f"wrong_user_answer_{wq.get('question_id', idx)}"] = "[未作答]"
-                        st.session_state[f"wrong_is_correct_{wq.get('question_id', idx)}"] = False
-                        st.rerun()
+                    # 按作答结果重新安排复习时间，并更新错题记录到文件（本页中的副本同步更新）
+                    schedule = schedule_fields(apply_review(dict(wq), is_correct))
+                    record_mastery(exam_id, qid, is_correct, mode="错题复习", user_id=user_id)
+                    if update_wrong_question_review(exam_id, qid, user_ans, is_correct, schedule, user_id=user_id):
+                        wq.update(schedule, user_answer=user_ans, last_correct=is_correct,
+                                  attempt_count=wq.get('attempt_count', 0) + 1)
 
-            else:
-                # 显示用户答案和结果
-                user_answer = st.session_state.get(f"wrong_user_answer_{wq.get('question_id', idx)}", "")
-                is_correct = st.session_state.get(f"wrong_is_correct_{wq.get('question_id', idx)}", False)
+                    st.rerun()
 
-                st.markdown("---")
-                st.markdown("**📊 你的答案**")
+            with col2:
+                if st.button("🔍 直接查看答案", type="secondary", use_container_width=True):
+                    book["answers"][qid] = ("[未作答]", False)
+                    st.rerun()
 
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.markdown(f"**你的回答：** {user_answer}")
-                with col2:
-                    if is_correct:
-                        st.success("🎉 回答正确！")
-                    else:
-                        st.error("❌ 回答错误")
+        else:
+            # 显示用户答案和结果
+            user_answer, is_correct = review
 
-                st.markdown("---")
-                st.markdown("**✅ 正确答案和解析**")
+            st.markdown("---")
+            st.markdown("**📊 你的答案**")
 
-                # 显示正确答案
-                if wq.get('question_type') == "判断":
-                    correct_display = "✅ 对" if wq.get('correct_answer_normalized') == "对" else "❌ 错"
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown(f"**你的回答：** {user_answer}")
+            with col2:
+                if is_correct:
+                    st.success("🎉 回答正确！")
                 else:
-                    correct_display = wq.get('correct_answer', '')
-
-                st.success(f"**正确答案：** {correct_display}")
-
-                # 显示解析
-                if wq.get('explanation'):
-                    st.info(f"**解析：** {wq['explanation']}")
-
-                # 如果是单选题，显示选项分析
-                if wq.get('question_type') == "单选" and wq.get('options'):
-                    st.write("**选项分析：**")
-                    for opt in wq.get('options', []):
-                        label = opt.get('label', '')
-                        text = opt.get('text', '')
-                        # 检查是否为正确答案
-                        correct_answer_norm = normalize_answer(correct_display)
-                        if label and correct_answer_norm and label.upper() == correct_answer_norm.upper():
-                            st.success(f"✓ {label}. {text} （正确答案）")
-                        else:
-                            st.write(f"  {label}. {text}")
+                    st.error("❌ 回答错误")
 
-                # 重新作答按钮
-                st.markdown("---")
-                if st.button("✏️ 重新作答此题", type="secondary", use_container_width=True):
-                    st.session_state[submitted_key] = False
-                    st.rerun()
+            st.markdown("---")
+            st.markdown("**✅ 正确答案和解析**")
+
+            # 显示正确答案
+            st.success(f"**正确答案：** {payload.correct_display}")
 
+            # 显示解析
+            if wq.get('explanation'):
+                st.info(f"**解析：** {wq['explanation']}")
+
+            # 如果是单选题，显示选项分析
+            if payload.option_rows:
+                st.write("**选项分析：**")
+                for text, is_answer in payload.option_rows:
+                    if is_answer:
+                        st.success(text)
+                    else:
+                        st.write(text)
+
+            # 重新作答按钮
             st.markdown("---")
+            if st.button("✏️ 重新作答此题", type="secondary", use_container_width=True):
+                del book["answers"][qid]
+                st.rerun()
 
-            # 操作按钮
-            col1, col2, col3, col4 = st.columns(4)
+        st.markdown("---")
 
-            with col1:
-                if is_submitted and st.session_state.get(f"wrong_is_correct_{wq.get('question_id', idx)}", False):
-                    if st.button("✅ 我已掌握", type="primary", use_container_width=True):
-                        # 标记为已掌握并从错题本移除
-                        if update_wrong_question_status(exam_id, wq.get('question_id'), True):
-                            # 从当前列表中移除
-                            wrong_questions = [q for q in wrong_questions if
-                                               q.get('question_id') != wq.get('question_id')]
-                            st.session_state.wrong_questions_list = wrong_questions
-                            if st.session_state.wrong_question_index >= len(wrong_questions) and wrong_questions:
-                                st.session_state.wrong_question_index = max(0, len(wrong_questions) - 1)
-                            elif not wrong_questions:
-                                st.session_state.wrong_question_index = 0
-
-                            st.success("已标记为已掌握！")
-                            st.rerun()
-                else:
-                    st.button("✅ 我已掌握", disabled=True, use_container_width=True,
-                              help="需回答正确后才能标记为已掌握")
+        # 操作按钮
+        col1, col2, col3, col4 = st.columns(4)
 
-            with col2:
-                if st.button("➡️ 下一题", use_container_width=True):
-                    st.session_state.wrong_question_index = (idx + 1) % len(wrong_questions)
-                    st.rerun()
+        with col1:
+            if is_submitted and review[1] and not wq.get('reviewed', False):
+                if st.button("✅ 我已掌握", type="primary", use_container_width=True):
+                    # 标记为已掌握；按掌握状态筛选时从本轮的列表中移除
+                    if update_wrong_question_status(exam_id, qid, True, user_id=user_id):
+                        wq['reviewed'] = True
+                        if wrong_filter.status in ("due", "unmastered"):
+                            drop_wrong_entry(idx)
+
+                        st.success("已标记为已掌握！")
+                        st.rerun()
+            else:
+                st.button("✅ 我已掌握", disabled=True, use_container_width=True,
+                          help="需回答正确后才能标记为已掌握")
 
-            with col3:
-                if idx > 0 and st.button("⬅️ 上一题", use_container_width=True):
-                    st.session_state.wrong_question_index = (idx - 1) % len(wrong_questions)
-                    st.rerun()
+        with col2:
+            if st.button("➡️ 下一题", use_container_width=True):
+                book["index"] = (idx + 1) % total
+                st.rerun()
 
-            with col4:
-                if st.button("↩️ 返回主界面", use_container_width=True, type="secondary"):
-                    st.session_state.view_wrong_questions = False
-                    st.rerun()
+        with col3:
+            if idx > 0 and st.button("⬅️ 上一题", use_container_width=True):
+                book["index"] = (idx - 1) % total
+                st.rerun()
 
-        else:
-            st.success("🎉 所有错题已复习完成！")
-            if st.button("返回主界面"):
+        with col4:
+            if st.button("↩️ 返回主界面", use_container_width=True, type="secondary"):
                 st.session_state.view_wrong_questions = False
                 st.rerun()
 
 # ================== 主考试流程 ==================
-if not st.session_state.get("view_wrong_questions", False):
+else:
     # 步骤1：选择题库
     if not st.session_state.selected_exam_file:
         st.header("📂 第一步：选择题库")
@@ -979,6 +934,11 @@ if not st.session_state.get("view_wrong_questions", False):
             st.info("请将题库文件(.xlsx)放在应用目录下的'data'文件夹中，或直接放在应用目录下。")
             st.stop()
 
+        # 题库目录：后台扫描新增或修改过的题库，界面只读取已持久化的元数据
+        catalog = get_bank_catalog()
+        exam_paths = [resolve_exam_path(f) for f in st.session_state.available_exam_files]
+        catalog.refresh_in_background([p for p in exam_paths if p])
+
         col1, col2 = st.columns([3, 1])
         with col1:
             selected = st.selectbox(
@@ -993,6 +953,22 @@ if not st.session_state.get("view_wrong_questions", False):
                 st.session_state.enhanced_loading = True
                 st.rerun()
 
+        # 选中题库的工作表概况
+        selected_path = resolve_exam_path(selected) if selected else None
+        selected_entry = catalog.get(selected_path) if selected_path else None
+        if selected_entry and not selected_entry.get("error"):
+            sheet_summary = "，".join(f"{sheet['name']}（{sheet['total']}题）" for sheet in selected_entry["sheets"])
+            st.caption(f"📄 工作表：{sheet_summary}")
+
+        st.markdown("---")
+        st.subheader("📚 题库信息")
+        st.dataframe(build_catalog_rows(st.session_state.available_exam_files, catalog),
+                     hide_index=True, use_container_width=True)
+        if catalog.is_scanning:
+            st.caption("⏳ 正在后台扫描新增或修改过的题库…")
+            if st.button("🔄 刷新题库信息"):
+                st.rerun()
+
     # 步骤2：加载题库并显示识别结果
     elif st.session_state.selected_exam_file and not st.session_state.exam_started:
         file_path = st.session_state.selected_exam_file
@@ -1000,17 +976,58 @@ if not st.session_state.get("view_wrong_questions", False):
 
         st.header("🎯 第二步：题库分析和模式选择")
 
-        if st.session_state.enhanced_loading:
-            with st.spinner("🔍 正在智能识别题型..."):
-                result = load_questions_with_intelligent_detection(file_path)
-
+        # 工作表选择：列表来自工作簿元数据，选中的工作表第一次用到时才解析
+        bank = get_question_bank(file_path)
+        sheet_rows = {}
+        try:
+            sheet_rows = {sheet.name: sheet.rows for sheet in bank.sheets} if bank else {}
+        except Exception as e:
+            st.error(f"读取Excel文件失败: {e}")
+        if bank is None:
+            st.error(f"❌ 找不到题库文件: {file_path}")
+
+        selected_sheets = []
+        if sheet_rows:
+            # 选项文字不能随解析状态变化（控件按文字匹配已选的值），未解析的工作表在说明中列出
+            selection = st.session_state.sheet_selection
+            if not selection or selection[0] != file_path:
+                selection = (file_path, default_sheet_selection(bank))
+                st.session_state.sheet_picker = selection[1]
+            elif "sheet_picker" not in st.session_state:
+                st.session_state.sheet_picker = [name for name in selection[1] if name in sheet_rows]
+            selected_sheets = st.multiselect(
+                "📄 **选择工作表**",
+                list(sheet_rows),
+                format_func=lambda name: f"{name}（{sheet_rows[name]}行）",
+                help="只解析和练习选中的工作表，大题库可以先选一个章节"
+                     + "".join(f"\n\n未解析：{name}" for name in sheet_rows if not bank.is_parsed(name)),
+                key="sheet_picker"
+            )
+            st.session_state.sheet_selection = (file_path, selected_sheets)
+
+        if selected_sheets:
+            sheet_key = sheet_cache_key(list(sheet_rows), selected_sheets)
+            pending = [name for name in selected_sheets if not bank.is_parsed(name)]
+            spinner = st.spinner(f"🔍 正在解析 {len(pending)} 个工作表并识别题型...") if pending else nullcontext()
+            with spinner:
+                CACHE_REQUESTS.labels("bank").inc()
+                with timed("loader.load_bank"):
+                    result = load_bank_sheets(file_path, sheet_key)
+
+            (st.session_state.all_questions, st.session_state.detection_stats,
+             st.session_state.question_index) = result
+            if st.session_state.enhanced_loading or pending:
+                st.session_state.enhanced_loading = False
                 if result[0]:
-                    st.session_state.all_questions, st.session_state.detection_stats = result
-                    st.session_state.enhanced_loading = False
                     st.success("✅ 题库加载完成！")
                 else:
                     st.error("❌ 题库加载失败")
-                    st.session_state.enhanced_loading = False
+        else:
+            st.session_state.all_questions = []
+            st.session_state.detection_stats = {}
+            st.session_state.question_index = {}
+            if sheet_rows:
+                st.info("请至少选择一个工作表")
 
         if st.session_state.all_questions and st.session_state.detection_stats:
             questions = st.session_state.all_questions
@@ -1055,13 +1072,43 @@ if not st.session_state.get("view_wrong_questions", False):
                             if count > 0:
                                 st.write(f"- {t_name}: {count}题")
 
+                # 近似重复题检测（可选）
+                dup_index = None
+                if st.checkbox("🧬 检测近似重复题", key="detect_duplicates",
+                               help="查找跨工作表复制、仅个别字词不同的题目"):
+                    with st.spinner("正在检测近似重复题..."):
+                        CACHE_REQUESTS.labels("duplicate_index").inc()
+                        dup_index = load_duplicate_index(file_path, sheet_key)
+
+                    if dup_index.clusters:
+                        question_index = st.session_state.question_index
+                        max_shown = 50
+                        with st.expander(f"🧬 近似重复题 (共{len(dup_index.clusters)}组，"
+                                         f"可省去{dup_index.duplicate_count}题)"):
+                            for cluster_no, qids in enumerate(dup_index.clusters[:max_shown]):
+                                st.write(f"**第{cluster_no + 1}组：**")
+                                for qid in qids:
+                                    dup_q = question_index.get(qid)
+                                    if dup_q:
+                                        st.caption(f"{dup_q['source']} 第{dup_q['row_index']}行："
+                                                   f"{dup_q['question'][:60]}")
+                            if len(dup_index.clusters) > max_shown:
+                                st.caption(f"仅显示前{max_shown}组")
+                    else:
+                        st.info("未发现近似重复题")
+
                 # 练习设置
                 st.markdown("---")
                 st.subheader("🎯 练习设置")
 
+                one_per_cluster = False
+                if dup_index is not None and dup_index.clusters:
+                    one_per_cluster = st.checkbox("每组近似重复题只练一道", value=True)
+                excluded_qids = dup_index.pick_excluded() if one_per_cluster else set()
+
                 mode = st.radio(
                     "**请选择练习模式**:",
-                    ["顺序练习", "自主选题", "题型专项"],
+                    ["顺序练习", "自主选题", "题型专项", "模拟考试"],
                     index=0
                 )
 
@@ -1087,15 +1134,15 @@ if not st.session_state.get("view_wrong_questions", False):
 
                         if st.button("🚀 开始顺序练习", type="primary", use_container_width=True):
                             # 筛选题目
-                            filtered = []
-                            for q in questions:
-                                if q["type"] in selected_types:
-                                    filtered.append({**q, "filtered_index": len(filtered)})
-
-                            if len(filtered) > max_questions:
-                                random.seed(42)
-                                filtered = random.sample(filtered, max_questions)
-                                filtered.sort(key=lambda x: x["original_index"])
+                            candidates = [q for q in questions
+                                          if q["type"] in selected_types and q["qid"] not in excluded_qids]
+                            if len(candidates) > max_questions:
+                                # 按掌握度加权、按题型和工作表分层抽题
+                                selector = get_question_selector(exam_id, questions, user_id=user_id)
+                                candidates = selector.sample(max_questions, types=set(selected_types),
+                                                             exclude=excluded_qids)
+                            candidates.sort(key=lambda x: x["original_index"])
+                            filtered = [{**q, "filtered_index": i} for i, q in enumerate(candidates)]
 
                             st.session_state.filtered_questions = filtered
                             st.session_state.current_index = 0
@@ -1104,15 +1151,19 @@ if not st.session_state.get("view_wrong_questions", False):
                                 "exam_id": exam_id,
                                 "selected_types": selected_types,
                                 "total": len(filtered),
-                                "mode": "顺序练习"
+                                "mode": "顺序练习",
+                                "sheets": selected_sheets,
+                                "question_ids": [q["qid"] for q in filtered]
                             }
                             st.session_state.exam_started = True
+                            # 新的练习从空白记录开始，不混入上一次练习的作答
+                            st.session_state.user_progress = {}
+                            st.session_state.answer_submitted = {}
+                            st.session_state.session_stats = SessionStats(filtered)
+                            st.session_state.bank_status = None
 
                             # 保存初始进度
-                            save_progress(exam_id, {}, st.session_state.exam_config, {
-                                "current_index": 0,
-                                "filtered_questions_length": len(filtered)
-                            })
+                            save_session_progress(exam_id, 0, user_id=user_id)
                             st.rerun()
 
                 elif mode == "自主选题":
@@ -1122,8 +1173,10 @@ if not st.session_state.get("view_wrong_questions", False):
                         st.session_state.question_selection_mode = True
                         st.session_state.exam_config = {
                             "exam_id": exam_id,
-                            "mode": "自主选题"
+                            "mode": "自主选题",
+                            "sheets": selected_sheets
                         }
+                        st.session_state.bank_status = None
                         st.session_state.exam_started = True
                         st.rerun()
 
@@ -1144,15 +1197,14 @@ if not st.session_state.get("view_wrong_questions", False):
                         )
 
                         if st.button("🚀 开始专项练习", type="primary", use_container_width=True):
-                            filtered = []
-                            for q in questions:
-                                if q["type"] == selected_type:
-                                    filtered.append({**q, "filtered_index": len(filtered)})
-
-                            if len(filtered) > max_questions:
-                                random.seed(42)
-                                filtered = random.sample(filtered, max_questions)
-                                filtered.sort(key=lambda x: x["original_index"])
+                            candidates = [q for q in questions
+                                          if q["type"] == selected_type and q["qid"] not in excluded_qids]
+                            if len(candidates) > max_questions:
+                                selector = get_question_selector(exam_id, questions, user_id=user_id)
+                                candidates = selector.sample(max_questions, types={selected_type},
+                                                             exclude=excluded_qids)
+                            candidates.sort(key=lambda x: x["original_index"])
+                            filtered = [{**q, "filtered_index": i} for i, q in enumerate(candidates)]
 
                             st.session_state.filtered_questions = filtered
                             st.session_state.current_index = 0
@@ -1161,25 +1213,108 @@ if not st.session_state.get("view_wrong_questions", False):
                                 "exam_id": exam_id,
                                 "selected_types": [selected_type],
                                 "total": len(filtered),
-                                "mode": "题型专项"
+                                "mode": "题型专项",
+                                "sheets": selected_sheets,
+                                "question_ids": [q["qid"] for q in filtered]
                             }
                             st.session_state.exam_started = True
+                            # 新的练习从空白记录开始，不混入上一次练习的作答
+                            st.session_state.user_progress = {}
+                            st.session_state.answer_submitted = {}
+                            st.session_state.session_stats = SessionStats(filtered)
+                            st.session_state.bank_status = None
 
                             # 保存初始进度
-                            save_progress(exam_id, {}, st.session_state.exam_config, {
-                                "current_index": 0,
-                                "filtered_questions_length": len(filtered)
-                            })
+                            save_session_progress(exam_id, 0, user_id=user_id)
+                            st.rerun()
+
+                elif mode == "模拟考试":
+                    from mock_exam import BLUEPRINT_TYPES, DEFAULT_BLUEPRINT, build_paper_set, check_blueprint
+
+                    st.info("按组卷蓝图为每位考生预先生成一份试卷，限时作答、统一交卷")
+
+                    st.write("**📐 组卷蓝图（各题型题数）**")
+                    blueprint = {}
+                    bp_cols = st.columns(len(BLUEPRINT_TYPES))
+                    for i, t_name in enumerate(BLUEPRINT_TYPES):
+                        available = type_counts.get(t_name, 0)
+                        with bp_cols[i]:
+                            blueprint[t_name] = st.number_input(
+                                f"{type_names.get(t_name, t_name)} (共{available}道)",
+                                min_value=0,
+                                max_value=available,
+                                value=min(DEFAULT_BLUEPRINT.get(t_name, 0), available),
+                                key=f"mock_bp_{t_name}"
+                            )
+
+                    set_cols = st.columns(3)
+                    with set_cols[0]:
+                        duration = st.number_input("**考试时长（分钟）**", min_value=1, max_value=600, value=60)
+                    with set_cols[1]:
+                        paper_count = st.number_input("**生成试卷份数**", min_value=1, max_value=100000, value=100,
+                                                      help="每位考生一份，考生序号对应试卷编号")
+                    with set_cols[2]:
+                        base_seed = st.number_input("**组卷种子**", min_value=0, value=1,
+                                                    help="种子和考生序号相同时试卷相同")
+
+                    problems = check_blueprint(blueprint, type_counts)
+                    for problem in problems:
+                        st.error(problem)
+
+                    if not problems:
+                        st.caption(f"每份试卷共 {sum(blueprint.values())} 题")
+                        if st.button("🛠️ 生成试卷", use_container_width=True):
+                            with st.spinner(f"正在生成 {paper_count} 份试卷..."):
+                                _, paper_path = build_paper_set(questions, exam_id, blueprint,
+                                                                int(paper_count), int(base_seed))
+                            st.session_state.mock_paper_path = paper_path
+
+                    paper_path = st.session_state.get("mock_paper_path")
+                    paper_set = None
+                    if paper_path and os.path.exists(paper_path):
+                        CACHE_REQUESTS.labels("paper_set").inc()
+                        paper_set = load_paper_set(paper_path)
+                        if paper_set.meta.get("exam_id") != exam_id:
+                            paper_set = None
+
+                    if paper_set is not None:
+                        bp_text = " + ".join(f"{n}{t}" for t, n in paper_set.blueprint.items() if n)
+                        st.success(f"✅ 已生成 {paper_set.count} 份试卷（{bp_text}）")
+                        candidate_no = st.number_input("**考生序号**", min_value=1, max_value=paper_set.count,
+                                                       value=1)
+
+                        if st.button("🚀 开始模拟考试", type="primary", use_container_width=True):
+                            started_at = datetime.now()
+                            st.session_state.mock_exam = {
+                                "qids": paper_set.paper_qids(int(candidate_no)),
+                                "candidate_no": int(candidate_no),
+                                "paper_path": paper_path,
+                                "duration": int(duration),
+                                "started_at": started_at.isoformat(),
+                                "deadline": (started_at + timedelta(minutes=int(duration))).isoformat(),
+                                "result": None,
+                            }
+                            st.session_state.exam_config = {
+                                "exam_id": exam_id,
+                                "mode": "模拟考试",
+                                "sheets": selected_sheets,
+                                "total": paper_set.papers.shape[1]
+                            }
+                            st.session_state.exam_started = True
                             st.rerun()
 
             with col2:
                 st.markdown("**📁 进度管理**")
 
-                saved_progress, saved_config, saved_extra = load_progress(exam_id)
+                saved_progress, saved_config, saved_extra = load_progress(exam_id, user_id=user_id)
 
                 if saved_progress:
-                    completed = len([v for v in saved_progress.values() if v.get("answer")])
-                    correct = len([v for v in saved_progress.values() if v.get("correct", False)])
+                    saved_stats = SessionStats.from_dict(saved_extra.get("session_stats"))
+                    if saved_stats is not None:
+                        completed, correct = saved_stats.answered, saved_stats.correct
+                    else:
+                        completed = len([v for v in saved_progress.values() if v.get("answer")])
+                        correct = len([v for v in saved_progress.values() if v.get("correct", False)])
                     current_index = saved_extra.get("current_index", 0)
 
                     st.success("📊 发现历史进度：")
@@ -1191,31 +1326,57 @@ if not st.session_state.get("view_wrong_questions", False):
 
                     with col_a:
                         if st.button("🔄 继续上次练习", use_container_width=True, type="primary"):
-                            # 恢复所有状态
+                            # 恢复所有状态：按保存时选择的工作表加载题目（旧版进度没有记录，加载整个题库）
+                            saved_sheets = [name for name in saved_config.get("sheets") or [] if name in sheet_rows]
+                            questions, _, question_index = load_bank_sheets(
+                                file_path, sheet_cache_key(list(sheet_rows), saved_sheets))
+                            st.session_state.sheet_selection = (file_path, saved_sheets or list(sheet_rows))
+                            st.session_state.pop("sheet_picker", None)
+                            saved_progress = migrate_progress_keys(saved_progress, questions)
                             st.session_state.all_questions = questions
+                            st.session_state.question_index = question_index
                             st.session_state.exam_config = saved_config
                             st.session_state.user_progress = saved_progress
                             st.session_state.exam_started = True
+                            st.session_state.answer_submitted = {}
+                            st.session_state.bank_status = None
 
                             mode = saved_config.get("mode", "顺序练习")
                             if mode in ["顺序练习", "题型专项"]:
                                 selected_types = saved_config.get("selected_types", [])
+                                saved_ids = saved_config.get("question_ids")
                                 filtered = []
-                                for q in questions:
-                                    if q["type"] in selected_types:
-                                        filtered.append({**q, "filtered_index": len(filtered)})
+                                if saved_ids:
+                                    # 按题目ID直接恢复本次练习的题目，不再重新筛选题库
+                                    for qid in saved_ids:
+                                        q = question_index.get(qid)
+                                        if q is not None:
+                                            filtered.append({**q, "filtered_index": len(filtered)})
+                                    if len(filtered) != len(saved_ids):
+                                        st.warning(f"有 {len(saved_ids) - len(filtered)} 道题目已不在题库中，已跳过")
+                                else:
+                                    # 旧版进度没有记录题目ID，只能按题型重新筛选
+                                    for q in questions:
+                                        if q["type"] in selected_types:
+                                            filtered.append({**q, "filtered_index": len(filtered)})
 
-                                saved_length = saved_extra.get("filtered_questions_length", 0)
-                                if saved_length > 0 and len(filtered) != saved_length:
-                                    st.warning("题目数量与保存的进度不一致，可能题库已更新")
+                                    saved_length = saved_extra.get("filtered_questions_length", 0)
+                                    if saved_length > 0 and len(filtered) != saved_length:
+                                        st.warning("题目数量与保存的进度不一致，可能题库已更新")
 
                                 st.session_state.filtered_questions = filtered
-                                st.session_state.current_index = current_index
+                                st.session_state.current_index = min(current_index, len(filtered))
                                 st.session_state.selected_types = selected_types
+                                # 保存的统计与恢复出的题目一致时直接使用，否则按记录重建
+                                if saved_stats is not None and set(saved_stats.scope) == {q["qid"] for q in filtered}:
+                                    st.session_state.session_stats = saved_stats
+                                else:
+                                    st.session_state.session_stats = None
 
                                 # 恢复已提交状态
-                                for i in range(len(filtered)):
-                                    if i in saved_progress and saved_progress[i].get("answer"):
+                                for i, q in enumerate(filtered):
+                                    record = saved_progress.get(q["qid"])
+                                    if record and record.get("answer"):
                                         st.session_state.answer_submitted[f"submitted_{exam_id}_{i}"] = True
 
                                 st.success(f"已恢复进度，从第 {current_index + 1} 题开始")
@@ -1226,7 +1387,7 @@ if not st.session_state.get("view_wrong_questions", False):
 
                     with col_b:
                         if st.button("🗑️ 清除进度", use_container_width=True, type="secondary"):
-                            if clear_progress(exam_id):
+                            if clear_progress(exam_id, user_id=user_id):
                                 st.success("进度已清除！")
                                 st.rerun()
                 else:
@@ -1246,6 +1407,93 @@ if not st.session_state.get("view_wrong_questions", False):
                     st.session_state.selected_exam_file = None
                     st.rerun()
 
+    # 模拟考试：作答和成绩
+    elif st.session_state.exam_started and st.session_state.get("mock_exam"):
+        mock = st.session_state.mock_exam
+        exam_id = st.session_state.exam_config["exam_id"]
+        question_index = st.session_state.question_index
+
+        paper = [question_index[qid] for qid in mock["qids"] if qid in question_index]
+        if len(paper) != len(mock["qids"]):
+            st.warning(f"有 {len(mock['qids']) - len(paper)} 道题目已不在题库中，已跳过")
+
+        st.header(f"📝 模拟考试 · 考生序号 {mock['candidate_no']}")
+
+        if mock["result"] is None:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.caption(f"共 {len(paper)} 题，考试时长 {mock['duration']} 分钟，"
+                           f"开始时间 {mock['started_at'][11:19]}")
+            with col2:
+                render_countdown(mock["deadline"])
+
+            with st.form(f"mock_form_{mock['candidate_no']}"):
+                render_cache = get_render_cache(exam_id)
+                answers = []
+                current_type = None
+                for i, q in enumerate(paper):
+                    if q["type"] != current_type:
+                        current_type = q["type"]
+                        st.subheader(f"{current_type}题")
+                    st.markdown(f"**{i + 1}. {q['question']}**")
+                    answers.append(render_mock_input(q, f"mock_{mock['candidate_no']}_{i}", render_cache))
+
+                submitted = st.form_submit_button("📤 交卷", type="primary", use_container_width=True)
+
+            if submitted:
+                result = grade_mock_exam(paper, answers)
+                submitted_at = datetime.now()
+                result["submitted_at"] = submitted_at.isoformat()
+                result["overtime"] = submitted_at > datetime.fromisoformat(mock["deadline"])
+
+                record_mastery_batch(exam_id, [(d["qid"], d["correct"]) for d in result["details"]],
+                                     mode="模拟考试", user_id=user_id)
+                save_wrong_questions(exam_id, [(q, detail["answer"], False)
+                                               for q, detail in zip(paper, result["details"])
+                                               if not detail["correct"] and detail["answer"]], user_id=user_id)
+
+                mock["result"] = result
+                st.rerun()
+        else:
+            result = mock["result"]
+            score = result["correct"] / result["total"] * 100 if result["total"] else 0
+
+            if result["overtime"]:
+                st.warning("⏰ 超时交卷")
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("得分（百分制）", f"{score:.1f}")
+            with col2:
+                st.metric("正确数", f"{result['correct']}/{result['total']}")
+            with col3:
+                used = datetime.fromisoformat(result["submitted_at"]) - datetime.fromisoformat(mock["started_at"])
+                st.metric("用时", f"{int(used.total_seconds()) // 60} 分钟")
+
+            st.write("**📊 各题型得分**")
+            type_cols = st.columns(max(len(result["by_type"]), 1))
+            for i, (t_name, type_stat) in enumerate(result["by_type"].items()):
+                with type_cols[i]:
+                    st.metric(f"{t_name}题", f"{type_stat['correct']}/{type_stat['total']}")
+
+            wrong_details = [(q, d) for q, d in zip(paper, result["details"]) if not d["correct"]]
+            if wrong_details:
+                st.warning(f"⚠️ 本次考试有 {len(wrong_details)} 道题答错或未作答，已作答的错题已保存到错题本")
+                with st.expander(f"❌ 错题回顾 ({len(wrong_details)}题)"):
+                    for q, detail in wrong_details:
+                        st.markdown(f"**{q['question']}**")
+                        st.write(f"你的答案：{detail['answer'] or '未作答'}")
+                        st.success(f"正确答案：{q['correct_answer_display']}")
+                        if q.get("explanation"):
+                            st.info(f"解析：{q['explanation']}")
+                        st.markdown("---")
+
+            if st.button("🏠 返回首页", use_container_width=True, type="secondary"):
+                for key in ["exam_started", "exam_config", "mock_exam"]:
+                    if key in st.session_state:
+                        del st.session_state[key]
+                st.rerun()
+
     # 步骤3：自主选题模式
     elif (st.session_state.exam_started and
           st.session_state.question_selection_mode):
@@ -1256,63 +1504,59 @@ if not st.session_state.get("view_wrong_questions", False):
         st.header("🎯 自主选题模式")
         st.info("请选择您要练习的题目（可多选）")
 
-        # 搜索功能
+        # 题型、工作表位集由各会话共用；题目列表与缓存不一致（例如恢复的是旧版进度）时按当前列表建立
+        bank = get_question_bank(st.session_state.selected_exam_file)
+        sheet_key = sheet_cache_key(bank.sheet_names, st.session_state.exam_config.get("sheets") or []) \
+            if bank is not None else None
+        CACHE_REQUESTS.labels("question_filter").inc()
+        question_filter = get_question_filter(st.session_state.selected_exam_file, sheet_key)
+        if question_filter.size != len(questions):
+            question_filter = QuestionFilter(questions)
+
+        # 作答状态位集：进入界面时按作答记录建立一次，之后随每次提交按位更新
+        bank_status = st.session_state.get("bank_status")
+        if bank_status is None or bank_status.filter is not question_filter:
+            bank_status = AnswerBits(question_filter, st.session_state.user_progress)
+            st.session_state.bank_status = bank_status
+
+        # 搜索和筛选
         search_term = st.text_input("🔍 搜索题目关键词", "")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            filter_types = st.multiselect("🧩 题型", list(question_filter.by_type), placeholder="全部题型")
+        with col2:
+            filter_sheets = st.multiselect("📄 工作表", list(question_filter.by_sheet), placeholder="全部工作表")
+        with col3:
+            selected_status = st.selectbox("📊 筛选答题状态", options=STATUS_OPTIONS, index=0)
 
         selected_indices = st.session_state.selected_question_indices.copy()
 
-        # 答题状态统计
-        answered = 0
-        correct = 0
-        wrong = 0
-        not_answered = 0
-
-        for idx, q in enumerate(questions):
-            record = st.session_state.user_progress.get(idx, {})
-            if record.get("answer"):
-                answered += 1
-                if record.get("correct", False):
-                    correct += 1
-                else:
-                    wrong += 1
-            else:
-                not_answered += 1
+        # 统计随题型、工作表和搜索词筛选，列表再按答题状态筛选
+        scope_mask = question_filter.select(filter_types, filter_sheets, search_term)
+        scope_total, scope_answered, scope_correct, scope_wrong = bank_status.counts(scope_mask)
+        visible_mask = scope_mask & bank_status.status_mask(selected_status)
 
         # 显示统计信息
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("总题数", len(questions))
+            st.metric("总题数", scope_total)
         with col2:
-            st.metric("已答题", answered)
+            st.metric("已答题", scope_answered)
         with col3:
-            st.metric("答对数", correct)
+            st.metric("答对数", scope_correct)
         with col4:
-            st.metric("答错数", wrong)
-
-        # 状态筛选
-        status_options = ["全部", "未作答", "已答对", "已答错"]
-        selected_status = st.selectbox("📊 筛选答题状态", options=status_options, index=0)
+            st.metric("答错数", scope_wrong)
 
         st.markdown("---")
 
         # 显示题目列表
-        for idx, q in enumerate(questions):
-            if search_term and search_term.lower() not in q["question"].lower():
-                continue
-
-            # 获取答题状态
-            record = st.session_state.user_progress.get(idx, {})
+        list_timer = SectionTimer("render.self_select_list")
+        for idx in iter_positions(visible_mask):
+            q = questions[idx]
+            record = st.session_state.user_progress.get(q["qid"], {})
             has_answer = bool(record.get("answer"))
             is_correct = record.get("correct", False)
 
-            # 状态筛选
-            if selected_status == "未作答" and has_answer:
-                continue
-            elif selected_status == "已答对" and (not has_answer or not is_correct):
-                continue
-            elif selected_status == "已答错" and (not has_answer or is_correct):
-                continue
-
             # 确定状态标记和颜色
             if not has_answer:
                 status_icon = "⚪"
@@ -1353,6 +1597,8 @@ if not st.session_state.get("view_wrong_questions", False):
                         selected_indices.append(idx)
                         st.rerun()
 
+        list_timer.stop()
+
         # 更新选择的题目
         st.session_state.selected_question_indices = selected_indices
 
@@ -1369,6 +1615,13 @@ if not st.session_state.get("view_wrong_questions", False):
                 st.session_state.selected_question_indices = list(range(len(questions)))
                 st.rerun()
 
+            if visible_mask != question_filter.all and \
+                    st.button(f"☑️ 选择筛选出的题目（{visible_mask.bit_count()}）", use_container_width=True):
+                chosen = set(selected_indices)
+                st.session_state.selected_question_indices = selected_indices + [
+                    idx for idx in iter_positions(visible_mask) if idx not in chosen]
+                st.rerun()
+
             if st.button("🗑️ 清空选择", use_container_width=True):
                 st.session_state.selected_question_indices = []
                 st.rerun()
@@ -1386,12 +1639,12 @@ if not st.session_state.get("view_wrong_questions", False):
                     st.session_state.current_index = 0
                     st.session_state.question_selection_mode = False
                     st.session_state.exam_config["total"] = len(filtered)
+                    st.session_state.exam_config["question_ids"] = [q["qid"] for q in filtered]
+                    st.session_state.session_stats = SessionStats.from_progress(
+                        filtered, st.session_state.user_progress)
 
                     # 保存初始进度
-                    save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                        "current_index": 0,
-                        "filtered_questions_length": len(filtered)
-                    })
+                    save_session_progress(exam_id, 0, user_id=user_id)
                     st.rerun()
             else:
                 st.button("🚀 开始练习选定题目", disabled=True, use_container_width=True)
@@ -1419,11 +1672,12 @@ if not st.session_state.get("view_wrong_questions", False):
         submitted_key = f"submitted_{exam_id}_{idx}"
         is_submitted = st.session_state.answer_submitted.get(submitted_key, False)
 
-        previous_record = st.session_state.user_progress.get(q["original_index"], {})
+        previous_record = st.session_state.user_progress.get(q["qid"], {})
         previous_answer = previous_record.get("answer", "")
         previous_correct = previous_record.get("correct", None)
 
         input_key = f"input_{exam_id}_{q['original_index']}_{idx}"
+        payload = get_render_cache(exam_id).question(q)
 
         # 答题区域
         st.markdown("---")
@@ -1433,26 +1687,15 @@ if not st.session_state.get("view_wrong_questions", False):
 
         if not is_submitted:
             if q["type"] == "单选":
-                if q["options"]:
-                    choices = []
-                    for opt in q["options"]:
-                        if opt['label'] and opt['text']:
-                            choices.append(f"{opt['label']}. {opt['text']}")
-                        elif opt['text']:
-                            choices.append(opt["text"])
-
-                    if choices:
-                        selected = st.radio("请选择正确答案：", choices, index=None, key=input_key)
-                        user_ans = selected
-                    else:
-                        user_ans = st.text_input("请输入答案：", value=previous_answer or "", key=input_key)
+                if payload.choices:
+                    user_ans = st.radio("请选择正确答案：", payload.choices, index=None, key=input_key)
                 else:
                     user_ans = st.text_input("请输入答案：", value=previous_answer or "", key=input_key)
 
             elif q["type"] == "判断":
-                choice = st.radio("请判断：", ["✅ 对", "❌ 错"], index=None, key=input_key)
+                choice = st.radio("请判断：", JUDGMENT_CHOICES, index=None, key=input_key)
                 if choice:
-                    user_ans = "对" if choice == "✅ 对" else "错"
+                    user_ans = "对" if choice == JUDGMENT_CHOICES[0] else "错"
 
             elif q["type"] == "填空":
                 user_ans = st.text_input("请填写答案：", value=previous_answer or "", key=input_key)
@@ -1467,14 +1710,9 @@ if not st.session_state.get("view_wrong_questions", False):
             st.markdown("---")
             st.markdown("**📊 正确答案和解析**")
 
-            if q["type"] == "判断":
-                correct_display = "✅ 对" if q["correct_answer_normalized"] == "对" else "❌ 错"
-            else:
-                correct_display = q["correct_answer_display"]
-
             col1, col2 = st.columns(2)
             with col1:
-                st.success(f"**正确答案：** {correct_display}")
+                st.success(f"**正确答案：** {payload.correct_display}")
             with col2:
                 if previous_correct is not None:
                     if previous_correct:
@@ -1485,17 +1723,13 @@ if not st.session_state.get("view_wrong_questions", False):
             if q.get("explanation"):
                 st.info(f"**解析：** {q['explanation']}")
 
-            if q["type"] == "单选" and q["options"]:
+            if payload.option_rows:
                 st.write("**选项分析：**")
-                for opt in q["options"]:
-                    label = opt.get('label', '')
-                    text = opt.get('text', '')
-                    # 检查是否为正确答案
-                    correct_answer_norm = normalize_answer(correct_display)
-                    if label and correct_answer_norm and label.upper() == correct_answer_norm.upper():
-                        st.success(f"✓ {label}. {text} （正确答案）")
+                for text, is_answer in payload.option_rows:
+                    if is_answer:
+                        st.success(text)
                     else:
-                        st.write(f"  {label}. {text}")
+                        st.write(text)
 
         st.markdown("---")
 
@@ -1507,6 +1741,8 @@ if not st.session_state.get("view_wrong_questions", False):
                 submit_disabled = user_ans is None or str(user_ans).strip() == ""
                 if st.button("✅ 提交答案", type="primary", disabled=submit_disabled, use_container_width=True):
                     is_correct = check_answer(user_ans, q)
+                    record_mastery(exam_id, q["qid"], is_correct,
+                                   mode=st.session_state.exam_config.get("mode", ""), user_id=user_id)
                     record = {
                         "answer": user_ans,
                         "correct": is_correct,
@@ -1515,17 +1751,14 @@ if not st.session_state.get("view_wrong_questions", False):
                         "correct_answer": q["correct_answer_display"],
                         "explanation": q.get("explanation", "")
                     }
-                    st.session_state.user_progress[q["original_index"]] = record
+                    set_progress_record(q["qid"], record)
                     st.session_state.answer_submitted[submitted_key] = True
 
                     # 保存进度（包括当前索引）
-                    save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                        "current_index": idx,
-                        "filtered_questions_length": len(questions)
-                    })
+                    save_session_progress(exam_id, idx, user_id=user_id)
 
                     if not is_correct and user_ans:
-                        save_wrong_question(exam_id, q, user_ans, is_correct)
+                        save_wrong_question(exam_id, q, user_ans, is_correct, user_id=user_id)
                         st.warning("❌ 答错了！此题目已保存到错题本")
                     st.rerun()
             else:
@@ -1533,10 +1766,7 @@ if not st.session_state.get("view_wrong_questions", False):
                     st.session_state.current_index += 1
 
                     # 保存进度（包括新的当前索引）
-                    save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                        "current_index": st.session_state.current_index,
-                        "filtered_questions_length": len(questions)
-                    })
+                    save_session_progress(exam_id, st.session_state.current_index, user_id=user_id)
                     st.rerun()
 
         with col2:
@@ -1544,10 +1774,7 @@ if not st.session_state.get("view_wrong_questions", False):
                 st.session_state.current_index += 1
 
                 # 保存进度
-                save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                    "current_index": st.session_state.current_index,
-                    "filtered_questions_length": len(questions)
-                })
+                save_session_progress(exam_id, st.session_state.current_index, user_id=user_id)
                 st.rerun()
 
         with col3:
@@ -1555,10 +1782,7 @@ if not st.session_state.get("view_wrong_questions", False):
                 st.session_state.current_index -= 1
 
                 # 保存进度
-                save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                    "current_index": st.session_state.current_index,
-                    "filtered_questions_length": len(questions)
-                })
+                save_session_progress(exam_id, st.session_state.current_index, user_id=user_id)
                 st.rerun()
 
         with col4:
@@ -1567,20 +1791,14 @@ if not st.session_state.get("view_wrong_questions", False):
                     st.session_state.answer_submitted[submitted_key] = True
 
                     # 保存进度
-                    save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                        "current_index": idx,
-                        "filtered_questions_length": len(questions)
-                    })
+                    save_session_progress(exam_id, idx, user_id=user_id)
                     st.rerun()
             else:
                 if st.button("✏️ 重新作答", use_container_width=True, type="secondary"):
                     st.session_state.answer_submitted[submitted_key] = False
 
                     # 保存进度
-                    save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                        "current_index": idx,
-                        "filtered_questions_length": len(questions)
-                    })
+                    save_session_progress(exam_id, idx, user_id=user_id)
                     st.rerun()
 
         with col5:
@@ -1592,13 +1810,10 @@ if not st.session_state.get("view_wrong_questions", False):
                         "time": datetime.now().isoformat(),
                         "question": q["question"]
                     }
-                    st.session_state.user_progress[q["original_index"]] = record
+                    set_progress_record(q["qid"], record)
 
                 # 保存进度
-                save_progress(exam_id, st.session_state.user_progress, st.session_state.exam_config, {
-                    "current_index": idx,
-                    "filtered_questions_length": len(questions)
-                })
+                save_session_progress(exam_id, idx, user_id=user_id)
                 st.success("进度已保存！")
 
         with col6:
@@ -1620,7 +1835,7 @@ if not st.session_state.get("view_wrong_questions", False):
 
                 for i in range(row, end_idx):
                     col_idx = i - row
-                    q_progress = st.session_state.user_progress.get(questions[i]["original_index"], {})
+                    q_progress = st.session_state.user_progress.get(questions[i]["qid"], {})
 
                     if q_progress.get("answer"):
                         if q_progress.get("correct", False):
@@ -1643,20 +1858,18 @@ if not st.session_state.get("view_wrong_questions", False):
 
         # 统计信息
         st.markdown("---")
+        session_stats = get_session_stats()
         col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
         with col_stat1:
-            answered = len([v for v in st.session_state.user_progress.values() if v.get("answer")])
-            st.metric("已答题", f"{answered}/{len(questions)}")
+            st.metric("已答题", f"{session_stats.answered}/{len(questions)}")
         with col_stat2:
-            correct = len([v for v in st.session_state.user_progress.values() if v.get("correct", False)])
-            st.metric("正确数", correct)
+            st.metric("正确数", session_stats.correct)
         with col_stat3:
-            wrong_stats = get_wrong_stats(exam_id)
+            wrong_stats = get_wrong_stats(exam_id, user_id=user_id)
             st.metric("错题数", wrong_stats['total'])
         with col_stat4:
-            if answered > 0:
-                accuracy = (correct / answered) * 100
-                st.metric("正确率", f"{accuracy:.1f}%")
+            if session_stats.answered > 0:
+                st.metric("正确率", f"{session_stats.accuracy:.1f}%")
             else:
                 st.metric("正确率", "0%")
 
@@ -1673,12 +1886,12 @@ if not st.session_state.get("view_wrong_questions", False):
 
         # 计算统计
         total = len(questions)
-        answered = len([v for v in st.session_state.user_progress.values() if v.get("answer")])
-        correct = len([v for v in st.session_state.user_progress.values() if v.get("correct", False)])
-        accuracy = correct / answered * 100 if answered > 0 else 0
+        session_stats = get_session_stats()
+        correct = session_stats.correct
+        accuracy = session_stats.accuracy
 
         # 错题统计
-        wrong_stats = get_wrong_stats(exam_id)
+        wrong_stats = get_wrong_stats(exam_id, user_id=user_id)
 
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -1693,6 +1906,11 @@ if not st.session_state.get("view_wrong_questions", False):
         if wrong_stats['total'] > 0:
             st.warning(f"⚠️ 本次练习有 {wrong_stats['total']} 道错题需要复习！")
 
+        if session_stats.answered > 0:
+            with st.expander("📊 分题型 / 分工作表统计"):
+                st.dataframe(session_stats.rows("type"), use_container_width=True, hide_index=True)
+                st.dataframe(session_stats.rows("sheet"), use_container_width=True, hide_index=True)
+
         st.markdown("---")
         col_a, col_b, col_c = st.columns(3)
 
@@ -1701,12 +1919,11 @@ if not st.session_state.get("view_wrong_questions", False):
                 st.session_state.current_index = 0
                 st.session_state.user_progress = {}
                 st.session_state.answer_submitted = {}
+                st.session_state.session_stats = SessionStats(questions)
+                st.session_state.bank_status = None
 
                 # 保存重置后的进度
-                save_progress(exam_id, {}, st.session_state.exam_config, {
-                    "current_index": 0,
-                    "filtered_questions_length": len(questions)
-                })
+                save_session_progress(exam_id, 0, user_id=user_id)
                 st.rerun()
 
         with col_b:
@@ -1718,7 +1935,16 @@ if not st.session_state.get("view_wrong_questions", False):
         with col_c:
             if st.button("🏠 返回首页", use_container_width=True, type="secondary"):
                 for key in ["exam_started", "selected_types", "current_index", "user_progress",
-                            "filtered_questions", "all_questions", "exam_config", "answer_submitted"]:
+                            "filtered_questions", "all_questions", "exam_config", "answer_submitted",
+                            "session_stats", "bank_status"]:
                     if key in st.session_state:
                         del st.session_state[key]
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+page_timer.stop()
+rerun_timer.stop()
+
+# ================== 诊断面板 ==================
+if diagnostics_enabled():
+    with st.sidebar:
+        render_diagnostics_panel()
@@ -0,0 +1,358 @@
+"""
+运行指标：计数器、仪表和直方图，以 Prometheus 文本格式导出
+
+写入路径不加锁：每个线程在自己的累加数组上计数，只在导出时把各线程的
+数组相加。线程结束后其数组在下次汇总时并入“已退出线程”的合计，Streamlit
+每次运行脚本换一个线程也不会让分片无限增长。
+
+导出方式（二选一或同时使用）：
+    start_http_exporter(port)          本地 HTTP 端点 /metrics
+    start_textfile_exporter(path)      定期原子写入文本文件（node_exporter textfile collector）
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 活跃分片超过该数量时，注册新分片前先并入已退出线程的分片
+_MAX_LIVE_SHARDS = 64
+
+
+class _ThreadShards:
+    """每个线程一份定长累加数组；汇总时求和"""
+
+    def __init__(self, width):
+        self._width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = [0.0] * width
+
+    def mine(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0.0] * self._width
+            with self._lock:
+                if len(self._shards) >= _MAX_LIVE_SHARDS:
+                    self._retire_dead()
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _retire_dead(self):
+        alive = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                alive.append((thread, values))
+            else:
+                self._retired = [a + b for a, b in zip(self._retired, values)]
+        self._shards = alive
+
+    def totals(self):
+        with self._lock:
+            self._retire_dead()
+            totals = list(self._retired)
+            for _, values in self._shards:
+                totals = [a + b for a, b in zip(totals, values)]
+        return totals
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        """无标签的指标直接在自身上计数"""
+        return self.labels()
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._format_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _ThreadShards(1)
+
+    def inc(self, amount=1):
+        self._shards.mine()[0] += amount
+
+    def get(self):
+        return self._shards.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _format_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """导出时调用 function() 取值"""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self._value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def _format_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # 各桶计数 + (+Inf) + 总和 + 次数
+        self._shards = _ThreadShards(len(bounds) + 3)
+
+    def observe(self, value):
+        values = self._shards.mine()
+        values[bisect.bisect_left(self._bounds, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def time(self):
+        return _HistogramTimer(self)
+
+    def totals(self):
+        return self._shards.totals()
+
+
+class _HistogramTimer:
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _format_child(self, values, child):
+        totals = child.totals()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), totals):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(totals[-2])}")
+        lines.append(f"{self.name}_count{labels} {_format_value(totals[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        注册指标；同名同类型的指标再次注册时替换旧对象（Streamlit 开发模式下
+        修改过的模块会被重新导入），类型或标签不同则报错
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and (existing.kind, existing.labelnames) != (metric.kind, metric.labelnames):
+                raise ValueError(f"指标 {metric.name} 已注册为不同类型")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def generate_text(self):
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROCESS_START_TIME = Gauge("exam_process_start_time_seconds", "进程启动时间（Unix 时间戳）")
+PROCESS_START_TIME.set(time.time())
+
+# 各模块共用的缓存命中统计：命中率 = 1 - misses / requests
+CACHE_REQUESTS = Counter("exam_cache_requests_total", "缓存查询次数", ["cache"])
+CACHE_MISSES = Counter("exam_cache_misses_total", "缓存未命中次数（需重新加载或计算）", ["cache"])
+
+
+# ================== 导出 ==================
+def start_http_exporter(port, host="127.0.0.1", registry=None):
+    """在后台线程中提供 http://host:port/metrics，返回服务器对象"""
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            data = registry.generate_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_textfile(path, registry=None):
+    """原子写入指标文件（先写临时文件再替换），采集方不会读到写了一半的文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write((registry or REGISTRY).generate_text())
+    os.replace(tmp_path, path)
+
+
+def start_textfile_exporter(path, interval=15.0, registry=None):
+    """后台线程每 interval 秒写一次指标文件，返回用于停止的 Event"""
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                write_textfile(path, registry)
+            except OSError:
+                pass
+            if stop.wait(interval):
+                break
+
+    threading.Thread(target=run, name="metrics-textfile", daemon=True).start()
+    return stop
+
+
+def start_exporters_from_env(environ=None):
+    """
+    按环境变量启动导出：EXAM_METRICS_PORT（HTTP 端口）、EXAM_METRICS_HOST（默认 127.0.0.1）、
+    EXAM_METRICS_TEXTFILE（文件路径）、EXAM_METRICS_INTERVAL（写文件间隔秒数）
+    返回已启动的导出方式描述列表
+    """
+    environ = os.environ if environ is None else environ
+    started = []
+    port = environ.get("EXAM_METRICS_PORT")
+    if port:
+        host = environ.get("EXAM_METRICS_HOST", "127.0.0.1")
+        start_http_exporter(int(port), host)
+        started.append(f"http://{host}:{port}/metrics")
+    textfile = environ.get("EXAM_METRICS_TEXTFILE")
+    if textfile:
+        start_textfile_exporter(textfile, float(environ.get("EXAM_METRICS_INTERVAL", 15)))
+        started.append(textfile)
+    return started
@@ -0,0 +1,132 @@
+"""
+模拟考试组卷：按蓝图（各题型题数）批量生成试卷
+
+每位考生的试卷由 (基础种子, 考生序号) 决定，可以在多进程中并行生成上千份，
+结果以 int32 下标矩阵的形式压缩保存。考试时按考生序号直接取出预先生成的
+试卷，界面刷新过程中不再做任何抽样。
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BLUEPRINT_TYPES = ["判断", "单选", "填空", "简答"]
+DEFAULT_BLUEPRINT = {"判断": 20, "单选": 30, "填空": 10, "简答": 5}
+PAPER_DIR = "mock_exam_data"
+
+# 每个任务生成的试卷数；试卷总数少于 PARALLEL_MIN_PAPERS 时直接在当前进程生成
+CHUNK_PAPERS = 500
+PARALLEL_MIN_PAPERS = 10000
+
+
+def build_type_pools(questions):
+    """按题型分组的题目下标"""
+    pools = {}
+    for position, q in enumerate(questions):
+        pools.setdefault(q["type"], []).append(position)
+    return {t: np.asarray(positions, dtype=np.int32) for t, positions in pools.items()}
+
+
+def check_blueprint(blueprint, type_counts):
+    """检查题库各题型题数能否满足蓝图，返回问题描述列表（为空表示可以组卷）"""
+    problems = []
+    for q_type, count in blueprint.items():
+        available = type_counts.get(q_type, 0)
+        if count > available:
+            problems.append(f"{q_type}需要{count}题，题库中只有{available}题")
+    if sum(blueprint.values()) <= 0:
+        problems.append("试卷至少需要一道题")
+    return problems
+
+
+def _generate_chunk(args):
+    """生成 [start, stop) 号考生的试卷（在子进程中运行）"""
+    pools, plan, base_seed, start, stop = args
+    width = sum(count for _, count in plan)
+    papers = np.empty((stop - start, width), dtype=np.int32)
+    for row, candidate_no in enumerate(range(start, stop)):
+        rng = np.random.default_rng([base_seed, candidate_no])
+        column = 0
+        for q_type, count in plan:
+            if count:
+                papers[row, column:column + count] = rng.choice(pools[q_type], size=count, replace=False)
+                column += count
+    return papers
+
+
+def generate_papers(pools, blueprint, count, base_seed=0, workers=None):
+    """
+    生成 count 份符合蓝图的试卷，返回形状为 (count, 每卷题数) 的下标矩阵
+    试卷内按蓝图中的题型顺序排列；第 i 行只取决于 (base_seed, i)，与并行方式无关
+    """
+    plan = [(q_type, blueprint.get(q_type, 0)) for q_type in BLUEPRINT_TYPES if blueprint.get(q_type, 0)]
+    used_pools = {q_type: pools[q_type] for q_type, _ in plan}
+    tasks = [(used_pools, plan, base_seed, start, min(start + CHUNK_PAPERS, count))
+             for start in range(0, count, CHUNK_PAPERS)]
+
+    if count < PARALLEL_MIN_PAPERS or workers == 1:
+        chunks = [_generate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_generate_chunk, tasks))
+    return np.concatenate(chunks) if chunks else np.empty((0, 0), dtype=np.int32)
+
+
+def blueprint_key(exam_id, blueprint, count, base_seed, qids):
+    """试卷集的缓存键：题库、蓝图、份数、种子和题库内容任一变化都会生成新试卷集"""
+    digest = hashlib.md5()
+    digest.update(json.dumps([exam_id, blueprint, count, base_seed], ensure_ascii=False, sort_keys=True).encode())
+    digest.update("\x1f".join(qids).encode())
+    return digest.hexdigest()[:12]
+
+
+class PaperSet:
+    """预生成的试卷集：papers 中的下标指向 qid_table（生成时的题目ID表）"""
+
+    def __init__(self, papers, qid_table, meta):
+        self.papers = papers
+        self.qid_table = qid_table
+        self.meta = meta
+
+    @property
+    def count(self):
+        return len(self.papers)
+
+    @property
+    def blueprint(self):
+        return self.meta.get("blueprint", {})
+
+    def paper_qids(self, candidate_no):
+        """考生序号（从1开始）对应的试卷题目ID列表"""
+        if not 1 <= candidate_no <= self.count:
+            raise IndexError(f"考生序号应在 1 到 {self.count} 之间")
+        return [str(self.qid_table[i]) for i in self.papers[candidate_no - 1]]
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, papers=self.papers, qid_table=self.qid_table,
+                                meta=np.asarray(json.dumps(self.meta, ensure_ascii=False)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["papers"], data["qid_table"], json.loads(str(data["meta"])))
+
+
+def build_paper_set(questions, exam_id, blueprint, count, base_seed=0, workers=None):
+    """根据已加载的题库生成试卷集（已生成过的直接从磁盘读取）"""
+    qids = [q["qid"] for q in questions]
+    path = os.path.join(PAPER_DIR, f"papers_{blueprint_key(exam_id, blueprint, count, base_seed, qids)}.npz")
+    if os.path.exists(path):
+        return PaperSet.load(path), path
+
+    papers = generate_papers(build_type_pools(questions), blueprint, count, base_seed, workers)
+    meta = {"exam_id": exam_id, "blueprint": blueprint, "count": count, "base_seed": base_seed}
+    paper_set = PaperSet(papers, np.asarray(qids), meta)
+    paper_set.save(path)
+    return paper_set, path
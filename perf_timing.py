@@ -0,0 +1,114 @@
+"""
+性能计时：按代码段统计耗时和调用次数
+
+timed() 可作为上下文管理器或装饰器使用，每次计时同时累加到进程级统计和
+当前会话的统计。会话统计由页面在每次运行开始时用 bind_session_stats() 绑定；
+Streamlit 每个会话的脚本在各自的线程中运行，绑定保存在 ContextVar 中，互不干扰。
+没有绑定会话时（后台线程、HTTP 服务）只计入进程级统计。
+所有计时同时计入 exam_section_duration_seconds 直方图，供 Prometheus 采集。
+"""
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import Histogram
+
+SECTION_SECONDS = Histogram("exam_section_duration_seconds", "各代码段耗时（加载、判分、存储、渲染）", ["section"])
+
+
+class TimingStats:
+    """各代码段的调用次数、总耗时、最大耗时和最近一次耗时（秒）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sections = {}
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+
+    def add(self, section, seconds):
+        with self._lock:
+            stat = self._sections.get(section)
+            if stat is None:
+                stat = self._sections[section] = {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            stat["count"] += 1
+            stat["total"] += seconds
+            stat["last"] = seconds
+            if seconds > stat["max"]:
+                stat["max"] = seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {section: dict(stat) for section, stat in self._sections.items()}
+
+    def reset(self):
+        with self._lock:
+            self._sections.clear()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+
+    def rows(self):
+        """按总耗时从高到低排列的表格行（毫秒）"""
+        rows = []
+        for section, stat in self.snapshot().items():
+            rows.append({
+                "代码段": section,
+                "次数": stat["count"],
+                "总耗时(ms)": round(stat["total"] * 1000, 2),
+                "平均(ms)": round(stat["total"] / stat["count"] * 1000, 3),
+                "最大(ms)": round(stat["max"] * 1000, 2),
+                "最近(ms)": round(stat["last"] * 1000, 3),
+            })
+        return sorted(rows, key=lambda row: row["总耗时(ms)"], reverse=True)
+
+    def to_dict(self):
+        return {"started_at": self.started_at, "sections": self.snapshot()}
+
+
+PROCESS_STATS = TimingStats()
+_session_stats = contextvars.ContextVar("session_timing_stats", default=None)
+
+
+def bind_session_stats(stats):
+    """把当前线程（会话）后续的计时同时计入 stats"""
+    _session_stats.set(stats)
+
+
+def record(section, seconds):
+    SECTION_SECONDS.labels(section).observe(seconds)
+    PROCESS_STATS.add(section, seconds)
+    stats = _session_stats.get()
+    if stats is not None:
+        stats.add(section, seconds)
+
+
+@contextmanager
+def timed(section):
+    """统计一段代码或一个函数（作为装饰器）的耗时，异常退出时同样计入"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(section, time.perf_counter() - start)
+
+
+class SectionTimer:
+    """不便用 with 包裹的大段代码：开始处创建，结束处调用 stop()；中途 st.rerun() 时不计入"""
+
+    def __init__(self, section):
+        self.section = section
+        self._start = time.perf_counter()
+        self._stopped = False
+
+    def stop(self):
+        if not self._stopped:
+            self._stopped = True
+            record(self.section, time.perf_counter() - self._start)
+
+
+def dump_json(session_stats=None):
+    """导出进程级（及会话级）统计的 JSON 文本"""
+    data = {"generated_at": datetime.now().isoformat(timespec="seconds"), "process": PROCESS_STATS.to_dict()}
+    if session_stats is not None:
+        data["session"] = session_stats.to_dict()
+    return json.dumps(data, ensure_ascii=False, indent=2)
@@ -0,0 +1,559 @@
+"""
+题库加载：读取 Excel 题库、解析选项并智能识别题型
+
+只依赖 pandas/openpyxl，不调用任何界面函数，可在后台线程或独立服务中使用。
+pandas 在真正解析题库时才导入，只用到题目列表、题型识别等函数时不会加载。
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+from grading import OPTION_LETTERS, compile_blank_answer, is_missing, normalize_answer
+from metrics import Counter, Gauge
+from perf_timing import timed
+
+BANK_PARSES = Counter("exam_bank_parses_total", "题库文件解析次数（按结果）", ["result"])
+BANK_QUESTIONS = Gauge("exam_bank_questions", "最近一次解析得到的题目数", ["bank"])
+SHEET_PARSES = Counter("exam_bank_sheet_parses_total", "工作表解析次数（按结果）", ["result"])
+
+
+# ================== 题型识别函数 ==================
+def intelligent_detect_question_type(question_text, correct_answer, options_text, explicit_type=None):
+    """
+    智能识别题目类型 - 修复版
+    """
+    # 如果Excel中明确指定了题型，优先使用
+    if explicit_type and str(explicit_type).strip() in ["判断", "单选", "填空", "简答", "多选"]:
+        return str(explicit_type).strip()
+
+    # 标准化输入
+    question_text = str(question_text).strip() if question_text else ""
+    correct_answer = str(correct_answer).strip() if correct_answer else ""
+    options_text = str(options_text).strip() if options_text else ""
+
+    # 1. 判断题识别
+    def is_judgment_question(q_text, ans):
+        """判断是否为判断题"""
+        # 答案特征
+        judgment_answers = {
+            "对": ["对", "正确", "√", "✓", "✅", "是", "yes", "true", "True", "T", "t"],
+            "错": ["错", "错误", "×", "✗", "❌", "否", "no", "false", "False", "F", "f"]
+        }
+
+        # 检查答案格式
+        ans_lower = str(ans).lower().strip()
+        for key, patterns in judgment_answers.items():
+            if ans_lower in patterns or ans in patterns:
+                # 检查题目特征
+                q_lower = q_text.lower()
+                judgment_keywords = [
+                    "是否正确", "是对是错", "判断正误", "判断对错", "下列说法是否正确",
+                    "请判断", "是否正确", "true or false", "判断下列说法", "正误"
+                ]
+                has_judgment_keyword = any(keyword in q_lower for keyword in judgment_keywords)
+
+                if has_judgment_keyword or not options_text or len(options_text) < 20:
+                    return key
+        return None
+
+    judgment_type = is_judgment_question(question_text, correct_answer)
+    if judgment_type:
+        return "判断"
+
+    # 2. 选择题识别
+    answer_is_option = re.match(r'^[A-Ha-h]$', str(correct_answer).strip()) is not None
+
+    # 检查选项文本是否包含选择题模式
+    choice_patterns = [
+        r'[A-Da-d][\.．、:：]\s*[^\s]+',
+        r'选项[ABCDabcd][\.．、:：]?\s*[^\s]+',
+        r'[①②③④][\.．、:：]\s*[^\s]+',
+        r'[1-4][\.．、:：]\s*[^\s]+',
+    ]
+
+    has_choice_pattern = False
+    option_count = 0
+    for pattern in choice_patterns:
+        matches = re.findall(pattern, options_text)
+        if len(matches) >= 2:
+            has_choice_pattern = True
+            option_count = len(matches)
+            break
+
+    # 检查题目是否包含选择题特征
+    question_lower = question_text.lower()
+    choice_keywords = ["下列", "选择", "哪", "哪些", "正确的是", "不正确的是", "选项", "最符合"]
+    has_choice_keyword = any(keyword in question_lower for keyword in choice_keywords)
+
+    # 特别处理以括号结束的题目
+    has_blank_at_end = re.search(r'（\s*）\s*[。.]?$', question_text) is not None
+    has_parentheses_at_end = re.search(r'\(\s*\)\s*[.。]?$', question_text) is not None
+
+    # 选择题识别条件
+    if answer_is_option and (has_choice_pattern or has_choice_keyword or has_blank_at_end or has_parentheses_at_end):
+        if option_count >= 2:
+            return "单选"
+
+    # 3. 填空题识别
+    blank_patterns = [
+        r'_{2,}', r'\(\)', r'（\s*）', r'【\s*】', r'______', r'……', r'---',
+    ]
+    has_blank = any(re.search(pattern, question_text) for pattern in blank_patterns)
+
+    fill_keywords = ["填空", "填写", "填入", "补充", "补全"]
+    has_fill_keyword = any(keyword in question_text for keyword in fill_keywords)
+
+    is_short_answer = 1 <= len(str(correct_answer).strip()) <= 30
+
+    if has_blank or has_fill_keyword or is_short_answer:
+        return "填空"
+
+    # 4. 简答题识别
+    essay_keywords = ["简述", "论述", "说明", "阐述", "分析", "解释", "为什么", "如何", "怎样", "什么", "意义"]
+    has_essay_keyword = any(keyword in question_text for keyword in essay_keywords)
+
+    is_long_answer = len(str(correct_answer).strip()) > 30
+
+    if has_essay_keyword or is_long_answer:
+        return "简答"
+
+    # 5. 默认判断
+    if answer_is_option and option_count >= 2:
+        return "单选"
+    elif is_short_answer:
+        return "填空"
+    else:
+        return "简答"
+
+
+# ================== 选项单元格解析 ==================
+# 一个选项单元格的解析结果（不可变，可在缓存中共享）：
+#   options      ((标签, 文字), ...)
+#   separator    拆分方式："\n"、";"、"；"、"，"、","、"inline"（按行内的 A. B. 标签）或 ""（只有一项）
+#   diagnostics  (说明, ...)：跳过的重复标签、超出上限而忽略的选项等
+OptionParse = namedtuple("OptionParse", ["options", "separator", "diagnostics"])
+EMPTY_OPTION_PARSE = OptionParse((), "", ())
+
+MAX_OPTIONS = len(OPTION_LETTERS)
+OPTION_CACHE_SIZE = 4096
+_SEPARATORS = ("\n", ";", "；", "，", ",")
+_CIRCLED = "①②③④⑤⑥⑦⑧"
+# 行首的选项标签，四种写法合成一个模式，每行只匹配一次：
+#   A. / 选项A / ①. / 1.  （标签后的标点：. ． 、 : ：，“选项A”后可省略）
+_OPTION_LABEL = re.compile(
+    r"(?:选项(?P<named>[A-Ha-h])[.．、:：]?"
+    r"|(?P<letter>[A-Ha-h])[.．、:：]"
+    r"|(?P<circled>[①-⑧])[.．、:：]"
+    r"|(?P<number>[1-8])[.．、:：])\s*"
+)
+# 没有分隔符的单元格中按行内标签拆分，如 "A.对 B.错"
+_INLINE_LABEL = re.compile(r"(?:^|(?<=\s))([A-H])[.．、:：]")
+
+
+def _split_cell(content):
+    """按第一个出现的分隔符拆分；都没有时尝试按从 A 起连续的行内标签拆分"""
+    for separator in _SEPARATORS:
+        if separator in content:
+            return content.split(separator), separator
+    starts = [m.start() for m in _INLINE_LABEL.finditer(content)]
+    labels = [content[i] for i in starts]
+    if len(starts) >= 2 and "".join(labels) == OPTION_LETTERS[:len(labels)]:
+        return [content[a:b] for a, b in zip(starts, starts[1:] + [len(content)])], "inline"
+    return [content], ""
+
+
+@lru_cache(maxsize=OPTION_CACHE_SIZE)
+def tokenize_option_cell(content):
+    """
+    解析一个选项单元格的文字（已转为 str 并去掉首尾空白），返回 OptionParse
+    每行用一个组合模式识别标签；没有标签的行按顺序分配 A、B、C……
+    同一单元格在题库中反复出现（如 "对；错"、A–D 模板），按内容缓存解析结果
+    """
+    if not content:
+        return EMPTY_OPTION_PARSE
+    parts, separator = _split_cell(content)
+    options, diagnostics, seen = [], [], set()
+    index = 0
+    for part in parts:
+        line = part.strip()
+        if not line:
+            continue
+        if index >= MAX_OPTIONS:
+            diagnostics.append(f"超过 {MAX_OPTIONS} 个选项，已忽略: {line}")
+            continue
+        label = OPTION_LETTERS[index]
+        index += 1
+        text = line
+        match = _OPTION_LABEL.match(line)
+        if match:
+            text = line[match.end():].strip()
+            if match.group("circled"):
+                label = OPTION_LETTERS[_CIRCLED.index(match.group("circled"))]
+            elif match.group("number"):
+                label = OPTION_LETTERS[int(match.group("number")) - 1]
+            else:
+                label = (match.group("named") or match.group("letter")).upper()
+        if label in seen:
+            diagnostics.append(f"重复的选项标签 {label}，已跳过: {line}")
+            continue
+        seen.add(label)
+        options.append((label, text))
+    return OptionParse(tuple(options), separator, tuple(diagnostics))
+
+
+def parse_option_cell(cell_content):
+    """任意单元格值（空值、数字等）→ OptionParse"""
+    if cell_content is None or is_missing(cell_content):
+        return EMPTY_OPTION_PARSE
+    return tokenize_option_cell(str(cell_content).strip())
+
+
+def parse_options_from_cell(cell_content):
+    """从一个单元格中解析出选项（支持多种格式），返回新的 [{'label', 'text'}, ...] 列表"""
+    return [{'label': label, 'text': text} for label, text in parse_option_cell(cell_content).options]
+
+
+# ================== 题库加载函数 ==================
+def resolve_exam_path(file_path, base_dir=None):
+    """
+    定位题库文件的实际路径，找不到时返回None
+    指定 base_dir 时只在 base_dir/data 和 base_dir 中查找（与 list_exam_files(base_dir) 一致）
+    """
+    if base_dir is not None:
+        for path in (os.path.join(base_dir, "data", file_path), os.path.join(base_dir, file_path)):
+            if os.path.exists(path):
+                return path
+        return None
+    if os.path.exists(file_path):
+        return file_path
+    # 尝试在data目录下查找
+    data_path = os.path.join("data", file_path)
+    if os.path.exists(data_path):
+        return data_path
+    # 尝试在当前目录下直接查找
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    abs_path = os.path.join(current_dir, file_path)
+    if os.path.exists(abs_path):
+        return abs_path
+    return None
+
+
+def list_exam_files(base_dir=None):
+    """列出可用的题库文件：优先使用 data 目录，其次是 base_dir（未指定时为当前目录）"""
+    fallback_dir = base_dir or "."
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(base_dir, "data")
+    xlsx_files = []
+    if os.path.exists(data_dir):
+        xlsx_files = [f for f in os.listdir(data_dir) if f.endswith(".xlsx")]
+    if not xlsx_files:
+        xlsx_files = [f for f in os.listdir(fallback_dir) if f.endswith(".xlsx")]
+    return sorted(xlsx_files)
+
+
+def make_question_id(sheet_name, question, options):
+    """
+    根据工作表和标准化后的题目内容生成稳定的题目ID
+    题目在表中的行号变化（插入、删除行）不会影响ID
+    """
+    parts = [str(sheet_name).strip(), re.sub(r'\s+', ' ', question).strip()]
+    parts.extend(re.sub(r'\s+', ' ', opt['text']).strip() for opt in options)
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def build_question_index(questions):
+    """建立 题目ID -> 题目 的索引"""
+    return {q["qid"]: q for q in questions}
+
+
+SHEET_INDEX_STRIDE = 1 << 20  # 单个工作表的行数上限；题目的 original_index = 工作表序号 × 该值 + 表内序号
+
+SheetInfo = namedtuple("SheetInfo", ["name", "rows"])
+# 一个工作表的解析结果：题目元组、识别统计（没有有效题目时为 None）、提示信息
+ParsedSheet = namedtuple("ParsedSheet", ["questions", "stats", "notices"])
+
+
+def read_sheet_index(file_path):
+    """只读取工作簿元数据：各工作表的名称和数据行数（不含表头），不解析单元格"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        sheets = []
+        for sheet in workbook.worksheets:
+            rows = sheet.max_row
+            if rows is None:  # 文件中没有记录表格范围时才逐行计数
+                rows = sum(1 for _ in sheet.iter_rows(values_only=True))
+            sheets.append(SheetInfo(sheet.title, max(rows - 1, 0)))
+        return sheets
+    finally:
+        workbook.close()
+
+
+def parse_sheet(sheet_name, df, base_index=0):
+    """解析一个工作表的数据并识别题型，返回 ParsedSheet"""
+    import pandas as pd
+
+    if df.empty:
+        return ParsedSheet((), None, ())
+
+    # 查找题目列和答案列
+    question_col = None
+    answer_col = None
+
+    # 先尝试查找标准列名
+    for col in df.columns:
+        col_str = str(col).strip()
+        if col_str == "题目" or col_str == "question":
+            question_col = col
+        elif col_str == "正确答案" or col_str == "答案":
+            answer_col = col
+
+    # 如果没找到标准列名，尝试模糊匹配
+    if question_col is None:
+        for col in df.columns:
+            col_str = str(col).strip()
+            if '题目' in col_str or 'question' in col_str.lower():
+                question_col = col
+                break
+
+    if answer_col is None:
+        for col in df.columns:
+            col_str = str(col).strip()
+            if '答案' in col_str or 'answer' in col_str.lower():
+                answer_col = col
+                break
+
+    if question_col is None or answer_col is None:
+        return ParsedSheet((), None, (("warning", f"工作表'{sheet_name}'中未找到题目列或答案列，跳过"),))
+
+    sheet_stats = {
+        "total": 0,
+        "rows": len(df),
+        "judgment": 0, "single_choice": 0, "fill_blank": 0, "essay": 0,
+        "detection_details": []
+    }
+
+    questions = []
+    # 题目ID包含工作表名，重复只可能出现在同一工作表内
+    seen_ids = {}
+    for idx, row in df.iterrows():
+        try:
+            question = str(row[question_col]).strip()
+            if pd.isna(question) or question == "" or question == "nan":
+                continue
+
+            correct_ans = str(row[answer_col]).strip() if not pd.isna(row[answer_col]) else ""
+
+            # 获取题型列（如果存在）
+            type_col = None
+            for col in df.columns:
+                if str(col).strip() == "题型":
+                    type_col = col
+                    break
+
+            explicit_type = row[type_col] if type_col and not pd.isna(row[type_col]) else None
+
+            # 获取解析列（如果存在）
+            explanation_col = None
+            for col in df.columns:
+                if str(col).strip() == "解析":
+                    explanation_col = col
+                    break
+
+            explanation = row[explanation_col] if explanation_col and not pd.isna(row[explanation_col]) else ""
+
+            # 查找选项列
+            options = []
+            options_text_for_detection = ""
+
+            # 1. 首先查找名为"选项"的列
+            option_cell_content = None
+            for col in df.columns:
+                if str(col).strip() == "选项":
+                    if not pd.isna(row[col]):
+                        option_cell_content = row[col]
+                    break
+
+            if option_cell_content is not None:
+                options = parse_options_from_cell(option_cell_content)
+                if options:
+                    options_text_for_detection = "\n".join(
+                        [f"{opt['label']}. {opt['text']}" for opt in options])
+            else:
+                # 2. 如果没有"选项"列，查找单独的A、B、C、D列
+                options_dict = {}
+                for label in ['A', 'B', 'C', 'D']:
+                    possible_columns = [
+                        str(label),
+                        f"选项{label}",
+                        f"{label}选项",
+                        f"选项 {label}",
+                    ]
+
+                    found = False
+                    for col_name in possible_columns:
+                        if col_name in df.columns and not pd.isna(row[col_name]) and str(row[col_name]).strip():
+                            options_dict[label] = str(row[col_name]).strip()
+                            found = True
+                            break
+
+                # 构建选项
+                for label in ['A', 'B', 'C', 'D']:
+                    if label in options_dict:
+                        options.append({'label': label, 'text': options_dict[label]})
+
+                if options:
+                    options_text_for_detection = "\n".join(
+                        [f"{opt['label']}. {opt['text']}" for opt in options])
+
+            # 智能识别题型
+            detected_type = intelligent_detect_question_type(
+                question, correct_ans, options_text_for_detection, explicit_type
+            )
+
+            # 标准化答案
+            normalized_ans = normalize_answer(correct_ans)
+
+            # 统计识别结果
+            sheet_stats["total"] += 1
+            type_key_map = {
+                "判断": "judgment",
+                "单选": "single_choice",
+                "填空": "fill_blank",
+                "简答": "essay"
+            }
+            stat_key = type_key_map.get(detected_type, "unknown")
+            sheet_stats[stat_key] = sheet_stats.get(stat_key, 0) + 1
+
+            # 同一工作表内内容完全相同的题目按出现顺序区分
+            qid = make_question_id(sheet_name, question, options)
+            occurrence = seen_ids.get(qid, 0)
+            seen_ids[qid] = occurrence + 1
+            if occurrence:
+                qid = f"{qid}-{occurrence}"
+
+            question_data = {
+                "qid": qid,
+                "original_index": base_index + len(questions),
+                "question": question,
+                "type": detected_type,
+                "options": options,
+                "correct_answer_normalized": normalized_ans,
+                "correct_answer_display": correct_ans,
+                # 填空题的答案预先编译（各空的可接受答案、数值），判分时只需查表
+                "blank_matcher": compile_blank_answer(correct_ans) if detected_type == "填空" else None,
+                "explanation": str(explanation) if pd.notna(explanation) else "",
+                "source": f"{sheet_name}",
+                "row_index": idx + 2,
+                "sheet_name": sheet_name
+            }
+
+            questions.append(question_data)
+
+        except Exception as e:
+            continue
+
+    if sheet_stats["total"] == 0:
+        return ParsedSheet((), None, ())
+    return ParsedSheet(tuple(questions), sheet_stats, ())
+
+
+class QuestionBank:
+    """
+    按工作表延迟解析的题库：打开时只读取各工作表的名称和行数，某个工作表
+    第一次被用到时才解析并识别题型，各工作表的结果分别缓存
+    同一进程的多个会话共用一个实例，解析过程加锁，同一工作表只解析一次
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._sheets = None
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+    @property
+    def sheets(self):
+        """[SheetInfo, ...]，按工作簿中的顺序"""
+        if self._sheets is None:
+            with self._lock:
+                if self._sheets is None:
+                    self._sheets = read_sheet_index(self.file_path)
+        return self._sheets
+
+    @property
+    def sheet_names(self):
+        return [sheet.name for sheet in self.sheets]
+
+    def is_parsed(self, sheet_name):
+        return sheet_name in self._parsed
+
+    @timed("loader.parse_sheets")
+    def _parse_missing(self, names):
+        """解析尚未缓存的工作表；多个工作表一次读取，共用同一次 Excel 解压和共享字符串解析"""
+        import pandas as pd
+
+        positions = {name: i for i, name in enumerate(self.sheet_names)}
+        frames = pd.read_excel(self.file_path, sheet_name=names, engine='openpyxl')
+        for name in names:
+            self._parsed[name] = parse_sheet(name, frames[name], positions[name] * SHEET_INDEX_STRIDE)
+            SHEET_PARSES.labels("ok" if self._parsed[name].stats else "empty").inc()
+
+    def load_sheets(self, sheet_names=None):
+        """
+        返回所选工作表（默认全部）的 (题目列表, 识别统计, 提示信息列表)，题目按工作簿中的顺序
+        读取失败时题目为空，提示信息中有错误
+        """
+        try:
+            names = self.sheet_names
+        except Exception as e:
+            return [], {}, [("error", f"读取Excel文件失败: {e}")]
+        if not names:
+            return [], {}, [("error", "❌ Excel文件为空或格式不正确")]
+        if sheet_names is not None:
+            wanted = set(sheet_names)
+            names = [name for name in names if name in wanted]
+
+        missing = [name for name in names if name not in self._parsed]
+        if missing:
+            with self._lock:
+                missing = [name for name in missing if name not in self._parsed]
+                if missing:
+                    try:
+                        self._parse_missing(missing)
+                    except Exception as e:
+                        SHEET_PARSES.labels("error").inc()
+                        return [], {}, [("error", f"读取Excel文件失败: {e}")]
+
+        questions, detection_stats, notices = [], {}, []
+        for name in names:
+            parsed = self._parsed[name]
+            questions.extend(parsed.questions)
+            notices.extend(parsed.notices)
+            if parsed.stats:
+                detection_stats[name] = parsed.stats
+        return questions, detection_stats, notices
+
+
+@timed("loader.parse_question_bank")
+def parse_question_bank(file_path):
+    """
+    解析题库文件的全部工作表并识别题型（不调用任何界面函数，可在后台线程中运行）
+    返回 (题目列表, 识别统计, 提示信息列表)，提示信息为 (级别, 内容) 元组
+    """
+    all_questions, detection_stats, notices = QuestionBank(file_path).load_sheets()
+    if any(level == "error" for level, _ in notices):
+        BANK_PARSES.labels("error").inc()
+        return [], {}, notices
+
+    if not all_questions:
+        notices.append(("error", "❌ 未找到任何有效题目"))
+        BANK_PARSES.labels("empty").inc()
+        return [], {}, notices
+
+    BANK_PARSES.labels("ok").inc()
+    BANK_QUESTIONS.labels(os.path.basename(file_path)).set(len(all_questions))
+    return all_questions, detection_stats, notices
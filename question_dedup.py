@@ -0,0 +1,212 @@
+"""
+近似重复题检测：字符 shingle + MinHash 签名 + LSH 分桶
+
+合并后的题库中常有跨工作表复制、只改动个别字词的题目。这里对每道题的
+题干和选项计算 MinHash 签名，再用 LSH 分桶只比较落入同一桶的候选题，
+在 10 万题规模下也无需两两比较。
+"""
+import random
+import re
+import unicodedata
+
+import numpy as np
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 2
+DEFAULT_THRESHOLD = 0.8
+
+# 每批参与向量化计算的 shingle 数量上限，控制中间矩阵的内存占用
+_CHUNK_SHINGLES = 200_000
+
+_NOISE_PATTERN = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_text(text):
+    """标准化文本：全角转半角、转小写、去掉空白和标点"""
+    text = unicodedata.normalize("NFKC", str(text or "")).lower()
+    return _NOISE_PATTERN.sub("", text)
+
+
+def question_text(question):
+    """参与查重的题目文本：题干 + 各选项内容"""
+    parts = [question.get("question", "")]
+    parts.extend(opt.get("text", "") for opt in question.get("options", []))
+    return " ".join(parts)
+
+
+# 把 size 个连续字符的码位组合成一个 64 位 shingle 哈希所用的乘数（奇数）
+_SHINGLE_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                                 0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53],
+                                dtype=np.uint64)
+
+
+def _batch_shingle_hashes(normalized_texts, size):
+    """
+    对一批已标准化的文本整体计算 shingle 哈希
+    返回 (哈希数组, 每条文本的 shingle 数)；短于 size 的文本用空字符补齐，
+    只产生一个 shingle。
+    """
+    padded = [text.ljust(size, "\0") for text in normalized_texts]
+    lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    # 在整批码位上滑动组合，再只取不跨越文本边界的位置
+    window = len(codes) - size + 1
+    combined = codes[:window] * _SHINGLE_MULTIPLIERS[0]
+    for j in range(1, size):
+        combined += codes[j:j + window] * _SHINGLE_MULTIPLIERS[j]
+    combined ^= combined >> np.uint64(29)
+
+    counts = lengths - size + 1
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    first_shingle = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.repeat(starts - first_shingle, counts) + np.arange(counts.sum())
+    return combined[positions], counts
+
+
+def minhash_signatures(texts, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE, seed=1):
+    """
+    计算 MinHash 签名矩阵，形状为 (题目数, num_perm)
+    使用乘移位哈希 ((a*x + b) mod 2^64) >> 32 模拟 num_perm 个随机排列，
+    uint64 乘法自然回绕，整批 shingle 一次完成向量化计算。
+    没有有效字符的文本签名全为最大值，不会与其他题目匹配。
+    """
+    if shingle_size > len(_SHINGLE_MULTIPLIERS):
+        raise ValueError(f"shingle_size 不能超过 {len(_SHINGLE_MULTIPLIERS)}")
+
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)[:, None]
+    shift = np.uint64(32)
+
+    signatures = np.full((len(texts), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+
+    def flush(rows, normalized):
+        hashes, counts = _batch_shingle_hashes(normalized, shingle_size)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        # (num_perm, shingle数)，沿连续的第二维按文本分段取最小值
+        values = ((a * hashes[None, :] + b) >> shift).astype(np.uint32)
+        signatures[rows] = np.minimum.reduceat(values, offsets, axis=1).T
+
+    batch_rows, batch_texts, batch_size = [], [], 0
+    for row, text in enumerate(texts):
+        normalized = normalize_text(text)
+        if not normalized:
+            continue
+        batch_rows.append(row)
+        batch_texts.append(normalized)
+        batch_size += len(normalized)
+        if batch_size >= _CHUNK_SHINGLES:
+            flush(batch_rows, batch_texts)
+            batch_rows, batch_texts, batch_size = [], [], 0
+
+    if batch_rows:
+        flush(batch_rows, batch_texts)
+
+    return signatures
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, x, y):
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x != root_y:
+            # 以较小的下标为根，簇内顺序与题库顺序一致
+            if root_x < root_y:
+                self.parent[root_y] = root_x
+            else:
+                self.parent[root_x] = root_y
+
+
+def _lsh_candidate_pairs(signatures, bands, seed=1):
+    """
+    LSH 分桶：每个 band 的签名行折叠成一个 64 位桶键，排序后相邻相等即为同桶。
+    依次产出每个 band 中同桶题目两两组成的下标数组对：第 d 轮是排序后相隔 d 个位置、
+    仍在同一桶中的题目，桶有多大就比较到多远，与桶内题目的排列顺序无关。
+    """
+    rows = signatures.shape[1] // bands
+    multipliers = np.random.default_rng(seed).integers(1, 2 ** 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    for band in range(bands):
+        block = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (block * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        same_as_previous = np.concatenate(([False], sorted_keys[1:] == sorted_keys[:-1]))
+        if not same_as_previous.any():
+            continue
+        # 每个位置之后同桶的题数
+        bucket = np.cumsum(~same_as_previous) - 1
+        bucket_end = np.cumsum(np.bincount(bucket))[bucket]
+        later = bucket_end - np.arange(len(order)) - 1
+        for distance in range(1, int(later.max()) + 1):
+            positions = np.flatnonzero(later >= distance)
+            yield order[positions], order[positions + distance]
+
+
+def find_near_duplicate_clusters(texts, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+                                 bands=DEFAULT_BANDS, shingle_size=DEFAULT_SHINGLE_SIZE, seed=1):
+    """
+    查找近似重复的文本簇
+    返回簇列表，每个簇是按下标升序排列的文本下标列表（只包含两条及以上的簇）
+    只比较同桶题目的签名；桶通常很小，整体复杂度与题目数近似线性。
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm 必须能被 bands 整除")
+    if len(texts) < 2:
+        return []
+
+    signatures = minhash_signatures(texts, num_perm, shingle_size, seed)
+    empty = np.all(signatures == np.iinfo(np.uint32).max, axis=1)
+    union_find = _UnionFind(len(texts))
+
+    for lefts, rights in _lsh_candidate_pairs(signatures, bands, seed):
+        valid = ~(empty[lefts] | empty[rights])
+        lefts, rights = lefts[valid], rights[valid]
+        # 用签名相等位的比例估计 Jaccard 相似度
+        similarity = (signatures[lefts] == signatures[rights]).mean(axis=1)
+        matched = similarity >= threshold
+        for x, y in zip(lefts[matched].tolist(), rights[matched].tolist()):
+            union_find.union(x, y)
+
+    clusters = {}
+    for index in range(len(texts)):
+        clusters.setdefault(union_find.find(index), []).append(index)
+    return sorted((members for members in clusters.values() if len(members) >= 2), key=lambda m: m[0])
+
+
+class DuplicateIndex:
+    """近似重复题索引：簇列表（题目ID）及 题目ID -> 簇编号"""
+
+    def __init__(self, clusters):
+        self.clusters = clusters
+        self.cluster_of = {qid: cluster_no for cluster_no, qids in enumerate(clusters) for qid in qids}
+
+    @property
+    def duplicate_count(self):
+        """可以省去的重复题数量"""
+        return sum(len(qids) - 1 for qids in self.clusters)
+
+    def pick_excluded(self, rng=None):
+        """每个近似重复簇随机保留一道题，返回其余需要省去的题目ID集合"""
+        rng = rng or random.Random()
+        excluded = set()
+        for qids in self.clusters:
+            keep = rng.choice(qids)
+            excluded.update(qid for qid in qids if qid != keep)
+        return excluded
+
+
+def build_duplicate_index(questions, threshold=DEFAULT_THRESHOLD, **kwargs):
+    """对题目列表检测近似重复题，返回 DuplicateIndex"""
+    clusters = find_near_duplicate_clusters([question_text(q) for q in questions], threshold, **kwargs)
+    return DuplicateIndex([[questions[i]["qid"] for i in members] for members in clusters])
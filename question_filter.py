@@ -0,0 +1,150 @@
+"""
+自主选题界面的组合筛选：用位集（Python 整数）表示题目集合
+
+题目在题库列表中的位置即位序号。每个题库预先为各题型、各工作表建立一个位集，
+搜索词命中的题目集合按搜索词缓存；每个会话维护已答、答对两个位集，提交时按位更新。
+任意筛选组合都是几次按位与/或，计数用 int.bit_count()，不再逐题扫描题库。
+"""
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+SEARCH_CACHE_SIZE = 64  # 每个题库缓存的搜索词个数
+
+STATUS_OPTIONS = ["全部", "未作答", "已答对", "已答错"]
+
+
+def _mask(positions, size):
+    """位序号列表 → 位集"""
+    bits = bytearray((size + 7) // 8)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bits, "little")
+
+
+def iter_positions(mask):
+    """位集中为 1 的位序号（从小到大）"""
+    bits = bin(mask)[:1:-1]
+    pos = bits.find("1")
+    while pos >= 0:
+        yield pos
+        pos = bits.find("1", pos + 1)
+
+
+class QuestionFilter:
+    """一个题库（题目列表）的位集索引，建立后只读，可在会话间共享"""
+
+    def __init__(self, questions):
+        self.size = len(questions)
+        self.all = (1 << self.size) - 1
+        self.positions = {q["qid"]: pos for pos, q in enumerate(questions)}
+
+        by_type, by_sheet = {}, {}
+        for pos, q in enumerate(questions):
+            by_type.setdefault(q["type"], []).append(pos)
+            by_sheet.setdefault(q.get("sheet_name", ""), []).append(pos)
+        self.by_type = {key: _mask(positions, self.size) for key, positions in by_type.items()}
+        self.by_sheet = {key: _mask(positions, self.size) for key, positions in by_sheet.items()}
+
+        # 搜索：所有题目（小写）以 \0 连接，str.find 在整段文字上查找，
+        # 命中位置按每题的起始偏移二分换算为位序号
+        texts = [q["question"].lower() for q in questions]
+        self._text = "\0".join(texts)
+        self._starts = []
+        offset = 0
+        for text in texts:
+            self._starts.append(offset)
+            offset += len(text) + 1
+        self._search_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, term):
+        """题目文字包含 term（不区分大小写）的题目；term 为空时为全部题目"""
+        term = term.lower()
+        if not term:
+            return self.all
+        if "\0" in term:
+            return 0
+        with self._lock:
+            mask = self._search_cache.get(term)
+            if mask is not None:
+                self._search_cache.move_to_end(term)
+                return mask
+
+        hits = []
+        text, starts = self._text, self._starts
+        found = text.find(term)
+        while found >= 0:
+            pos = bisect_right(starts, found) - 1
+            hits.append(pos)
+            # 同一题只记一次，从下一题的开头继续查找
+            if pos + 1 >= len(starts):
+                break
+            found = text.find(term, starts[pos + 1])
+        mask = _mask(hits, self.size)
+
+        with self._lock:
+            self._search_cache[term] = mask
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return mask
+
+    def select(self, types=None, sheets=None, term=""):
+        """题型、工作表（为空表示不限）和搜索词的组合筛选结果"""
+        mask = self.search(term)
+        if types:
+            mask &= self._union(self.by_type, types)
+        if sheets:
+            mask &= self._union(self.by_sheet, sheets)
+        return mask
+
+    @staticmethod
+    def _union(groups, keys):
+        mask = 0
+        for key in keys:
+            mask |= groups.get(key, 0)
+        return mask
+
+
+class AnswerBits:
+    """一个会话在题库上的作答状态：已答、答对两个位集，随每次提交按位更新"""
+
+    def __init__(self, question_filter, progress=None):
+        self.filter = question_filter
+        self.answered = 0
+        self.correct = 0
+        for qid, record in (progress or {}).items():
+            self.update(qid, record)
+
+    def update(self, qid, record):
+        """某题的作答记录变为 record（None 表示清除），返回该题是否在题库中"""
+        pos = self.filter.positions.get(qid)
+        if pos is None:
+            return False
+        bit = 1 << pos
+        answered = bool(record and record.get("answer"))
+        if answered:
+            self.answered |= bit
+        else:
+            self.answered &= ~bit
+        if answered and record.get("correct", False):
+            self.correct |= bit
+        else:
+            self.correct &= ~bit
+        return True
+
+    def status_mask(self, status):
+        """STATUS_OPTIONS 中某一状态的题目集合"""
+        if status == "未作答":
+            return self.filter.all & ~self.answered
+        if status == "已答对":
+            return self.correct
+        if status == "已答错":
+            return self.answered & ~self.correct
+        return self.filter.all
+
+    def counts(self, mask):
+        """mask 范围内的 (题数, 已答, 答对, 答错)"""
+        answered = (mask & self.answered).bit_count()
+        correct = (mask & self.correct).bit_count()
+        return mask.bit_count(), answered, correct, answered - correct
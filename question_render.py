@@ -0,0 +1,95 @@
+"""
+答题界面和错题本的渲染数据缓存
+
+每道题的选项列表、正确答案的显示文字、选项分析（标出正确选项）只取决于题目本身，
+第一次显示时计算一次，按题库保存在进程内，各会话共用；之后重跑页面只需查表。
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from grading import OPTION_LABEL, normalize_answer
+from metrics import CACHE_MISSES, CACHE_REQUESTS
+
+RENDER_CACHE_SIZE = 4096  # 每个题库缓存的题目数
+
+JUDGMENT_CHOICES = ("✅ 对", "❌ 错")
+
+# choices: 单选题的选项文字（没有可显示的选项时为空元组）
+# choice_answers: 选项文字 -> 选项字母（错题本按字母判分；没有字母时为选项文字本身）
+# correct_display: 正确答案的显示文字
+# option_rows: 选项分析，每个选项一行 (显示文字, 是否正确答案)
+RenderPayload = namedtuple("RenderPayload", ["choices", "choice_answers", "correct_display", "option_rows"])
+
+
+def build_render_payload(q_type, options, correct_answer, correct_normalized):
+    """计算一道题的渲染数据（options 为 [{"label", "text"}]）"""
+    choices = []
+    option_rows = []
+    if q_type == "单选" and options:
+        for opt in options:
+            label, text = opt.get("label", ""), opt.get("text", "")
+            if label and text:
+                choices.append(f"{label}. {text}")
+            elif text:
+                choices.append(text)
+
+    if q_type == "判断":
+        correct_display = JUDGMENT_CHOICES[0] if correct_normalized == "对" else JUDGMENT_CHOICES[1]
+    else:
+        correct_display = correct_answer
+
+    if q_type == "单选" and options:
+        correct_norm = normalize_answer(correct_display)
+        for opt in options:
+            label, text = opt.get("label", ""), opt.get("text", "")
+            if label and correct_norm and label.upper() == correct_norm.upper():
+                option_rows.append((f"✓ {label}. {text} （正确答案）", True))
+            else:
+                option_rows.append((f"  {label}. {text}", False))
+
+    choice_answers = {}
+    for choice in choices:
+        match = OPTION_LABEL.match(choice)
+        choice_answers[choice] = match.group(1).upper() if match else choice
+    return RenderPayload(tuple(choices), choice_answers, correct_display, tuple(option_rows))
+
+
+class RenderCache:
+    """一个题库的渲染数据缓存（LRU），按题目ID和正确答案查找，可在会话间共享"""
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _get(self, key, build):
+        CACHE_REQUESTS.labels("render").inc()
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None:
+                self._items.move_to_end(key)
+                return payload
+        CACHE_MISSES.labels("render").inc()
+        payload = build()
+        with self._lock:
+            self._items[key] = payload
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return payload
+
+    def question(self, q):
+        """题库中的题目（答题界面、模拟考试）"""
+        return self._get(("q", q["qid"], q["correct_answer_display"]), lambda: build_render_payload(
+            q["type"], q["options"], q["correct_answer_display"], q["correct_answer_normalized"]))
+
+    def wrong_entry(self, wq):
+        """错题本中的错题（保存的是答错时的题目副本，字段名与题库不同）；没有题目ID的旧记录不缓存"""
+        def build():
+            return build_render_payload(wq.get("question_type"), wq.get("options", []),
+                                        wq.get("correct_answer", ""), wq.get("correct_answer_normalized"))
+        if not wq.get("question_id"):
+            return build()
+        return self._get(("wrong", wq["question_id"], wq.get("correct_answer", "")), build)
@@ -0,0 +1,228 @@
+"""
+学员数据文件的二进制格式（替代 pickle）
+
+文件结构（小端）：
+    魔数 b"EXD1" | 数据类型 u8 | 结构版本 u16 | 标志 u8 | 正文 crc32 u32 | 正文长度 u32 | 正文
+正文（标志位 FLAG_ZLIB 时为 zlib 压缩）：
+    元数据长度 u32 | 元数据 JSON | 记录表
+
+记录表按列存储：行数 u32、列数 u16，之后每列为
+    列名长度 u8 | 列名 | 列类型 u8 | 是否有缺失 u8 [| 缺失标记，每行一字节] | 数据长度 u32 | 数据
+列类型：
+    s  字符串，以 \\0 连接后整体编码，读取时一次 split
+    c  重复较多的字符串（题库、学员、题型等）：不重复的值以 \\0 连接，每行一个 u16 编号
+    i  整数，首字节为宽度（1/2/4/8 字节）      f  64 位浮点      b  布尔，每行一字节
+    j  其他值（None、列表、字典、混合类型），整列一个 JSON 数组
+读取时整列解码后再按行组装字典，不逐个值解析。
+
+只包含数据，读取时不会执行任何代码。结构版本用于升级：读到旧版本的文件时
+依次应用 MIGRATIONS 中登记的升级函数；读到比程序更新的版本时报错而不是误读。
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b"EXD1"
+FLAG_ZLIB = 1
+
+KIND_WRONG_BOOK = 1
+KIND_PROGRESS = 2
+KIND_MASTERY = 3
+KIND_QUESTION_SNAPSHOT = 4
+
+# 各类数据当前的结构版本
+# 错题本 v2：只保存题目引用和作答记录，题目内容在题库的题目快照中
+SCHEMA_VERSIONS = {KIND_WRONG_BOOK: 2, KIND_PROGRESS: 1, KIND_MASTERY: 1, KIND_QUESTION_SNAPSHOT: 1}
+# (数据类型, 旧版本) -> 升级函数 (meta, rows) -> (meta, rows)，升级到旧版本 + 1
+MIGRATIONS = {
+    # v1 的错题自带题目内容，读取时原样保留（显示时直接使用），下次保存时由 storage 移入题目快照
+    (KIND_WRONG_BOOK, 1): lambda meta, rows: (meta, rows),
+}
+
+_HEADER = struct.Struct("<4sBHBII")
+_U32 = struct.Struct("<I")
+_COLUMN_HEAD = struct.Struct("<BB")
+_MISSING = object()
+_CATEGORY_MIN_ROWS = 16   # 行数达到该值且不重复的值不超过行数的 1/4 时按 c 列存储
+# 整数列按取值范围选用最窄的类型：(宽度, array 类型码, 下限, 上限)
+_INT_WIDTHS = [(1, "b", -2 ** 7, 2 ** 7 - 1), (2, "h", -2 ** 15, 2 ** 15 - 1),
+               (4, "i", -2 ** 31, 2 ** 31 - 1), (8, "q", -2 ** 63, 2 ** 63 - 1)]
+_INT_TYPECODES = {width: typecode for width, typecode, _, _ in _INT_WIDTHS}
+
+
+class FormatError(ValueError):
+    """文件不是本格式、已损坏或版本过新"""
+
+
+def _array_bytes(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _array_values(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+def _encode_column(values, has_missing):
+    """返回 (列类型, 数据)"""
+    present = [v for v in values if v is not _MISSING] if has_missing else values
+    kinds = set(map(type, present))
+    if kinds == {str}:
+        if has_missing:
+            values = [v if v is not _MISSING else "" for v in values]
+        text = "\0".join(values)
+        if text.count("\0") == len(values) - 1:
+            distinct = list(dict.fromkeys(values))
+            if len(values) >= _CATEGORY_MIN_ROWS and len(distinct) <= min(len(values) // 4, 0xFFFF):
+                codes = {value: code for code, value in enumerate(distinct)}
+                names = "\0".join(distinct).encode("utf-8")
+                return b"c", _U32.pack(len(names)) + names + _array_bytes("H", [codes[v] for v in values])
+            return b"s", text.encode("utf-8")
+    if kinds == {bool}:
+        return b"b", bytes(v is True for v in values)
+    if kinds == {int}:
+        low, high = min(present), max(present)
+        for width, typecode, type_min, type_max in _INT_WIDTHS:
+            if type_min <= low and high <= type_max:
+                if has_missing:
+                    values = [v if v is not _MISSING else 0 for v in values]
+                return b"i", bytes([width]) + _array_bytes(typecode, values)
+    if kinds == {float}:
+        return b"f", _array_bytes("d", [v if v is not _MISSING else 0.0 for v in values])
+    if has_missing:
+        values = [v if v is not _MISSING else None for v in values]
+    return b"j", json.dumps(values, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _decode_column(column_type, data, rows):
+    if rows == 0:
+        return []
+    if column_type == b"s":
+        return data.decode("utf-8").split("\0")
+    if column_type == b"c":
+        length, = _U32.unpack_from(data)
+        distinct = data[_U32.size:_U32.size + length].decode("utf-8").split("\0")
+        return [distinct[code] for code in _array_values("H", data[_U32.size + length:])]
+    if column_type == b"b":
+        return [byte == 1 for byte in data]
+    if column_type == b"i":
+        typecode = _INT_TYPECODES.get(data[0])
+        if typecode is None:
+            raise FormatError(f"未知的整数宽度: {data[0]}")
+        return _array_values(typecode, data[1:])
+    if column_type == b"f":
+        return _array_values("d", data)
+    if column_type == b"j":
+        return json.loads(data)
+    raise FormatError(f"未知的列类型: {column_type!r}")
+
+
+def encode_table(rows):
+    """把字典列表编码为按列存储的记录表"""
+    names = list(dict.fromkeys(key for row in rows for key in row))
+    parts = [struct.pack("<IH", len(rows), len(names))]
+    for name in names:
+        values = [row.get(name, _MISSING) for row in rows]
+        raw_name = str(name).encode("utf-8")
+        if len(raw_name) > 255:
+            raise ValueError(f"列名过长: {name}")
+        missing = bytes(v is _MISSING for v in values)
+        has_missing = any(missing)
+        column_type, data = _encode_column(values, has_missing)
+        parts.append(bytes([len(raw_name)]) + raw_name)
+        parts.append(_COLUMN_HEAD.pack(column_type[0], has_missing))
+        if has_missing:
+            parts.append(missing)
+        parts.append(_U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_table(data, offset=0):
+    """解码记录表，返回 (字典列表, 结束位置)"""
+    try:
+        rows, columns = struct.unpack_from("<IH", data, offset)
+        offset += 6
+        names, values, missing_masks = [], [], []
+        for _ in range(columns):
+            name_length = data[offset]
+            names.append(data[offset + 1:offset + 1 + name_length].decode("utf-8"))
+            offset += 1 + name_length
+            column_type, has_missing = _COLUMN_HEAD.unpack_from(data, offset)
+            offset += _COLUMN_HEAD.size
+            mask = None
+            if has_missing:
+                mask = data[offset:offset + rows]
+                offset += rows
+            length, = _U32.unpack_from(data, offset)
+            offset += _U32.size
+            column = _decode_column(bytes([column_type]), data[offset:offset + length], rows)
+            offset += length
+            if len(column) != rows:
+                raise FormatError("列长度与行数不一致")
+            values.append(column)
+            missing_masks.append(mask)
+    except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise FormatError(f"记录表损坏: {e}") from e
+
+    records = [dict(zip(names, row)) for row in zip(*values)] if columns else [{} for _ in range(rows)]
+    for name, mask in zip(names, missing_masks):
+        if mask is not None:
+            for index in (i for i, flag in enumerate(mask) if flag):
+                del records[index][name]
+    return records, offset
+
+
+def encode(kind, meta, rows, compress=True, level=1):
+    """编码一个数据文件：meta 为可 JSON 序列化的字典，rows 为字典列表"""
+    meta_bytes = json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")
+    body = _U32.pack(len(meta_bytes)) + meta_bytes + encode_table(rows)
+    flags = 0
+    if compress:
+        body = zlib.compress(body, level)
+        flags |= FLAG_ZLIB
+    return _HEADER.pack(MAGIC, kind, SCHEMA_VERSIONS[kind], flags, zlib.crc32(body), len(body)) + body
+
+
+def is_encoded(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def decode(data, expected_kind=None):
+    """解码数据文件，返回 (数据类型, meta, rows)；旧版本的结构会升级到当前版本"""
+    if len(data) < _HEADER.size or not is_encoded(data):
+        raise FormatError("不是学员数据文件")
+    _, kind, version, flags, checksum, length = _HEADER.unpack_from(data)
+    body = data[_HEADER.size:_HEADER.size + length]
+    if len(body) != length or zlib.crc32(body) != checksum:
+        raise FormatError("文件不完整或已损坏")
+    if expected_kind is not None and kind != expected_kind:
+        raise FormatError(f"数据类型不符: {kind}")
+    current = SCHEMA_VERSIONS.get(kind)
+    if current is None or version > current:
+        raise FormatError(f"不支持的数据版本: 类型 {kind} 版本 {version}")
+
+    if flags & FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise FormatError(f"解压失败: {e}") from e
+    try:
+        meta_length, = _U32.unpack_from(body)
+        meta = json.loads(body[_U32.size:_U32.size + meta_length].decode("utf-8"))
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise FormatError(f"元数据损坏: {e}") from e
+    rows, _ = decode_table(body, _U32.size + meta_length)
+
+    while version < current:
+        meta, rows = MIGRATIONS[(kind, version)](meta, rows)
+        version += 1
+    return kind, meta, rows
@@ -0,0 +1,188 @@
+"""
+批量重新判分：修改判分规则或题库答案后，用当前的规则和答案重新评判某个题库所有学员保存的作答
+
+重新评判的作答：
+- 练习进度中已提交的作答（记录中有 correct_answer；只“保存进度”、未提交的不判分）
+- 错题本中每道错题最近一次的作答（user_answer / last_correct）
+
+作答日志只记录对错、不含答案，不重新判分；题库中已没有的题目跳过。
+每个学员的一个文件是一个任务，在线程池（或进程池）中并行判分。默认只报告判分结果
+有变化的作答，apply=True 时写回文件（进度中保存的答题统计同步更新）。也可以在命令行执行：
+
+    python regrade.py gangweitiku4.xlsx
+    python regrade.py gangweitiku4.xlsx --processes --workers 4 --apply
+"""
+import argparse
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+from grading import grade_answer
+from storage import (PROGRESS_DIR, WRONG_QUESTIONS_DIR, data_file_path, file_lock, get_storage_key,
+                     list_data_files, read_data_file, write_data_file)
+
+_logger = logging.getLogger(__name__)
+
+# 判分结果有变化的一条作答；kind 为 "progress"（练习进度）或 "wrong"（错题本）
+RegradeChange = namedtuple("RegradeChange", ["user_id", "qid", "kind", "answer", "old", "new"])
+# 一次重新判分的结果：处理的文件数、重新判分的作答数、耗时（秒）、有变化的作答、失败的文件数
+RegradeResult = namedtuple("RegradeResult", ["files", "graded", "seconds", "changes", "errors"])
+
+# 数据目录 -> 其中要重新判分的文件类型（文件名前缀，与 read_data_file 的 kind 相同）
+REGRADE_DIRS = {PROGRESS_DIR: "progress", WRONG_QUESTIONS_DIR: "wrong"}
+
+_answer_keys = {}  # 工作进程中的 题目ID -> answer_keys() 的值，由 _init_worker 设置
+
+
+def answer_keys(question_index):
+    """题目索引 → 判分所需的 题目ID -> (题型, 正确答案, 填空题预编译的答案)，传给工作进程的数据量小"""
+    return {qid: (q["type"], q["correct_answer_display"], q.get("blank_matcher"))
+            for qid, q in question_index.items()}
+
+
+def _init_worker(keys):
+    global _answer_keys
+    _answer_keys = keys
+
+
+def exam_files(directory, prefix, exam_id):
+    """该题库各学员的数据文件：按文件名中存储键的题库哈希筛选，不需要读取文件"""
+    exam_key = get_storage_key(exam_id)
+    for path in list_data_files(directory, f"{prefix}_"):
+        key = os.path.splitext(os.path.basename(path))[0][len(prefix) + 1:]
+        if key == exam_key or key.startswith(f"{exam_key}_"):
+            yield path
+
+
+def _regrade_progress(data, keys, apply):
+    """重新评判一份进度中已提交的作答，返回 (判分数, 变化列表, 是否需要写回)"""
+    user_id = data.get("user_id", "")
+    stats = (data.get("extra") or {}).get("session_stats")
+    states = stats.get("states") if isinstance(stats, dict) else None
+    graded, changes, dirty = 0, [], False
+    for qid, record in data.get("progress", {}).items():
+        key = keys.get(qid)
+        if key is None or not record.get("answer") or "correct_answer" not in record:
+            continue
+        graded += 1
+        old, new = bool(record.get("correct", False)), grade_answer(record["answer"], *key)
+        if new != old:
+            changes.append(RegradeChange(user_id, qid, "progress", record["answer"], old, new))
+        if apply and (new != old or record["correct_answer"] != key[1]):
+            record["correct"], record["correct_answer"] = new, key[1]
+            if isinstance(states, dict) and qid in states:
+                states[qid] = new
+            dirty = True
+    return graded, changes, dirty
+
+
+def _regrade_wrong(entries, keys, apply):
+    """重新评判错题本中各错题最近一次的作答，返回 (判分数, 变化列表, 是否需要写回)"""
+    graded, changes, dirty = 0, [], False
+    for wq in entries:
+        key = keys.get(wq.get('question_id'))
+        answer = wq.get('user_answer')
+        if key is None or not answer:
+            continue
+        graded += 1
+        old, new = bool(wq.get('last_correct', False)), grade_answer(answer, *key)
+        if new != old:
+            changes.append(RegradeChange(wq.get('user_id', ''), wq['question_id'], "wrong", answer, old, new))
+            if apply:
+                wq['last_correct'] = new
+                dirty = True
+    return graded, changes, dirty
+
+
+def _regrade_file(task, keys=None):
+    """
+    重新评判一个学员文件（在工作线程或进程中执行），返回 (判分数, 变化列表, 是否失败)
+    写回时写入分片目录中的新格式文件，分片前的同名文件和旧版 pickle 文件随之删除；
+    写回时读-判分-写在该文件的跨进程锁内完成，与页面、服务保存同一学员的数据互不覆盖
+    """
+    directory, path, kind, exam_id, apply = task
+    keys = _answer_keys if keys is None else keys
+    key = os.path.splitext(os.path.basename(path))[0][len(kind) + 1:]
+    filename = data_file_path(directory, kind, key)
+    try:
+        with file_lock(filename) if apply else nullcontext():
+            value = read_data_file(filename if apply else path, kind)
+            if kind == "progress":
+                if not isinstance(value, dict) or value.get("exam_id", exam_id) != exam_id:
+                    return 0, [], False
+                graded, changes, dirty = _regrade_progress(value, keys, apply)
+            else:
+                if not isinstance(value, list):
+                    return 0, [], False
+                graded, changes, dirty = _regrade_wrong(value, keys, apply)
+            if dirty:
+                write_data_file(filename, kind, value)
+        return graded, changes, False
+    except Exception as e:
+        _logger.warning("重新判分 %s 失败: %s", path, e)
+        return 0, [], True
+
+
+def regrade_exam(exam_id, question_index, base_dir=".", apply=False, workers=None, processes=False):
+    """
+    用 question_index（题目ID -> 题目）中的当前答案重新评判该题库所有学员保存的作答，返回 RegradeResult
+    processes=True 时使用进程池（简答题的相似度计算较多时更快），否则使用线程池
+    """
+    keys = answer_keys(question_index)
+    tasks = [(os.path.join(base_dir, name), path, kind, exam_id, apply)
+             for name, kind in REGRADE_DIRS.items()
+             for path in exam_files(os.path.join(base_dir, name), kind, exam_id)]
+
+    start = time.perf_counter()
+    graded, changes, errors = 0, [], 0
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(keys,))
+        run = _regrade_file
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="regrade")
+        run = partial(_regrade_file, keys=keys)
+    with executor:
+        for file_graded, file_changes, failed in executor.map(run, tasks):
+            graded += file_graded
+            changes.extend(file_changes)
+            errors += failed
+    return RegradeResult(len(tasks), graded, time.perf_counter() - start, changes, errors)
+
+
+def main():
+    from question_bank import build_question_index, parse_question_bank, resolve_exam_path
+
+    parser = argparse.ArgumentParser(description="用当前的判分规则和题库答案重新评判学员保存的作答")
+    parser.add_argument("bank", help="题库文件（如 gangweitiku4.xlsx）")
+    parser.add_argument("--base-dir", default=".", help="学员数据所在目录（含 progress_data 等）")
+    parser.add_argument("--apply", action="store_true", help="写回新的判分结果（默认只报告变化）")
+    parser.add_argument("--workers", type=int, default=None, help="判分线程/进程数")
+    parser.add_argument("--processes", action="store_true", help="判分使用进程池")
+    parser.add_argument("--show", type=int, default=50, help="最多列出的变化条数")
+    args = parser.parse_args()
+
+    path = resolve_exam_path(args.bank)
+    if path is None:
+        parser.error(f"找不到题库文件: {args.bank}")
+    questions, _, _ = parse_question_bank(path)
+    exam_id = os.path.splitext(os.path.basename(args.bank))[0]
+    result = regrade_exam(exam_id, build_question_index(questions), args.base_dir, apply=args.apply,
+                          workers=args.workers, processes=args.processes)
+
+    rate = result.graded / result.seconds if result.seconds else 0
+    print(f"{result.files} 个文件，重新判分 {result.graded} 条作答，用时 {result.seconds:.2f} 秒"
+          f"（{rate:,.0f} 条/秒），判分变化 {len(result.changes)} 条，失败 {result.errors} 个文件"
+          + ("，已写回" if args.apply else ""))
+    for change in result.changes[:args.show]:
+        print(f"{change.user_id or '-'}\t{change.qid}\t{'进度' if change.kind == 'progress' else '错题本'}\t"
+              f"{change.answer}\t{'对' if change.old else '错'} → {'对' if change.new else '错'}")
+    if len(result.changes) > args.show:
+        print(f"……另有 {len(result.changes) - args.show} 条")
+
+
+if __name__ == "__main__":
+    main()
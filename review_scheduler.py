@@ -0,0 +1,91 @@
+"""
+错题复习调度：SM-2 间隔重复算法 + 按到期时间排序的小顶堆
+
+每道错题记录 srs_ease / srs_interval / srs_repetitions / srs_due 四个字段。
+错题本打开或改变筛选条件时对符合条件的错题建堆一次（O(n)），之后每翻一页
+只从堆中取出到期最早的一页（每道 O(log n)），不需要排序整本错题本。
+"""
+import heapq
+from datetime import datetime, timedelta
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# 作答结果对应的 SM-2 评分（0-5）
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+
+
+def _parse_time(value, default):
+    try:
+        return datetime.fromisoformat(value) if value else default
+    except (TypeError, ValueError):
+        return default
+
+
+def get_due_time(entry, now=None):
+    """错题的下次复习时间；从未调度过的错题以最近一次作答时间为准（立即到期）"""
+    now = now or datetime.now()
+    if entry.get('srs_due'):
+        return _parse_time(entry['srs_due'], now)
+    return _parse_time(entry.get('last_attempt') or entry.get('first_wrong'), now)
+
+
+def apply_review(entry, is_correct, now=None):
+    """按 SM-2 更新错题的复习间隔和下次复习时间（原地修改并返回 entry）"""
+    now = now or datetime.now()
+    quality = QUALITY_CORRECT if is_correct else QUALITY_WRONG
+    ease = entry.get('srs_ease', DEFAULT_EASE)
+    repetitions = entry.get('srs_repetitions', 0)
+    interval = entry.get('srs_interval', 0)
+
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = max(1, round(interval * ease))
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    entry.update({
+        'srs_ease': round(ease, 2),
+        'srs_interval': interval,
+        'srs_repetitions': repetitions,
+        'srs_due': (now + timedelta(days=interval)).isoformat(),
+    })
+    return entry
+
+
+def reset_schedule(entry, now=None):
+    """再次答错时重新开始调度，错题立即到期"""
+    now = now or datetime.now()
+    entry.update({
+        'srs_repetitions': 0,
+        'srs_interval': 0,
+        'srs_due': now.isoformat(),
+    })
+    return entry
+
+
+def schedule_fields(entry):
+    """提取需要持久化的调度字段"""
+    return {key: entry[key] for key in ('srs_ease', 'srs_interval', 'srs_repetitions', 'srs_due') if key in entry}
+
+
+def due_queue(entries, now=None):
+    """错题 → 按下次复习时间排列的小顶堆，元素为 (到期时间戳, 题目ID)"""
+    now = now or datetime.now()
+    queue = [(get_due_time(entry, now).timestamp(), entry['question_id']) for entry in entries]
+    heapq.heapify(queue)
+    return queue
+
+
+def pop_due(queue, count):
+    """从 due_queue() 的堆中取出最多 count 道到期最早的错题ID（按到期时间从早到晚）"""
+    return [heapq.heappop(queue)[1] for _ in range(min(count, len(queue)))]
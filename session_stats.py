@@ -0,0 +1,119 @@
+"""
+练习会话的答题统计：已答、答对、答错，按题型和工作表分组
+
+统计只覆盖本次练习的题目（范围外的作答记录不计入），每次提交或重新作答时
+按该题的新旧状态增量更新，O(1)。统计随进度一起保存，恢复进度时直接读回，
+不必再扫描全部作答记录。
+"""
+
+STATS_VERSION = 1
+
+
+def record_state(record):
+    """作答记录 → (是否已答, 是否答对)"""
+    answered = bool(record and record.get("answer"))
+    return answered, answered and bool(record.get("correct", False))
+
+
+class SessionStats:
+    def __init__(self, questions=()):
+        # qid -> (题型, 工作表)
+        self.scope = {q["qid"]: (q["type"], q.get("sheet_name", "")) for q in questions}
+        self.answered = 0
+        self.correct = 0
+        self.by_type = {}
+        self.by_sheet = {}
+        # 已答题目的状态：qid -> 是否答对
+        self._states = {}
+        for q_type, sheet in self.scope.values():
+            self._group(self.by_type, q_type)["total"] += 1
+            self._group(self.by_sheet, sheet)["total"] += 1
+
+    @staticmethod
+    def _group(groups, key):
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"total": 0, "answered": 0, "correct": 0}
+        return group
+
+    @classmethod
+    def from_progress(cls, questions, progress):
+        """按题目范围和已有作答记录建立统计（旧版进度没有保存统计时使用）"""
+        stats = cls(questions)
+        for qid in stats.scope:
+            record = progress.get(qid)
+            if record:
+                stats.update(qid, record)
+        return stats
+
+    @property
+    def total(self):
+        return len(self.scope)
+
+    @property
+    def wrong(self):
+        return self.answered - self.correct
+
+    @property
+    def accuracy(self):
+        return self.correct / self.answered * 100 if self.answered else 0.0
+
+    def update(self, qid, record):
+        """某题的作答记录变为 record（None 表示清除），返回该题是否在统计范围内"""
+        meta = self.scope.get(qid)
+        if meta is None:
+            return False
+        old = (qid in self._states, self._states.get(qid, False))
+        new = record_state(record)
+        if old == new:
+            return True
+        d_answered = new[0] - old[0]
+        d_correct = new[1] - old[1]
+        self.answered += d_answered
+        self.correct += d_correct
+        for group in (self._group(self.by_type, meta[0]), self._group(self.by_sheet, meta[1])):
+            group["answered"] += d_answered
+            group["correct"] += d_correct
+        if new[0]:
+            self._states[qid] = new[1]
+        else:
+            self._states.pop(qid, None)
+        return True
+
+    def status(self, qid):
+        """题目状态：None 未作答，True 答对，False 答错"""
+        return self._states.get(qid)
+
+    def rows(self, by="type"):
+        """分组统计表格行"""
+        groups = self.by_type if by == "type" else self.by_sheet
+        rows = []
+        for key, group in groups.items():
+            answered, correct = group["answered"], group["correct"]
+            rows.append({
+                "题型" if by == "type" else "工作表": key,
+                "题数": group["total"],
+                "已答": answered,
+                "答对": correct,
+                "答错": answered - correct,
+                "正确率": f"{correct / answered * 100:.1f}%" if answered else "-",
+            })
+        return rows
+
+    def to_dict(self):
+        return {
+            "version": STATS_VERSION,
+            "scope": {qid: list(meta) for qid, meta in self.scope.items()},
+            "states": dict(self._states),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """从保存的数据恢复；格式不符时返回 None，由调用方重新建立"""
+        if not isinstance(data, dict) or data.get("version") != STATS_VERSION:
+            return None
+        stats = cls([{"qid": qid, "type": meta[0], "sheet_name": meta[1]}
+                     for qid, meta in data.get("scope", {}).items()])
+        for qid, correct in data.get("states", {}).items():
+            stats.update(qid, {"answer": True, "correct": correct})
+        return stats
@@ -0,0 +1,772 @@
+"""
+学员数据存储：错题本、练习进度、掌握度和作答日志
+
+所有记录按 (题库, 学员) 保存为带结构版本的二进制文件（格式见 record_codec），
+不依赖界面框架，Streamlit 页面和 HTTP 服务共用同一套读写函数。
+文件按存储键的哈希分到两级子目录（如 progress_data/3f/a2/progress_<键>.dat），
+每个目录中的文件数保持在较小范围。分片前直接放在目录下的文件和旧版的 pickle
+文件仍可读取（pickle 只允许内置类型），下次保存时转换为新格式并移入分片目录。
+过期和旧格式文件的后台清理见 storage_maintenance。
+
+错题本只保存题目引用（题目ID、来源工作表、题型）和作答记录，显示时按题目ID
+从已加载的题库取题目内容；题库中已删除的题目取自题目快照（每个题库一个文件，
+所有学员共用，见 resolve_wrong_questions）。
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import record_codec
+from metrics import Counter
+from perf_timing import timed
+from question_selector import update_mastery
+from review_scheduler import due_queue, get_due_time, pop_due, reset_schedule
+
+_logger = logging.getLogger(__name__)
+_error_reporter = None
+
+STORAGE_FAILURES = Counter("exam_storage_failures_total", "学员数据读写失败次数", ["operation"])
+
+
+def set_error_reporter(reporter):
+    """设置保存/加载失败时的提示函数（如 st.error），为 None 时写入日志"""
+    global _error_reporter
+    _error_reporter = reporter
+
+
+def report_error(message):
+    if _error_reporter is not None:
+        _error_reporter(message)
+    else:
+        _logger.error(message)
+
+
+# ================== 数据文件读写 ==================
+WRONG_QUESTIONS_DIR = "wrong_questions"
+PROGRESS_DIR = "progress_data"
+DATA_EXTENSION = ".dat"
+LEGACY_EXTENSION = ".pkl"
+TMP_EXTENSION = ".tmp"
+LOCK_EXTENSION = ".lock"
+PROGRESS_EXPIRE_DAYS = 30
+_DATA_KINDS = {
+    "wrong": record_codec.KIND_WRONG_BOOK,
+    "progress": record_codec.KIND_PROGRESS,
+    "mastery": record_codec.KIND_MASTERY,
+    "snapshot": record_codec.KIND_QUESTION_SNAPSHOT,
+}
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """旧版 pickle 文件只含内置类型；拒绝加载任何类，共享目录中被篡改的文件无法借此执行代码"""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"不允许加载 {module}.{name}")
+
+
+def _to_records(kind, value):
+    """内存中的数据 → (元数据, 记录列表)"""
+    if kind == "wrong":
+        return {}, value
+    if kind == "progress":
+        meta = {key: item for key, item in value.items() if key != "progress"}
+        return meta, [{"qid": qid, **record} for qid, record in value.get("progress", {}).items()]
+    return {}, [{"qid": qid, **record} for qid, record in value.items()]
+
+
+def _from_records(kind, meta, rows):
+    """(元数据, 记录列表) → 与旧版 pickle 相同结构的数据"""
+    if kind == "wrong":
+        return rows
+    by_qid = {row.pop("qid"): row for row in rows}
+    if kind == "progress":
+        return {**meta, "progress": by_qid}
+    return by_qid
+
+
+def data_file_path(directory, prefix, key):
+    """directory/<xx>/<yy>/<prefix>_<key>.dat，xx、yy 取自存储键的 md5，同一学员的各类文件在同一分片"""
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return os.path.join(directory, digest[:2], digest[2:4], f"{prefix}_{key}{DATA_EXTENSION}")
+
+
+def _is_shard_name(name):
+    return len(name) == 2 and all(c in "0123456789abcdef" for c in name)
+
+
+def _legacy_paths(filename):
+    """分片目录启用前的同名文件：数据目录下的 .dat 和旧版 .pkl"""
+    shard_dir = os.path.dirname(filename)
+    if not (_is_shard_name(os.path.basename(shard_dir))
+            and _is_shard_name(os.path.basename(os.path.dirname(shard_dir)))):
+        return []
+    root = os.path.dirname(os.path.dirname(shard_dir))
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return [os.path.join(root, stem + DATA_EXTENSION), os.path.join(root, stem + LEGACY_EXTENSION)]
+
+
+def read_data_file(filename, kind):
+    """
+    读取错题本（kind="wrong"）、进度（"progress"）、掌握度（"mastery"）或题目快照（"snapshot"）文件，
+    文件不存在时返回 None；分片目录中没有时读取分片前的同名文件
+    """
+    for path in [filename] + _legacy_paths(filename):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            if path.endswith(LEGACY_EXTENSION):
+                return _LegacyUnpickler(f).load()
+            _, meta, rows = record_codec.decode(f.read(), _DATA_KINDS[kind])
+        return _from_records(kind, meta, rows)
+    return None
+
+
+def write_data_file(filename, kind, value, overwrite=True):
+    """
+    原子写入（先写临时文件再替换，读取方不会读到写了一半的文件），并删除分片前的同名文件
+    overwrite=False 时文件已存在则不写入并返回 False（后台迁移用，不覆盖页面刚保存的数据）
+    """
+    meta, rows = _to_records(kind, value)
+    data = record_codec.encode(_DATA_KINDS[kind], meta, rows)
+    tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}{TMP_EXTENSION}"
+    for attempt in range(2):
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(tmp_filename, 'wb') as f:
+                f.write(data)
+            break
+        except FileNotFoundError:
+            # 分片目录刚创建就被后台清理当作空目录删除，重新创建一次
+            if attempt:
+                raise
+    if overwrite:
+        os.replace(tmp_filename, filename)
+    else:
+        try:
+            os.link(tmp_filename, filename)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_filename)
+    for legacy_filename in _legacy_paths(filename):
+        if os.path.exists(legacy_filename):
+            os.remove(legacy_filename)
+    return True
+
+
+@contextmanager
+def file_lock(filename):
+    """
+    跨进程的排他锁（锁文件为 <filename>.lock），用于多个进程共用的文件的读-改-写，
+    如页面、HTTP 服务和重新判分的工作进程同时更新同一个题目快照
+    """
+    lock_filename = f"{filename}{LOCK_EXTENSION}"
+    for attempt in range(2):
+        try:
+            os.makedirs(os.path.dirname(lock_filename), exist_ok=True)
+            f = open(lock_filename, 'a+b')
+            break
+        except FileNotFoundError:
+            # 分片目录刚创建就被后台清理当作空目录删除，重新创建一次
+            if attempt:
+                raise
+    with f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def remove_data_file(filename):
+    """删除数据文件及其分片前的同名文件，返回是否删除了文件"""
+    removed = False
+    for path in [filename] + _legacy_paths(filename):
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+
+def scan_data_dir(directory):
+    """
+    用 os.scandir 遍历数据目录：目录下的文件（分片前）和两级分片目录中的文件
+    逐个产出 os.DirEntry，不在内存中建立完整列表
+    """
+    try:
+        top = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with top:
+        for entry in top:
+            if entry.is_file():
+                yield entry
+            elif entry.is_dir() and _is_shard_name(entry.name):
+                with os.scandir(entry.path) as level1:
+                    for shard in level1:
+                        if shard.is_dir() and _is_shard_name(shard.name):
+                            with os.scandir(shard.path) as level2:
+                                yield from (item for item in level2 if item.is_file())
+
+
+def list_data_files(directory, prefix):
+    """
+    目录中以 prefix 开头的数据文件；同一存储键有多份时
+    按分片目录中的新格式、分片前的新格式、旧版 pickle 的顺序只取一份
+    """
+    paths = {}
+    for entry in scan_data_dir(directory):
+        stem, extension = os.path.splitext(entry.name)
+        if not stem.startswith(prefix) or extension not in (DATA_EXTENSION, LEGACY_EXTENSION):
+            continue
+        sharded = entry.path != os.path.join(directory, entry.name)
+        rank = (extension == DATA_EXTENSION) * 2 + sharded
+        if stem not in paths or rank > paths[stem][0]:
+            paths[stem] = (rank, entry.path)
+    return sorted(path for _, path in paths.values())
+
+
+# ================== 错题管理 ==================
+def get_storage_key(exam_id, user_id=""):
+    """进度/错题文件的存储键：题库哈希，指定学员时再加学员哈希"""
+    exam_hash = hashlib.md5(exam_id.encode()).hexdigest()[:8]
+    if not user_id:
+        return exam_hash
+    user_hash = hashlib.md5(user_id.encode()).hexdigest()[:8]
+    return f"{exam_hash}_{user_hash}"
+
+
+def get_wrong_questions_filename(exam_id, user_id=""):
+    """获取错题本文件名（目录在写入时创建）"""
+    return data_file_path(WRONG_QUESTIONS_DIR, "wrong", get_storage_key(exam_id, user_id))
+
+
+# ================== 错题的题目快照 ==================
+# 错题本中不保存、显示时从题库或题目快照取得的题目内容字段
+WRONG_CONTENT_FIELDS = ("question", "correct_answer", "correct_answer_normalized", "options", "explanation")
+MISSING_QUESTION_TEXT = "（题库中已没有这道题，也没有保存题目内容）"
+
+_snapshot_cache = {}  # 快照文件名 -> ((修改时间, 大小), 题目ID -> 题目内容)
+_snapshot_lock = threading.Lock()
+_snapshot_write_lock = threading.Lock()  # 同一进程内快照的读-改-写按顺序执行（跨进程另加文件锁）
+_snapshot_digests = {}  # 快照文件名 -> {题目ID: 内容摘要}，本进程已确认写入快照的题目内容
+
+
+def get_snapshot_filename(exam_id):
+    """题库的题目快照文件名（与学员无关）"""
+    return data_file_path(WRONG_QUESTIONS_DIR, "snapshot", get_storage_key(exam_id))
+
+
+def question_content(question_data):
+    """题库中的题目 → 错题使用的题目内容字段"""
+    return {
+        'question': question_data.get('question', ''),
+        'correct_answer': question_data.get('correct_answer_display', ''),
+        'correct_answer_normalized': question_data.get('correct_answer_normalized', ''),
+        'options': question_data.get('options', []),
+        'explanation': question_data.get('explanation', ''),
+    }
+
+
+def load_question_snapshots(exam_id):
+    """题库的题目快照（题目ID -> 题目内容）；文件没有变化时复用进程内已读取的结果，返回值不要修改"""
+    filename = get_snapshot_filename(exam_id)
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return {}
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _snapshot_lock:
+        cached = _snapshot_cache.get(filename)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    snapshots = read_data_file(filename, "snapshot") or {}
+    with _snapshot_lock:
+        _snapshot_cache[filename] = (version, snapshots)
+    return snapshots
+
+
+def _content_digest(content):
+    return hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode()).digest()
+
+
+def _update_snapshots(exam_id, contents, replace=True):
+    """
+    把题目内容（题目ID -> 内容）写入题目快照；replace=False 时只补充快照中还没有的题目
+    内容摘要与本进程已写入的相同时不读写文件（同一道题反复答错只写一次）；需要写入时
+    在文件锁内重新读取快照、合并后替换，多个进程同时写入不会互相覆盖
+    """
+    filename = get_snapshot_filename(exam_id)
+    digests = {qid: _content_digest(content) for qid, content in contents.items()}
+    with _snapshot_write_lock:
+        known = _snapshot_digests.setdefault(filename, {})
+        pending = [qid for qid, digest in digests.items()
+                   if known.get(qid) != digest and (replace or qid not in known)]
+        if not pending:
+            return
+        with file_lock(filename):
+            snapshots = read_data_file(filename, "snapshot") or {}
+            changed = {qid: contents[qid] for qid in pending
+                       if (replace or qid not in snapshots) and snapshots.get(qid) != contents[qid]}
+            if changed:
+                write_data_file(filename, "snapshot", {**snapshots, **changed})
+        for qid in pending:
+            known[qid] = digests[qid] if qid in changed or qid not in snapshots \
+                else _content_digest(snapshots[qid])
+
+
+def _write_wrong_questions(exam_id, filename, wrong_questions):
+    """保存错题本；旧版错题自带的题目内容移入题目快照，错题中只留引用"""
+    legacy = {}
+    for wq in wrong_questions:
+        if 'question' in wq:
+            content = {field: wq.pop(field) for field in WRONG_CONTENT_FIELDS if field in wq}
+            if wq.get('question_id'):
+                legacy.setdefault(wq['question_id'], {**question_content({}), **content})
+    if legacy:
+        _update_snapshots(exam_id, legacy, replace=False)
+    write_data_file(filename, "wrong", wrong_questions)
+
+
+def resolve_wrong_questions(exam_id, entries, question_index=None):
+    """
+    错题引用 → 带题目内容的错题（新的字典，不修改 entries；None 原样保留）
+    题目在 question_index（题目ID -> 题目）中时取题库的当前内容，否则取题目快照；
+    旧版错题自带题目内容，题库中没有时直接使用
+    """
+    question_index = question_index or {}
+    snapshots = None
+    resolved = []
+    for wq in entries:
+        if wq is None:
+            resolved.append(None)
+            continue
+        q = question_index.get(wq.get('question_id'))
+        if q is not None:
+            content = question_content(q)
+            content['question_type'] = q.get('type', wq.get('question_type', ''))
+        elif 'question' in wq:
+            content = {}
+        else:
+            if snapshots is None:
+                snapshots = load_question_snapshots(exam_id)
+            content = snapshots.get(wq.get('question_id')) or {'question': MISSING_QUESTION_TEXT}
+        resolved.append({**wq, **content})
+    return resolved
+
+
+def _merge_wrong_answer(wrong_questions, exam_id, question_data, user_answer, is_correct, user_id=""):
+    """把一次作答并入错题本（原地修改列表），返回更新或新增的错题记录（答对且不在错题本中时返回None）"""
+    # 旧版错题以"来源_行号"为ID，插入行后会错位，现统一使用稳定的题目ID
+    legacy_id = f"{question_data.get('source', '')}_{question_data.get('row_index', 0)}"
+    question_id = question_data.get('qid') or legacy_id
+
+    # 更新或添加错题
+    for wq in wrong_questions:
+        if wq.get('question_id') in (question_id, legacy_id):
+            wq.update({
+                'question_id': question_id,
+                'user_answer': user_answer,
+                'is_correct': is_correct,
+                'last_attempt': datetime.now().isoformat(),
+                'attempt_count': wq.get('attempt_count', 0) + 1,
+                'last_correct': is_correct
+            })
+            if not is_correct:
+                # 再次答错，复习间隔从头开始
+                reset_schedule(wq)
+            return wq
+
+    if is_correct:  # 只保存错误的题目
+        return None
+    wrong_question = {
+        'question_id': question_id,
+        'exam_id': exam_id,
+        'user_id': user_id,
+        'question_type': question_data.get('type', ''),
+        'user_answer': user_answer,
+        'source': question_data.get('source', ''),
+        'first_wrong': datetime.now().isoformat(),
+        'last_attempt': datetime.now().isoformat(),
+        'attempt_count': 1,
+        'reviewed': False,
+        'last_correct': False
+    }
+    wrong_questions.append(wrong_question)
+    return wrong_question
+
+
+def _save_wrong_answers(exam_id, answers, user_id=""):
+    """把一批 (题目, 作答, 是否正确) 并入错题本，错题本和题目快照各只读写一次，返回保存的错题记录"""
+    filename = get_wrong_questions_filename(exam_id, user_id=user_id)
+    with file_lock(filename):
+        wrong_questions = load_wrong_questions(exam_id, user_id=user_id)
+        saved, contents = [], {}
+        for question_data, user_answer, is_correct in answers:
+            entry = _merge_wrong_answer(wrong_questions, exam_id, question_data, user_answer, is_correct, user_id)
+            if entry is not None:
+                saved.append(entry)
+                contents[entry['question_id']] = question_content(question_data)
+        if not saved:
+            return saved
+        if contents:
+            _update_snapshots(exam_id, contents)
+        _write_wrong_questions(exam_id, filename, wrong_questions)
+    return saved
+
+
+@timed("storage.save_wrong_question")
+def save_wrong_question(exam_id, question_data, user_answer, is_correct, user_id=""):
+    """
+    保存错题，返回保存后的错题记录（只含题目引用和作答记录，未保存时返回None）
+    同时更新题库的题目快照，题目之后从题库中删除时错题本仍能显示
+    """
+    try:
+        saved = _save_wrong_answers(exam_id, [(question_data, user_answer, is_correct)], user_id=user_id)
+        return saved[0] if saved else None
+    except Exception as e:
+        STORAGE_FAILURES.labels("save_wrong_question").inc()
+        report_error(f"保存错题失败: {e}")
+        return None
+
+
+@timed("storage.save_wrong_questions")
+def save_wrong_questions(exam_id, answers, user_id=""):
+    """
+    批量保存错题（如模拟考试交卷）：answers 为 (题目, 作答, 是否正确) 列表，
+    错题本文件只读写一次；返回保存后的错题记录列表（失败时返回None）
+    """
+    try:
+        return _save_wrong_answers(exam_id, answers, user_id=user_id)
+    except Exception as e:
+        STORAGE_FAILURES.labels("save_wrong_questions").inc()
+        report_error(f"保存错题失败: {e}")
+        return None
+
+
+@timed("storage.load_wrong_questions")
+def load_wrong_questions(exam_id, user_id=""):
+    """加载错题"""
+    try:
+        filename = get_wrong_questions_filename(exam_id, user_id=user_id)
+        wrong_questions = read_data_file(filename, "wrong")
+        if wrong_questions is not None:
+            return wrong_questions
+    except:
+        STORAGE_FAILURES.labels("load_wrong_questions").inc()
+    return []
+
+
+def get_wrong_stats(exam_id, user_id=""):
+    """获取错题统计"""
+    wrong_questions = load_wrong_questions(exam_id, user_id=user_id)
+    total = len(wrong_questions)
+    not_reviewed = len([wq for wq in wrong_questions if not wq.get('reviewed', False)])
+    return {'total': total, 'not_reviewed': not_reviewed}
+
+
+WRONG_PAGE_SIZE = 20  # 错题本每页的错题数
+# 错题本的状态筛选：due 已到复习时间的未掌握错题，unmastered 未掌握，mastered 已掌握，all 全部
+WRONG_STATUSES = ("due", "unmastered", "mastered", "all")
+
+# 错题本筛选条件：工作表（错题的来源）、题型为空表示不限，min_attempts 为最少作答次数
+WrongFilter = namedtuple("WrongFilter", ["sheets", "types", "status", "min_attempts"],
+                         defaults=((), (), "due", 0))
+# 错题本查询结果：第一页错题及其题目ID（按顺序）、其余符合条件的错题（due_queue 的堆，
+# 翻页时用 pop_due 取出）、错题本中出现的工作表和题型（供筛选项使用）
+WrongPage = namedtuple("WrongPage", ["entries", "question_ids", "queue", "sheets", "types"])
+
+
+def _wrong_filter_matches(wrong_filter, now):
+    """筛选条件 → 判断单条错题的函数"""
+    sheets, types = set(wrong_filter.sheets), set(wrong_filter.types)
+    status, min_attempts = wrong_filter.status, wrong_filter.min_attempts
+
+    def matches(wq):
+        reviewed = wq.get('reviewed', False)
+        if status == "mastered" and not reviewed:
+            return False
+        if status in ("due", "unmastered") and reviewed:
+            return False
+        if sheets and wq.get('source', '') not in sheets:
+            return False
+        if types and wq.get('question_type', '') not in types:
+            return False
+        if wq.get('attempt_count', 0) < min_attempts:
+            return False
+        return status != "due" or get_due_time(wq, now) <= now
+    return matches
+
+
+@timed("storage.query_wrong_questions")
+def query_wrong_questions(exam_id, wrong_filter=None, limit=WRONG_PAGE_SIZE, user_id=""):
+    """
+    错题本查询，返回 WrongPage：符合条件的错题按下次复习时间建堆，只取出到期最早的
+    第一页；其余的留在堆中，翻页时用 pop_due 取出题目ID，再用 get_wrong_questions_by_id 读取
+    """
+    wrong_filter = wrong_filter or WrongFilter()
+    now = datetime.now()
+    wrong_questions = load_wrong_questions(exam_id, user_id=user_id)
+    matches = _wrong_filter_matches(wrong_filter, now)
+    selected = {wq['question_id']: wq for wq in wrong_questions if wq.get('question_id') and matches(wq)}
+    queue = due_queue(selected.values(), now)
+    question_ids = pop_due(queue, limit)
+    sheets = sorted({wq.get('source', '') for wq in wrong_questions})
+    types = sorted({wq.get('question_type', '') for wq in wrong_questions})
+    return WrongPage([selected[qid] for qid in question_ids], question_ids, queue, sheets, types)
+
+
+def get_wrong_questions_by_id(exam_id, question_ids, user_id=""):
+    """按题目ID读取错题（一页），与 question_ids 一一对应，已不在错题本中的为 None"""
+    by_id = {wq.get('question_id'): wq for wq in load_wrong_questions(exam_id, user_id=user_id)}
+    return [by_id.get(qid) for qid in question_ids]
+
+
+@timed("storage.mark_wrong_questions_reviewed")
+def mark_wrong_questions_reviewed(exam_id, question_ids, reviewed=True, user_id=""):
+    """
+    批量设置错题的掌握状态，整本错题本只读写一次
+    返回状态有变化的错题数（没有错题本或保存失败时返回 None）
+    """
+    try:
+        filename = get_wrong_questions_filename(exam_id, user_id=user_id)
+        with file_lock(filename):
+            wrong_questions = read_data_file(filename, "wrong")
+            if wrong_questions is None:
+                return None
+            question_ids = set(question_ids)
+
+            changed = 0
+            for wq in wrong_questions:
+                if wq.get('question_id') in question_ids and wq.get('reviewed', False) != reviewed:
+                    wq['reviewed'] = reviewed
+                    changed += 1
+            if changed:
+                _write_wrong_questions(exam_id, filename, wrong_questions)
+            return changed
+    except Exception as e:
+        STORAGE_FAILURES.labels("mark_wrong_questions_reviewed").inc()
+        report_error(f"更新错题状态失败: {e}")
+        return None
+
+
+@timed("storage.purge_reviewed_wrong_questions")
+def purge_reviewed_wrong_questions(exam_id, user_id=""):
+    """从错题本中删除所有已掌握的错题（只写一次），返回删除的错题数（失败时返回 None）"""
+    try:
+        filename = get_wrong_questions_filename(exam_id, user_id=user_id)
+        with file_lock(filename):
+            wrong_questions = read_data_file(filename, "wrong")
+            if wrong_questions is None:
+                return 0
+            remaining = [wq for wq in wrong_questions if not wq.get('reviewed', False)]
+            removed = len(wrong_questions) - len(remaining)
+            if removed:
+                _write_wrong_questions(exam_id, filename, remaining)
+            return removed
+    except Exception as e:
+        STORAGE_FAILURES.labels("purge_reviewed_wrong_questions").inc()
+        report_error(f"清除已掌握错题失败: {e}")
+        return None
+
+
+def update_wrong_question_status(exam_id, question_id, reviewed=True, user_id=""):
+    """更新错题状态，返回是否有变化（错题不在错题本中、状态未变或保存失败时为 False）"""
+    return bool(mark_wrong_questions_reviewed(exam_id, [question_id], reviewed=reviewed, user_id=user_id))
+
+
+@timed("storage.update_wrong_question_review")
+def update_wrong_question_review(exam_id, question_id, user_answer, is_correct, schedule=None, user_id=""):
+    """记录错题本中的一次复习作答及新的复习计划，返回是否已保存（错题不在错题本中时为 False）"""
+    try:
+        filename = get_wrong_questions_filename(exam_id, user_id=user_id)
+        with file_lock(filename):
+            wrong_questions = read_data_file(filename, "wrong")
+            if wrong_questions is None:
+                return False
+            for wq in wrong_questions:
+                if wq.get('question_id') == question_id:
+                    wq['user_answer'] = user_answer
+                    wq['last_attempt'] = datetime.now().isoformat()
+                    wq['attempt_count'] = wq.get('attempt_count', 0) + 1
+                    wq['last_correct'] = is_correct
+                    wq.update(schedule or {})
+                    _write_wrong_questions(exam_id, filename, wrong_questions)
+                    return True
+            return False
+    except Exception as e:
+        STORAGE_FAILURES.labels("update_wrong_question_review").inc()
+        report_error(f"保存错题复习结果失败: {e}")
+        return False
+
+
+# ================== 进度保存/加载 ==================
+def get_progress_filename(exam_id, user_id=""):
+    """生成进度文件名（目录在写入时创建）"""
+    return data_file_path(PROGRESS_DIR, "progress", get_storage_key(exam_id, user_id))
+
+
+@timed("storage.save_progress")
+def save_progress(exam_id, progress_data, config_data=None, extra_data=None, user_id=""):
+    """保存进度到文件"""
+    try:
+        filename = get_progress_filename(exam_id, user_id=user_id)
+        data = {
+            "exam_id": exam_id,
+            "user_id": user_id,
+            "progress": progress_data,
+            "config": config_data or {},
+            "extra": extra_data or {},
+            "timestamp": datetime.now().isoformat()
+        }
+        with file_lock(filename):
+            write_data_file(filename, "progress", data)
+        return True
+    except Exception as e:
+        STORAGE_FAILURES.labels("save_progress").inc()
+        report_error(f"保存进度失败: {e}")
+        return False
+
+
+@timed("storage.load_progress")
+def load_progress(exam_id, user_id=""):
+    """从文件加载进度"""
+    try:
+        filename = get_progress_filename(exam_id, user_id=user_id)
+        data = read_data_file(filename, "progress")
+        if data is not None:
+            if "timestamp" in data:
+                file_time = datetime.fromisoformat(data["timestamp"])
+                if (datetime.now() - file_time).days > PROGRESS_EXPIRE_DAYS:  # 30天后自动过期
+                    return {}, {}, {}
+            return data.get("progress", {}), data.get("config", {}), data.get("extra", {})
+    except Exception as e:
+        STORAGE_FAILURES.labels("load_progress").inc()
+        report_error(f"加载进度失败: {e}")
+    return {}, {}, {}
+
+
+def get_mastery_filename(exam_id, user_id=""):
+    """掌握度文件名（与进度文件同一分片，不随“重新练习”清除）"""
+    return data_file_path(PROGRESS_DIR, "mastery", get_storage_key(exam_id, user_id))
+
+
+@timed("storage.save_mastery")
+def save_mastery(exam_id, mastery, user_id=""):
+    """保存学员对各题的掌握度"""
+    try:
+        write_data_file(get_mastery_filename(exam_id, user_id=user_id), "mastery", mastery)
+        return True
+    except Exception as e:
+        STORAGE_FAILURES.labels("save_mastery").inc()
+        report_error(f"保存掌握度失败: {e}")
+        return False
+
+
+@timed("storage.load_mastery")
+def load_mastery(exam_id, user_id=""):
+    """加载学员对各题的掌握度"""
+    try:
+        filename = get_mastery_filename(exam_id, user_id=user_id)
+        mastery = read_data_file(filename, "mastery")
+        if mastery is not None:
+            return mastery
+    except:
+        STORAGE_FAILURES.labels("load_mastery").inc()
+    return {}
+
+
+def record_mastery_results(exam_id, results, user_id=""):
+    """用一批 (题目ID, 是否正确) 更新掌握度文件，返回更新后的掌握度"""
+    mastery = load_mastery(exam_id, user_id=user_id)
+    for qid, is_correct in results:
+        mastery[qid] = update_mastery(mastery.get(qid), is_correct)
+    save_mastery(exam_id, mastery, user_id=user_id)
+    return mastery
+
+
+def migrate_progress_keys(progress_data, questions):
+    """旧版进度以original_index为键，按当前题库转换为稳定的题目ID"""
+    if not any(isinstance(key, int) for key in progress_data):
+        return progress_data
+
+    migrated = {}
+    for key, record in progress_data.items():
+        if isinstance(key, int):
+            if 0 <= key < len(questions):
+                migrated[questions[key]["qid"]] = record
+        else:
+            migrated[key] = record
+    return migrated
+
+
+# ================== 作答日志 ==================
+ATTEMPT_LOG_DIR = "attempt_log"
+
+
+def get_attempt_log_filename(exam_id, user_id=""):
+    """作答日志文件名（只追加，不随“重新练习”或清除进度删除）"""
+    if not os.path.exists(ATTEMPT_LOG_DIR):
+        os.makedirs(ATTEMPT_LOG_DIR)
+    return os.path.join(ATTEMPT_LOG_DIR, f"attempts_{get_storage_key(exam_id, user_id)}.tsv")
+
+
+def _log_field(value):
+    return str(value).replace("\t", " ").replace("\n", " ").replace("\r", " ")
+
+
+@timed("storage.append_attempts")
+def append_attempts(exam_id, results, mode="", user_id="", timestamp=None):
+    """
+    把一批 (题目ID, 是否正确) 追加到作答日志
+    首行为 “#题库\t学员”，之后每行：时间戳、题目ID、是否正确(0/1)、练习模式
+    """
+    try:
+        filename = get_attempt_log_filename(exam_id, user_id=user_id)
+        lines = []
+        if not os.path.exists(filename):
+            lines.append(f"#{_log_field(exam_id)}\t{_log_field(user_id)}\n")
+        stamp = f"{time.time() if timestamp is None else timestamp:.3f}"
+        mode = _log_field(mode)
+        lines.extend(f"{stamp}\t{qid}\t{int(bool(is_correct))}\t{mode}\n" for qid, is_correct in results)
+        # 一次写入，多个进程同时追加时行不会交错
+        with open(filename, 'a', encoding='utf-8') as f:
+            f.write("".join(lines))
+        return True
+    except Exception as e:
+        STORAGE_FAILURES.labels("append_attempts").inc()
+        report_error(f"保存作答记录失败: {e}")
+        return False
+
+
+@timed("storage.clear_progress")
+def clear_progress(exam_id, user_id=""):
+    """清除进度文件"""
+    try:
+        filename = get_progress_filename(exam_id, user_id=user_id)
+        if remove_data_file(filename):
+            return True
+    except:
+        STORAGE_FAILURES.labels("clear_progress").inc()
+    return False
@@ -0,0 +1,254 @@
+"""
+学员数据目录的维护：过期清理、格式迁移和磁盘占用统计
+
+load_progress 只在读到进度文件时才判断是否过期，没人再打开的文件会一直留在
+磁盘上。后台清理线程定期用 os.scandir 遍历数据目录（逐个处理，不建立完整的
+文件列表）：
+
+- 删除超过 PROGRESS_EXPIRE_DAYS 天未保存的进度文件
+- 删除写入中断留下的临时文件
+- 把分片前直接放在目录下的文件和旧版 pickle 文件转换为新格式并移入分片目录
+- 删除清空后的分片目录
+
+错题本、题目快照和掌握度是长期数据，只迁移不过期。也可以在命令行执行：
+
+    python storage_maintenance.py --report
+    python storage_maintenance.py --sweep --dry-run
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+from metrics import Counter
+from storage import (ATTEMPT_LOG_DIR, DATA_EXTENSION, LEGACY_EXTENSION, PROGRESS_DIR, PROGRESS_EXPIRE_DAYS,
+                     TMP_EXTENSION, WRONG_QUESTIONS_DIR, data_file_path, read_data_file, scan_data_dir,
+                     write_data_file)
+
+_logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 6 * 3600   # 后台清理间隔（秒）
+SWEEP_FIRST_DELAY = 60      # 启动后首次清理前的等待（秒），不和页面启动抢磁盘
+TMP_MAX_AGE = 3600          # 超过该时长的临时文件视为写入中断的残留
+
+# 数据目录 -> 其中的文件类型（文件名前缀，与 read_data_file 的 kind 相同）
+DATA_DIRS = {PROGRESS_DIR: ("progress", "mastery"), WRONG_QUESTIONS_DIR: ("wrong", "snapshot")}
+
+SWEEP_FILES = Counter("exam_storage_sweep_files_total", "后台清理处理的文件数", ["action"])
+
+
+def _is_sharded(entry, directory):
+    return entry.path != os.path.join(directory, entry.name)
+
+
+def _parse_name(name):
+    """数据文件名 → (前缀, 存储键, 扩展名)；不是数据文件时返回 None"""
+    stem, extension = os.path.splitext(name)
+    prefix, _, key = stem.partition("_")
+    if not key or extension not in (DATA_EXTENSION, LEGACY_EXTENSION):
+        return None
+    return prefix, key, extension
+
+
+def _remove_if_unchanged(path, mtime):
+    """文件在检查之后被重新保存过（修改时间变了）时不删除"""
+    try:
+        stat = os.stat(path)
+        if stat.st_mtime != mtime:
+            return 0
+        os.remove(path)
+        return stat.st_size
+    except FileNotFoundError:
+        return 0
+
+
+def sweep(base_dir=".", progress_days=PROGRESS_EXPIRE_DAYS, dry_run=False, now=None):
+    """
+    清理一遍数据目录，返回各项计数：
+    scanned 检查的文件数、expired 删除的过期进度、migrated 迁移到分片目录的文件、
+    tmp_removed 删除的临时文件、dirs_removed 删除的空分片目录、freed_bytes 释放的字节数、errors 失败数
+    dry_run=True 时只统计不修改
+    """
+    now = time.time() if now is None else now
+    expire_before = now - progress_days * 86400
+    result = dict.fromkeys(["scanned", "expired", "migrated", "tmp_removed", "dirs_removed",
+                            "freed_bytes", "errors"], 0)
+
+    for name, prefixes in DATA_DIRS.items():
+        directory = os.path.join(base_dir, name)
+        for entry in scan_data_dir(directory):
+            result["scanned"] += 1
+            try:
+                stat = entry.stat()
+                if entry.name.endswith(TMP_EXTENSION):
+                    if stat.st_mtime < now - TMP_MAX_AGE:
+                        result["tmp_removed"] += 1
+                        result["freed_bytes"] += stat.st_size if dry_run else _remove_if_unchanged(entry.path, stat.st_mtime)
+                    continue
+                parsed = _parse_name(entry.name)
+                if parsed is None or parsed[0] not in prefixes:
+                    continue
+                prefix, key, extension = parsed
+
+                if prefix == "progress" and stat.st_mtime < expire_before:
+                    result["expired"] += 1
+                    result["freed_bytes"] += stat.st_size if dry_run else _remove_if_unchanged(entry.path, stat.st_mtime)
+                elif extension == LEGACY_EXTENSION or not _is_sharded(entry, directory):
+                    result["migrated"] += 1
+                    if not dry_run:
+                        _migrate(directory, prefix, key)
+            except FileNotFoundError:
+                continue  # 已在迁移同名文件时删除，或学员刚清除了进度
+            except Exception as e:
+                result["errors"] += 1
+                _logger.warning("清理 %s 失败: %s", entry.path, e)
+
+        if not dry_run:
+            result["dirs_removed"] += _remove_empty_shards(directory)
+
+    for action in ("expired", "migrated", "tmp_removed"):
+        if result[action] and not dry_run:
+            SWEEP_FILES.labels(action).inc(result[action])
+    return result
+
+
+def _migrate(directory, prefix, key):
+    """
+    把分片前的文件转换为新格式写入分片目录；分片目录中已有文件（学员在此期间保存过）时
+    以分片目录中的为准，只删除旧文件
+    """
+    target = data_file_path(directory, prefix, key)
+    if not os.path.exists(target):
+        value = read_data_file(target, prefix)
+        if value is not None and write_data_file(target, prefix, value, overwrite=False):
+            return
+    # 目标已存在：旧文件都已过时
+    stem = f"{prefix}_{key}"
+    for extension in (DATA_EXTENSION, LEGACY_EXTENSION):
+        path = os.path.join(directory, stem + extension)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _remove_empty_shards(directory):
+    removed = 0
+    try:
+        top = os.scandir(directory)
+    except FileNotFoundError:
+        return 0
+    with top:
+        for level1 in top:
+            if not level1.is_dir():
+                continue
+            with os.scandir(level1.path) as shards:
+                for shard in shards:
+                    try:
+                        os.rmdir(shard.path)
+                        removed += 1
+                    except OSError:
+                        pass
+            try:
+                os.rmdir(level1.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def disk_usage(base_dir=".", progress_days=PROGRESS_EXPIRE_DAYS, now=None):
+    """
+    各数据目录的占用：文件数、字节数、旧格式（分片前或 pickle）文件数、过期进度数、
+    临时文件数和最早的修改时间（时间戳，没有文件时为 None）
+    """
+    now = time.time() if now is None else now
+    expire_before = now - progress_days * 86400
+    rows = []
+    for name in list(DATA_DIRS) + [ATTEMPT_LOG_DIR]:
+        directory = os.path.join(base_dir, name)
+        row = {"directory": name, "files": 0, "bytes": 0, "legacy_files": 0, "expired_files": 0,
+               "tmp_files": 0, "oldest": None}
+        for entry in scan_data_dir(directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            row["files"] += 1
+            row["bytes"] += stat.st_size
+            if row["oldest"] is None or stat.st_mtime < row["oldest"]:
+                row["oldest"] = stat.st_mtime
+            if entry.name.endswith(TMP_EXTENSION):
+                row["tmp_files"] += 1
+            elif name in DATA_DIRS:
+                parsed = _parse_name(entry.name)
+                if parsed is None:
+                    continue
+                if parsed[2] == LEGACY_EXTENSION or not _is_sharded(entry, directory):
+                    row["legacy_files"] += 1
+                if parsed[0] == "progress" and stat.st_mtime < expire_before:
+                    row["expired_files"] += 1
+        rows.append(row)
+    return rows
+
+
+def start_background_sweeper(base_dir=".", interval=SWEEP_INTERVAL, first_delay=SWEEP_FIRST_DELAY):
+    """后台线程定期清理，返回用于停止的 Event"""
+    stop = threading.Event()
+
+    def run():
+        delay = first_delay
+        while not stop.wait(delay):
+            try:
+                result = sweep(base_dir)
+                _logger.info("数据目录清理完成: %s", result)
+            except Exception as e:
+                _logger.warning("数据目录清理失败: %s", e)
+            delay = interval
+
+    threading.Thread(target=run, name="storage-sweeper", daemon=True).start()
+    return stop
+
+
+def start_sweeper_from_env(environ=None):
+    """按环境变量 EXAM_SWEEP_INTERVAL（秒，默认 6 小时，0 表示不启动）启动后台清理"""
+    environ = os.environ if environ is None else environ
+    interval = float(environ.get("EXAM_SWEEP_INTERVAL", SWEEP_INTERVAL))
+    if interval <= 0:
+        return None
+    return start_background_sweeper(interval=interval)
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学员数据目录的清理和磁盘占用统计")
+    parser.add_argument("--base-dir", default=".", help="学员数据所在目录（含 progress_data 等）")
+    parser.add_argument("--report", action="store_true", help="显示各目录的磁盘占用")
+    parser.add_argument("--sweep", action="store_true", help="清理过期和旧格式文件")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不修改文件")
+    parser.add_argument("--progress-days", type=int, default=PROGRESS_EXPIRE_DAYS, help="进度文件保留天数")
+    args = parser.parse_args()
+    if not args.report and not args.sweep:
+        args.report = True
+
+    if args.sweep:
+        result = sweep(args.base_dir, args.progress_days, dry_run=args.dry_run)
+        print(("（试运行）" if args.dry_run else "") +
+              f"检查 {result['scanned']} 个文件：过期 {result['expired']}，迁移 {result['migrated']}，"
+              f"临时文件 {result['tmp_removed']}，空目录 {result['dirs_removed']}，"
+              f"释放 {format_bytes(result['freed_bytes'])}，失败 {result['errors']}")
+    if args.report:
+        print(f"{'目录':<18}{'文件数':>8}{'占用':>12}{'旧格式':>8}{'已过期':>8}{'临时':>6}  最早修改")
+        for row in disk_usage(args.base_dir, args.progress_days):
+            oldest = time.strftime("%Y-%m-%d", time.localtime(row["oldest"])) if row["oldest"] else "-"
+            print(f"{row['directory']:<18}{row['files']:>8}{format_bytes(row['bytes']):>12}"
+                  f"{row['legacy_files']:>8}{row['expired_files']:>8}{row['tmp_files']:>6}  {oldest}")
+
+
+if __name__ == "__main__":
+    main()
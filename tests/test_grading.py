@@ -0,0 +1,102 @@
+"""填空题判分（grading.compile_blank_answer / match_blank）"""
+import pytest
+
+from grading import compile_blank_answer, match_blank
+
+
+# 不要求顺序的几个空可接受答案有重叠时，按完美匹配判分，与作答顺序无关
+@pytest.mark.parametrize("key, answer, expected", [
+    ("北京/上海、北京", "北京、上海", True),
+    ("北京/上海、北京", "上海、北京", True),
+    ("北京/上海、北京", "北京、北京", True),
+    ("北京/上海、北京", "上海、上海", False),
+    ("5|6、5", "5、6", True),
+    ("5|6、5", "6、5", True),
+    ("5|6、5", "6、6", False),
+    ("甲|乙、乙|丙、甲", "丙、乙、甲", True),
+    ("甲|乙、乙|丙、甲", "丙、丙、甲", False),
+])
+def test_unordered_overlapping_alternatives(key, answer, expected):
+    assert match_blank(answer, compile_blank_answer(key)) is expected
+
+
+@pytest.mark.parametrize("key, answer, expected", [
+    # 整体写法：全角/半角、大小写、空白、引号、末尾句号
+    ("安全第一", "安全第一", True),
+    ("安全第一", " 安全第一。", True),
+    ("ABC", "abc", True),
+    ("5%", "５ ％", True),
+    ("安全第一", "安全第二", False),
+    ("", "任意", False),
+    # 以、分隔：不要求顺序，空数必须一致，不接受去掉分隔符的写法
+    ("北京、上海", "上海、北京", True),
+    ("北京、上海", "北京,上海", True),
+    ("北京、上海", "北京上海", False),
+    ("北京、上海", "北京", False),
+    ("北京、上海", "北京、上海、广州", False),
+    # 以 , ; 分隔：按顺序逐空比较
+    ("北京,上海", "北京，上海", True),
+    ("北京;上海", "北京；上海", True),
+    ("北京,上海", "上海,北京", False),
+    ("北京,上海", "北京上海", False),
+    # 同一空的几种可接受答案
+    ("甲|乙", "乙", True),
+    ("甲/乙", "甲", True),
+    ("甲|乙", "丙", False),
+    ("甲|乙、丙", "丙、乙", True),
+    # 两侧是字母或数字的 / 是答案的一部分
+    ("km/h", "km/h", True),
+    ("km/h", "km", False),
+    ("1/2", "1", False),
+    # 数值：写法差异、± 允许误差、单位
+    ("3.5", "3.50", True),
+    ("3.5", "3.51", False),
+    ("9.8±0.1", "9.85", True),
+    ("9.8±0.1", "9.95", False),
+    ("5%", "5.0%", True),
+    ("5%", "5", False),
+    ("80km/h", "80", False),
+    ("80km/h", "80km/h", True),
+    ("80km/h", "80m/s", False),
+    ("1,2", "1.0,2", True),
+])
+def test_match_blank(key, answer, expected):
+    assert match_blank(answer, compile_blank_answer(key, max_edits=0, unit_optional=False)) is expected
+
+
+@pytest.mark.parametrize("key, answer, expected", [
+    ("5%", "5", True),
+    ("80km/h", "80", True),
+    ("80km/h", "80m/s", False),
+    ("80km/h", "81", False),
+])
+def test_match_blank_unit_optional(key, answer, expected):
+    assert match_blank(answer, compile_blank_answer(key, unit_optional=True)) is expected
+
+
+@pytest.mark.parametrize("key, answer, max_edits, expected", [
+    ("安全生产责任制", "安全生产责任制度", 0, False),
+    ("安全生产责任制", "安全生产责任制度", 1, True),
+    ("安全生产责任制", "安全生产责壬制度", 1, False),
+    ("安全生产责任制", "安全生产责壬制度", 2, True),
+    # 较短的答案不做错别字容错
+    ("义务", "义物", 1, False),
+    ("义务、权利", "权利、义物", 1, False),
+])
+def test_match_blank_max_edits(key, answer, max_edits, expected):
+    assert match_blank(answer, compile_blank_answer(key, max_edits=max_edits)) is expected
+
+
+def test_compile_blank_answer():
+    matcher = compile_blank_answer("北京|上海、 ９.８±0.1 ", max_edits=0, unit_optional=False)
+    assert matcher.whole == frozenset({"北京|上海、9.8±0.1"})
+    assert not matcher.ordered
+    assert [blank.alternatives for blank in matcher.blanks] == [frozenset({"北京", "上海"}),
+                                                                 frozenset({"9.8±0.1"})]
+    assert matcher.blanks[0].number is None
+    assert matcher.blanks[1].number == (9.8, 0.1, "")
+
+    single = compile_blank_answer("甲|乙")
+    assert single.whole == frozenset({"甲|乙", "甲", "乙"})
+    assert compile_blank_answer("1;2").ordered
+    assert compile_blank_answer("").blanks == ()
@@ -0,0 +1,28 @@
+"""近似重复题检测（question_dedup）"""
+import numpy as np
+
+from question_dedup import _lsh_candidate_pairs, find_near_duplicate_clusters
+
+
+def _pairs(signatures, bands):
+    found = set()
+    for lefts, rights in _lsh_candidate_pairs(signatures, bands):
+        found.update(tuple(sorted(pair)) for pair in zip(lefts.tolist(), rights.tolist()))
+    return found
+
+
+def test_candidate_pairs_cover_whole_bucket():
+    # 0、1、2 落在同一个桶中：1 和 2 也要比较，不能只和桶内第一题比较
+    signatures = np.array([[1, 1], [1, 1], [1, 1], [7, 8]], dtype=np.uint32)
+    assert _pairs(signatures, bands=1) == {(0, 1), (0, 2), (1, 2)}
+
+
+def test_candidate_pairs_no_shared_bucket():
+    signatures = np.array([[1, 2], [3, 4], [5, 6]], dtype=np.uint32)
+    assert _pairs(signatures, bands=1) == set()
+
+
+def test_clusters():
+    texts = ["下列哪项属于安全生产的基本方针", "下列哪项属于安全生产的基本方针？",
+             "完全不同的一道题目内容", "下列哪项属于安全生产的基本方针。"]
+    assert find_near_duplicate_clusters(texts, threshold=0.8) == [[0, 1, 3]]